@@ -0,0 +1,36 @@
+"""add bills_bill (introduced, id) index for keyset pagination
+
+Revision ID: 3f2a9c1d4b7e
+Revises: 
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d4b7e'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fresh databases get the index from Base.metadata.create_all on startup
+    if not sa.inspect(op.get_bind()).has_table('bills_bill'):
+        return
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_bills_bill_introduced_id',
+            'bills_bill',
+            [sa.text('introduced DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bills_bill_introduced_id', table_name='bills_bill', if_exists=True)
@@ -0,0 +1,36 @@
+"""add user_poll_votes (user_id, poll_id) index
+
+Revision ID: 8b41d07e2c95
+Revises: 3f2a9c1d4b7e
+Create Date: 2026-10-18 10:03:27.905114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b41d07e2c95'
+down_revision: Union[str, None] = '3f2a9c1d4b7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fresh databases get the index from Base.metadata.create_all on startup
+    if not sa.inspect(op.get_bind()).has_table('user_poll_votes'):
+        return
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_poll_votes_user_poll',
+            'user_poll_votes',
+            ['user_id', 'poll_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_poll_votes_user_poll', table_name='user_poll_votes', if_exists=True)
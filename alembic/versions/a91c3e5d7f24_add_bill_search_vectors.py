@@ -0,0 +1,68 @@
+"""add generated tsvector columns and GIN indexes for bill search
+
+Revision ID: a91c3e5d7f24
+Revises: e7d4b19a8f02
+Create Date: 2026-10-18 15:02:17.904531
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a91c3e5d7f24'
+down_revision: Union[str, None] = 'e7d4b19a8f02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_VECTORS = {
+    'bills_bill': (
+        "setweight(to_tsvector('english', coalesce(name_en, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(short_title_en, '')), 'B')"
+    ),
+    'bills_billtext': (
+        "setweight(to_tsvector('english', coalesce(summary_en, '')), 'B') || "
+        "setweight(to_tsvector('english', left(text_en, 500000)), 'C')"
+    ),
+}
+
+
+def upgrade() -> None:
+    # Search vectors are Postgres only; SQLite falls back to LIKE matching. Fresh
+    # databases get the columns from the DDL events in app/models.py.
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+    tables = [table for table in SEARCH_VECTORS if inspector.has_table(table)]
+    for table in tables:
+        if 'search_vector' not in [c['name'] for c in inspector.get_columns(table)]:
+            # Computes the vector for every existing row, rewriting the table once
+            op.execute(
+                f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+                f"GENERATED ALWAYS AS ({SEARCH_VECTORS[table]}) STORED"
+            )
+    with op.get_context().autocommit_block():
+        for table in tables:
+            op.create_index(
+                f'ix_{table}_search_vector',
+                table,
+                ['search_vector'],
+                postgresql_using='gin',
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+    for table in SEARCH_VECTORS:
+        if inspector.has_table(table):
+            op.drop_index(f'ix_{table}_search_vector', table_name=table, if_exists=True)
+            op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
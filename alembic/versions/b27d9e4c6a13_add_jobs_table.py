@@ -0,0 +1,46 @@
+"""add jobs table
+
+Revision ID: b27d9e4c6a13
+Revises: f3b86d0c21a9
+Create Date: 2026-10-18 17:21:45.630218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b27d9e4c6a13'
+down_revision: Union[str, None] = 'f3b86d0c21a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fresh databases get this table from Base.metadata.create_all on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('bills') or inspector.has_table('jobs'):
+        return
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('progress', sa.JSON(), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('updated_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('finished_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'uq_jobs_kind_running', 'jobs', ['kind'], unique=True,
+        postgresql_where=sa.text("status = 'running'"), sqlite_where=sa.text("status = 'running'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('jobs', if_exists=True)
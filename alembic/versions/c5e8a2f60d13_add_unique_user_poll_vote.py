@@ -0,0 +1,55 @@
+"""add unique (user_id, poll_id) constraint on user_poll_votes
+
+Revision ID: c5e8a2f60d13
+Revises: 8b41d07e2c95
+Create Date: 2026-10-18 11:26:50.442781
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8a2f60d13'
+down_revision: Union[str, None] = '8b41d07e2c95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fresh databases get the constraint from Base.metadata.create_all on startup
+    if not sa.inspect(op.get_bind()).has_table('user_poll_votes'):
+        return
+
+    # Keep only the latest vote per user and poll, then rebuild the tallies from the
+    # remaining rows since duplicates mean the counters have drifted
+    op.execute(
+        "DELETE FROM user_poll_votes WHERE id NOT IN "
+        "(SELECT MAX(id) FROM user_poll_votes GROUP BY user_id, poll_id)"
+    )
+    op.execute(
+        "UPDATE polls SET "
+        "yes_votes = (SELECT COUNT(*) FROM user_poll_votes v WHERE v.poll_id = polls.id AND v.vote), "
+        "no_votes = (SELECT COUNT(*) FROM user_poll_votes v WHERE v.poll_id = polls.id AND NOT v.vote)"
+    )
+
+    # Databases built from init.sql already carry an equivalent unnamed constraint
+    inspector = sa.inspect(op.get_bind())
+    unique_columns = [c['column_names'] for c in inspector.get_unique_constraints('user_poll_votes')]
+    if ['user_id', 'poll_id'] not in unique_columns:
+        with op.batch_alter_table('user_poll_votes') as batch_op:
+            batch_op.create_unique_constraint('unique_user_poll_vote', ['user_id', 'poll_id'])
+    # The unique constraint's index makes the plain composite index redundant
+    op.drop_index('ix_user_poll_votes_user_poll', table_name='user_poll_votes', if_exists=True)
+
+
+def downgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table('user_poll_votes'):
+        return
+    op.create_index('ix_user_poll_votes_user_poll', 'user_poll_votes', ['user_id', 'poll_id'], if_not_exists=True)
+    inspector = sa.inspect(op.get_bind())
+    if 'unique_user_poll_vote' in [c['name'] for c in inspector.get_unique_constraints('user_poll_votes')]:
+        with op.batch_alter_table('user_poll_votes') as batch_op:
+            batch_op.drop_constraint('unique_user_poll_vote', type_='unique')
@@ -0,0 +1,56 @@
+"""add incremental sync columns to bills and import_checkpoints
+
+Revision ID: d58a1f7b3e60
+Revises: b27d9e4c6a13
+Create Date: 2026-10-18 18:05:12.884310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd58a1f7b3e60'
+down_revision: Union[str, None] = 'b27d9e4c6a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+NEW_COLUMNS = {
+    'bills': [
+        sa.Column('status_code', sa.String(length=50), nullable=True),
+        sa.Column('etag', sa.Text(), nullable=True),
+        sa.Column('last_modified', sa.Text(), nullable=True),
+    ],
+    'import_checkpoints': [
+        sa.Column('high_water_mark', sa.Date(), nullable=True),
+        sa.Column('etag', sa.Text(), nullable=True),
+        sa.Column('last_modified', sa.Text(), nullable=True),
+    ],
+}
+
+
+def upgrade() -> None:
+    # Fresh databases get these columns from Base.metadata.create_all on startup
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in NEW_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        existing = [c['name'] for c in inspector.get_columns(table)]
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in NEW_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        existing = [c['name'] for c in inspector.get_columns(table)]
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                if column.name in existing:
+                    batch_op.drop_column(column.name)
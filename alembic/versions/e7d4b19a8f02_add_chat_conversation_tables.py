@@ -0,0 +1,53 @@
+"""add chat_conversations and chat_messages tables
+
+Revision ID: e7d4b19a8f02
+Revises: c5e8a2f60d13
+Create Date: 2026-10-18 14:41:09.127553
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7d4b19a8f02'
+down_revision: Union[str, None] = 'c5e8a2f60d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fresh databases get these tables from Base.metadata.create_all on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('bills_bill') or inspector.has_table('chat_conversations'):
+        return
+    op.create_table(
+        'chat_conversations',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('bill_id', sa.Integer(), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('summarized_through_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['bill_id'], ['bills_bill.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_chat_conversations_bill_id', 'chat_conversations', ['bill_id'])
+    op.create_table(
+        'chat_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('conversation_id', sa.String(length=32), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['conversation_id'], ['chat_conversations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_chat_messages_id', 'chat_messages', ['id'])
+    op.create_index('ix_chat_messages_conversation_id', 'chat_messages', ['conversation_id'])
+
+
+def downgrade() -> None:
+    op.drop_table('chat_messages', if_exists=True)
+    op.drop_table('chat_conversations', if_exists=True)
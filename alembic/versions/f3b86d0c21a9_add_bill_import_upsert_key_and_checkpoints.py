@@ -0,0 +1,58 @@
+"""add unique (session, number) on bills and import_checkpoints table
+
+Revision ID: f3b86d0c21a9
+Revises: a91c3e5d7f24
+Create Date: 2026-10-18 16:40:03.117950
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b86d0c21a9'
+down_revision: Union[str, None] = 'a91c3e5d7f24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fresh databases get both from Base.metadata.create_all on startup
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('bills'):
+        return
+
+    # Earlier seeding runs inserted a new row per run; keep the latest copy of each bill
+    op.execute(
+        "DELETE FROM bills WHERE session IS NOT NULL AND number IS NOT NULL AND id NOT IN "
+        "(SELECT MAX(id) FROM bills GROUP BY session, number)"
+    )
+    unique_columns = [c['column_names'] for c in inspector.get_unique_constraints('bills')]
+    if ['session', 'number'] not in unique_columns:
+        with op.batch_alter_table('bills') as batch_op:
+            batch_op.create_unique_constraint('unique_bill_session_number', ['session', 'number'])
+
+    if not inspector.has_table('import_checkpoints'):
+        op.create_table(
+            'import_checkpoints',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('next_url', sa.Text(), nullable=True),
+            sa.Column('pages', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('items', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('started_at', sa.TIMESTAMP(), nullable=True),
+            sa.Column('updated_at', sa.TIMESTAMP(), nullable=True),
+            sa.Column('completed_at', sa.TIMESTAMP(), nullable=True),
+            sa.PrimaryKeyConstraint('name'),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('import_checkpoints', if_exists=True)
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('bills'):
+        return
+    if 'unique_bill_session_number' in [c['name'] for c in inspector.get_unique_constraints('bills')]:
+        with op.batch_alter_table('bills') as batch_op:
+            batch_op.drop_constraint('unique_bill_session_number', type_='unique')
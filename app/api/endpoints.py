@@ -1,31 +1,41 @@
 from datetime import datetime, timedelta
 import os
+import asyncio
+import json
+import logging
 from typing import List
 from fastapi import File, UploadFile
 from datetime import datetime, date
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, status,Query, Body,WebSocket,WebSocketDisconnect,Request
+from fastapi import APIRouter, Depends, HTTPException, status,Query, Body,WebSocket,WebSocketDisconnect,Request,Response,BackgroundTasks
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func,desc
+from sqlalchemy import func,desc,select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from .. import schemas, crud
 from ..models import BillsBill, BillsBillText
-from ..auth import create_access_token, authenticate_user, get_current_user,oauth2_scheme,verify_password_reset_token,get_password_hash
-from ..database import get_db
-from .. import models, helpers,chatbot
+from ..auth import create_access_token, authenticate_user_async, get_current_user,get_current_user_async,oauth2_scheme,verify_password_reset_token,get_password_hash_async
+from ..database import get_db, get_async_db, SessionLocal, AsyncSessionLocal, pool_status
+from .. import models, helpers,chatbot,summaries,conversations,retrieval,search,importer,jobs,geolocation
 from ..websocket_manager import manager
+from ..vote_buffer import vote_buffer
+from ..notifications import notification_batcher, unread_summary, push_message
 
 
+logger = logging.getLogger(__name__)
+
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
 router = APIRouter()
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: schemas.LoginForm , db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.email, form_data.password)
+async def login(form_data: schemas.LoginForm , db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user_async(db, form_data.email, form_data.password)
     if not user: 
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -39,14 +49,14 @@ def read_users_me(db: Session = Depends(get_db), token: str = Depends(oauth2_sch
     return current_user
 
 @router.post("/register/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud.get_user_async(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    db_user = crud.get_user_by_username(db, username=user.username)
+    db_user = await crud.get_user_by_username_async(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user)
+    return await crud.create_user_async(db=db, user=user)
 
 @router.get("/users/", response_model=list[schemas.User])
 def read_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
@@ -84,15 +94,48 @@ def upload_profile_picture(
 
     # Save the URL (path) of the profile picture in the database
     profile_picture_url = f"/static/users/{new_filename}"
-    current_user.profile_picture = profile_picture_url
+    user = db.get(models.User, current_user.id)
+    user.profile_picture = profile_picture_url
 
-    # Update the user in the database
-    db.add(current_user)
+    # Update the user in the database; this also evicts the cached user snapshot
     db.commit()
 
     return {"profile_picture_url": profile_picture_url}   
 
 
+#, token: str = Depends(oauth2_scheme)
+@router.get("/bills/")
+def all_bills(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[str] = Query(None),  # Cursor from the X-Next-Cursor header of the previous page
+    fields: Optional[str] = Query(None),  # e.g. "id,name,status"; all columns by default
+    db: Session = Depends(get_db)
+    ):
+    after_id = None
+    if after:
+        try:
+            after_id, = helpers.decode_cursor(after)
+            after_id = int(after_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    bills = crud.get_bills(db, limit=limit, after_id=after_id, fields=fields)
+    if len(bills) == limit:
+        response.headers["X-Next-Cursor"] = helpers.encode_cursor(bills[-1]["id"])
+    return bills
+
+@router.get("/bills/export")
+def export_bills(fields: Optional[str] = Query(None)):
+    # Every bill as newline-delimited JSON. Reads through its own session, since the
+    # response keeps streaming after request dependencies are closed.
+    crud.bill_columns(fields)  # reject unknown fields before the stream starts
+
+    def lines():
+        for bill in crud.iter_bills(SessionLocal, fields=fields):
+            yield json.dumps(bill, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.get("/bills/{bill_id}", response_model=schemas.Bill)
 def bill(bill_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     if not bill_id:
@@ -101,30 +144,53 @@ def bill(bill_id: int, db: Session = Depends(get_db), token: str = Depends(oauth
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
     return bill
-#, token: str = Depends(oauth2_scheme)
-@router.get("/bills/", response_model=list[schemas.Bill])
-def all_bills(db: Session = Depends(get_db)):
-    bills = crud.get_bills(db)
-    return bills
 
 @router.get("/bills-bill/", response_model=list[schemas.Bills_bill])
 def all_bills_bill(
+    response: Response,
     db: Session = Depends(get_db),
     limit: int = Query(15, le=100),  # Default limit is 15, max 100
-    offset: int = Query(0, ge=0)    # Default offset is 0, must be non-negative
+    offset: int = Query(0, ge=0),    # Default offset is 0, must be non-negative
+    after: Optional[str] = Query(None)  # Cursor from the X-Next-Cursor header of the previous page
     ):
-    # Fetch bills with limit and offset
-    bills = db.query(models.BillsBill).order_by(desc(models.BillsBill.introduced)).offset(offset).limit(limit).all()
+    query = db.query(models.BillsBill).order_by(
+        desc(models.BillsBill.introduced).nullsfirst(),
+        desc(models.BillsBill.id)
+    )
+    if after:
+        # Keyset mode: seek past the last (introduced, id) seen instead of scanning `offset` rows
+        bills = query.filter(crud.bills_bill_after_cursor(after)).limit(limit).all()
+    else:
+        # Fetch bills with limit and offset
+        bills = query.offset(offset).limit(limit).all()
     
     if not bills:
         raise HTTPException(status_code=404, detail="No bills found")
+
+    if len(bills) == limit:
+        last = bills[-1]
+        response.headers["X-Next-Cursor"] = helpers.encode_cursor(last.introduced, last.id)
     
-    # Fetch related texts for each bill
-    for bill in bills:
-        bill.texts = db.query(models.BillsBillText).filter(models.BillsBillText.docid == bill.text_docid).all()
+    # Fetch related texts for the whole page in one query
+    crud.load_bill_texts(db, bills)
+    vote_buffer.apply_pending(bills)
     
     return bills
 
+@router.get("/bills-bill/search", response_model=list[schemas.BillSearchResult])
+def search_bills(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(15, ge=1, le=50),
+    after: Optional[str] = Query(None),  # Cursor from the X-Next-Cursor header of the previous page
+    db: Session = Depends(get_db)
+    ):
+    # Must stay above /bills-bill/{bill_id}, which would otherwise claim the path
+    results, next_cursor = search.search_bills(db, q, limit=limit, after=after)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return results
+
 @router.get("/bills-bill/{bill_id}", response_model=schemas.Bills_bill)
 def get_single_bill(
     bill_id: int,  # The unique ID of the bill to fetch
@@ -137,7 +203,8 @@ def get_single_bill(
         raise HTTPException(status_code=404, detail="Bill not found")
     
     # Fetch related texts for the bill
-    bill.texts = db.query(models.BillsBillText).filter(models.BillsBillText.docid == bill.text_docid).all()
+    crud.load_bill_texts(db, [bill])
+    vote_buffer.apply_pending([bill])
     
     return bill
 
@@ -173,6 +240,7 @@ def create_bill(bill: schemas.CreateBillRequest, db: Session = Depends(get_db)):
         # Add the new bill text to the session
         db.add(new_bill_text)
         db.commit()
+        retrieval.bill_text_index.add_text(new_bill_text.id, new_bill.id, new_bill_text.text_en)
         print(f"New BillsBillText created: {new_bill_text}")
         return {"message": "Bill created successfully", "bill_id": new_bill.id}
     except SQLAlchemyError as e:
@@ -186,10 +254,33 @@ def create_bill(bill: schemas.CreateBillRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
     
     
-@router.post("/seed-bills/")
-def seed_bills_endpoint(db: Session = Depends(get_db)):
-    crud.seed_bills(db)
-    return {"message": "Bills data seeded successfully"}
+@router.post("/seed-bills/", status_code=status.HTTP_202_ACCEPTED)
+async def seed_bills_endpoint(restart: bool = Query(False), db: AsyncSession = Depends(get_async_db)):
+    # Starts the import as a background job; poll /jobs/{job_id} for progress. It resumes an
+    # interrupted import unless restart is set; import_bills.py runs the same from a shell.
+    job = await jobs.submit(db, "seed_bills", lambda report: importer.import_bills(restart=restart, progress=report))
+    return {"message": "Bill import started", "job_id": job.id, "status_url": f"/jobs/{job.id}"}
+
+
+@router.post("/sync-bills/", status_code=status.HTTP_202_ACCEPTED)
+async def sync_bills_endpoint(db: AsyncSession = Depends(get_async_db)):
+    # Fetches only bills introduced or changed since the last sync, as a background job
+    job = await jobs.submit(db, "sync_bills", lambda report: importer.sync_bills(progress=report))
+    return {"message": "Bill sync started", "job_id": job.id, "status_url": f"/jobs/{job.id}"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await db.get(models.Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.describe(job)
+
+
+@router.get("/metrics/db-pool")
+def db_pool_metrics():
+    # Connection pool usage for this worker process
+    return pool_status()
 
 
 @router.post("/forgot_password/")
@@ -210,7 +301,7 @@ def forgot_password(request: schemas.ForgotPasswordRequest, db: Session = Depend
 
 
 @router.post("/reset_password/")
-def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(get_db)):
+async def reset_password(request: schemas.ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
     if request.new_password != request.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
 
@@ -218,28 +309,25 @@ def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(
     if email is None:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    user = crud.get_user_by_email(db, email=email)
+    user = await crud.get_user_async(db, email=email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Update the user's password
-    hashed_password = get_password_hash(request.new_password)
+    hashed_password = await get_password_hash_async(request.new_password)
     user.password = hashed_password
-    db.commit()
+    await db.commit()
 
     return {"message": "Password reset successfully"}
 
 
 @router.post("/comments/", response_model=schemas.CommentCreate)
-async def add_comment(comment: schemas.CommentCreate, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def add_comment(comment: schemas.CommentCreate, db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)):
     # Check if the user exists
-    user = get_current_user(token,db)
-    user = db.query(models.User).filter(models.User.id == user.id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user = await get_current_user_async(token, db)
     
     # Check if the bill exists
-    bill = db.query(models.BillsBill).filter(models.BillsBill.id == comment.bill_id).first()
+    bill = await db.get(models.BillsBill, comment.bill_id)
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
 
@@ -250,14 +338,12 @@ async def add_comment(comment: schemas.CommentCreate, db: Session = Depends(get_
         comment=comment.comment
     )
     
-    # Notify all connected clients
+    db_comment = await crud.create_comment(db=db, comment=db_comment)
+
+    # Notify moderators; the row is written and pushed with the next notification batch
     notification_message = f"New comment added by {user.username} on Bill {bill.name_en}"
-    new_notification = models.Notification(user_id=user.id, message=notification_message)
-    db.add(new_notification)
-    db.commit()
-    await manager.broadcast_to_moderators("New notification")
-    
-    return crud.create_comment(db=db, comment=db_comment)
+    notification_batcher.add(user.id, notification_message)
+    return db_comment
 
 @router.get("/comments/{bill_id}", response_model=List[schemas.Comment])
 def get_comments(bill_id: int, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
@@ -288,44 +374,39 @@ def delete_comments(comment_id: int, db: Session = Depends(get_db), token: str =
     return {"message": "Comment deleted successfully"}
 
 @router.post("/polls/{poll_id}/vote", response_model=schemas.UserPollVote)
-async def vote_poll(poll_id: int, vote: schemas.Vote, request:Request,db: Session = Depends(get_db) ,token: str = Depends(oauth2_scheme)):
+async def vote_poll(poll_id: int, vote: schemas.Vote, request:Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db) ,token: str = Depends(oauth2_scheme)):
     # Extract user from token
+    user = await get_current_user_async(token, db)
     client_ip = request.client.host
     print("Client ip is : ", client_ip)
-    location = await helpers.get_location_from_ip(client_ip)
-    location_info = location.get('city', 'Unknown city') if location else 'Unknown location'
-    print("adn the location is:",location_info)
-    user = get_current_user(token, db)
+    # A cached location is used right away; otherwise it is looked up after the vote is stored
+    # (or before, with GEOLOCATION_DEFERRED off)
+    location_info = geolocation.cached_location(client_ip)
+    if location_info is None and not geolocation.GEOLOCATION_DEFERRED:
+        location_info = await geolocation.locate(client_ip)
     # Register the user's vote
-    db_vote = crud.vote_poll(db=db, user_id=user.id, poll_id=poll_id, vote=vote.vote,ipaddress=client_ip, location=location_info)
+    db_vote = await crud.vote_poll(db=db, user_id=user.id, poll_id=poll_id, vote=vote.vote,ipaddress=client_ip, location=location_info)
     if db_vote is None:
          raise HTTPException(status_code=400, detail="User already voted with the same option")
+    if location_info is None:
+        background_tasks.add_task(geolocation.update_vote_location, db_vote["id"], client_ip)
     
     notification_message = f"{user.username} has voted {vote.vote} on poll {poll_id}."
-    # Save notification to the database (assuming you have a Notification model and method)
-    new_notification = models.Notification(user_id=user.id, message=notification_message)
-    db.add(new_notification)
-    db.commit()
-    await manager.broadcast_to_moderators("New notification")
+    notification_batcher.add(user.id, notification_message)
     return db_vote
 
 @router.get("/polls/", response_model=List[schemas.DetailPoll])
-def get_poll(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def get_poll(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=100)  # Omit to list every poll
+    ):
     user = get_current_user(token, db)
     
     try:
-        polls = crud.get_polls(db=db)
-        
-        # Fetch user's vote for each poll and add to the response
-        for poll in polls:
-            user_vote = db.query(models.UserPollVote).filter(
-                models.UserPollVote.user_id == user.id,
-                models.UserPollVote.poll_id == poll.id
-            ).first()
-            if user_vote:
-                poll.current_user_vote = True if user_vote.vote else False
-            else:
-                poll.current_user_vote = None  # User has not voted
+        # Polls come back with the user's vote already attached as current_user_vote
+        polls = crud.get_polls_with_user_vote(db=db, user_id=user.id, skip=skip, limit=limit)
 
         return polls
     except Exception as e:
@@ -354,7 +435,7 @@ def summarize_bill(bill_id: int, db: Session = Depends(get_db)):
     if not bill:
         raise HTTPException(status_code=404, detail="No bill  found with the given ID")
     
-    bill.texts = db.query(models.BillsBillText).filter(models.BillsBillText.docid == bill.text_docid).all()
+    crud.load_bill_texts(db, [bill])
     if not bill.texts:
         raise HTTPException(status_code=404, detail="No text available for the bill")
 
@@ -367,59 +448,137 @@ def summarize_bill(bill_id: int, db: Session = Depends(get_db)):
     # except Exception as e:
     #     raise HTTPException(status_code=404, detail=f"No decription available to summarize")
 
-    # Generate a summary using OpenAI GPT
+    # Serve the stored summary, generating it with OpenAI GPT only the first time
     for text in bill.texts:
         if text.text_en and text.text_en.strip():  # Check if text_en is not empty
-            cleaned_text = helpers.clean_text(text.text_en)  # Assuming clean_text is defined
-            summary = helpers.generate_summary(cleaned_text)  # Assuming generate_summary is defined
+            try:
+                summary = summaries.get_or_create_summary(db, text)
+            except Exception as e:
+                # Failures are not stored, so the next request tries again
+                return {"summary": f"Error generating summary {e}"}
             return {"summary": summary}
     
     # If no valid text_en was found
     raise HTTPException(status_code=404, detail="No valid text available to summarize")
 
 
+@router.post("/summaries/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def backfill_summaries(
+    limit: Optional[int] = Query(None, ge=1),  # Omit to summarize every bill text missing one
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme)
+    ):
+    # Pre-summarizes bill texts that have no stored summary as a background job; poll
+    # /jobs/{job_id} for progress. summarize_bills.py runs the same from a shell.
+    user = await get_current_user_async(token, db)
+    if not user.is_moderator:
+        raise HTTPException(status_code=403, detail="You do not have permission to summarize bills")
+    job = await jobs.submit(db, "summarize_bills", lambda report: summaries.backfill_summaries_job(limit=limit, progress=report))
+    return {"message": "Summary backfill started", "job_id": job.id, "status_url": f"/jobs/{job.id}"}
+
+
+async def get_chat_bill_info(db: AsyncSession, bill_id: int) -> dict:
+    bill_info = chatbot.bill_context_cache.get(bill_id)
+    if bill_info is not None:
+        return bill_info
+
+    # Fetch the bill from the database
+    bill = await db.get(models.BillsBill, bill_id)
+    if not bill:
+        raise HTTPException(status_code=404, detail="Bill not found")
+    
+    # Fetch the bill texts and summaries
+    await crud.load_bill_texts_async(db, [bill])
+    bill_texts = bill.texts
+    if bill_texts:
+        summary = "\n".join([text.summary_en for text in bill_texts if text.summary_en])
+    else:
+        summary = "No summary available."
+    
+    # Prepare the bill information
+    bill_info = {
+        "bill_name": bill.name_en,
+        "bill_number": bill.number,
+        "summary": summary,
+        "status": bill.status_code,
+        "introduced_date": bill.introduced
+    }
+    bill_info["system_prompt"] = chatbot.build_system_prompt(bill_info)
+
+    # Index texts this process hasn't seen yet, so retrieval covers bills added elsewhere
+    for text in bill_texts:
+        if not retrieval.bill_text_index.has_text(text.id):
+            await asyncio.to_thread(retrieval.bill_text_index.add_text, text.id, bill.id, text.text_en)
+
+    chatbot.bill_context_cache.put(bill_id, bill_info)
+    return bill_info
+
+
+def retrieve_passages(bill_id: int, conversation: list) -> list:
+    # Passages matching the latest user message
+    for message in reversed(conversation):
+        if message["role"] == "user":
+            return retrieval.bill_text_index.search(bill_id, message["content"])
+    return []
+
+
+def chat_greeting(bill_info: dict) -> dict:
+    return {
+        "role": "assistant",
+        "content": f"The bill '{bill_info['bill_name']}' is being discussed. What would you like to know about it?"
+    }
+
+
+async def start_stored_chat_turn(db: AsyncSession, bill_id: int, bill_info: dict, request: schemas.ChatRequest):
+    # Server-side conversation mode. Returns (conversation, prompt window), or
+    # (conversation, None) when a new conversation only needs its greeting.
+    if request.conversation_id is None:
+        conversation = await conversations.create_conversation(db, bill_id, chat_greeting(bill_info))
+        if not request.message:
+            return conversation, None
+    else:
+        conversation = await conversations.get_conversation(db, request.conversation_id, bill_id)
+        if not request.message:
+            raise HTTPException(status_code=400, detail="A message is required to continue a conversation")
+
+    await conversations.add_message(db, conversation.id, "user", request.message)
+    return conversation, await conversations.get_window(db, conversation)
+
 
 @router.post("/chat/{bill_id}")
-def chatbotfunc(
+async def chatbotfunc(
     bill_id: int,
+    background_tasks: BackgroundTasks,
     request: schemas.ChatRequest = Body(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
     ):
     try:
-        # Fetch the bill from the database
-        bill = db.query(models.BillsBill).filter(models.BillsBill.id == bill_id).first()
-        if not bill:
-            raise HTTPException(status_code=404, detail="Bill not found")
-        
-        # Fetch the bill texts and summaries
-        bill_texts = db.query(models.BillsBillText).filter(models.BillsBillText.docid == bill.text_docid).all()
-        if bill_texts:
-            summary = "\n".join([text.summary_en for text in bill_texts if text.summary_en])
-        else:
-            summary = "No summary available."
-        
-        # Prepare the bill information
-        bill_info = {
-            "bill_name": bill.name_en,
-            "bill_number": bill.number,
-            "summary": summary,
-            "status": bill.status_code,
-            "introduced_date": bill.introduced
-        }
+        bill_info = await get_chat_bill_info(db, bill_id)
+
+        if request.conversation_id or request.message is not None:
+            # Server-side mode: only the new message travels; the reply comes back with the
+            # bounded window that was sent to the model
+            conversation, window = await start_stored_chat_turn(db, bill_id, bill_info, request)
+            if window is None:
+                return {"conversation_id": conversation.id, "conversation": [chat_greeting(bill_info)]}
+            passages = retrieve_passages(bill_id, window)
+            updated_conversation = await chatbot.generate_async(window, bill_info, conversation.summary, passages)
+            reply = updated_conversation[-1]
+            await conversations.add_message(db, conversation.id, reply["role"], reply["content"])
+            background_tasks.add_task(conversations.compact_conversation, conversation.id)
+            return {"conversation_id": conversation.id, "conversation": updated_conversation}
         
         # Extract conversation from the request body
-        conversation = request.conversation if request.conversation else []
+        conversation = [{"role": message.role, "content": message.content} for message in request.conversation or []]
         
         # If no conversation history, start with a greeting
         if len(conversation) == 0:
-            conversation.append({
-                "role": "assistant",
-                "content": f"The bill '{bill_info['bill_name']}' is being discussed. What would you like to know about it?"
-            })
+            conversation.append(chat_greeting(bill_info))
             return {"conversation": conversation}
         
         # Generate an updated conversation
-        updated_conversation = chatbot.generate(conversation, bill_info)
+        passages = retrieve_passages(bill_id, conversation)
+        updated_conversation = await chatbot.generate_async(conversation, bill_info, passages=passages)
         
         return {"conversation": updated_conversation}
     
@@ -432,73 +591,87 @@ def chatbotfunc(
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
 
 
+@router.post("/chat/{bill_id}/stream")
+async def chatbot_stream(
+    bill_id: int,
+    request: schemas.ChatRequest = Body(...),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    # Same contract as /chat/{bill_id}, but the reply is sent as server-sent events:
+    # "data: {"delta": ...}" frames as tokens arrive, then an "event: done" frame carrying
+    # the updated conversation (or "event: error" if the completion fails midway)
+    bill_info = await get_chat_bill_info(db, bill_id)
+    stored = None
+    history_summary = None
+    if request.conversation_id or request.message is not None:
+        stored, window = await start_stored_chat_turn(db, bill_id, bill_info, request)
+        conversation = window or []
+        history_summary = stored.summary
+    else:
+        conversation = [{"role": message.role, "content": message.content} for message in request.conversation or []]
+    # The request's session is only closed after the response ends; hand its connection back
+    # now so open streams don't hold pool connections for the whole reply
+    await db.close()
+
+    def done_frame():
+        data = {"conversation": conversation}
+        if stored is not None:
+            data["conversation_id"] = stored.id
+        return helpers.format_sse(data, event="done")
+
+    async def events():
+        if len(conversation) == 0:
+            greeting = chat_greeting(bill_info)
+            conversation.append(greeting)
+            yield helpers.format_sse({"delta": greeting["content"]})
+            yield done_frame()
+            return
+
+        parts = []
+        try:
+            passages = retrieve_passages(bill_id, conversation)
+            async for delta in chatbot.stream(conversation, bill_info, history_summary, passages):
+                parts.append(delta)
+                yield helpers.format_sse({"delta": delta})
+        except Exception:
+            # The exception can carry upstream API details; keep them in the log
+            logger.exception("Streaming chat reply for bill %s failed", bill_id)
+            yield helpers.format_sse({"detail": "An error occurred while generating the response"}, event="error")
+            return
+        reply = {"role": "assistant", "content": "".join(parts).strip()}
+        conversation.append(reply)
+        if stored is not None:
+            async with AsyncSessionLocal() as session:
+                await conversations.add_message(session, stored.id, reply["role"], reply["content"])
+        yield done_frame()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(conversations.compact_conversation, stored.id) if stored is not None else None
+    )
+
+
 @router.post("/bills-bill/{bill_id}/vote")
 async def vote_on_bill(
     bill_id: int,
     upvote: bool,  
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(oauth2_scheme)  # Extracting user token
     ):
     # Extract user from token
-    user = get_current_user(token, db)
+    user = await get_current_user_async(token, db)
     
-    # Retrieve the bill
-    bill = db.query(models.BillsBill).filter(models.BillsBill.id == bill_id).first()
-    if not bill:
-        raise HTTPException(status_code=404, detail="Bill not found")
-    
-    # Check if the user has already voted on this bill
-    existing_vote = db.query(models.UserBillVote).filter(
-        models.UserBillVote.user_id == user.id,
-        models.UserBillVote.bill_id == bill_id
-    ).first()
-    notification_message = f"{user.username} has {'upvoted' if upvote else 'downvoted'} the bill '{bill.name_en}'."  
-    if existing_vote:
-        # If user has already voted
-        if existing_vote.upvote == upvote:
-            # No change in vote, do nothing
-            return {"detail": "No change in vote", "vote": existing_vote}
-        else:
-            # Change in vote, update counts
-            if existing_vote.upvote:
-                # Previous vote was upvote
-                bill.upvotes -= 1
-            else:
-                # Previous vote was downvote
-                bill.downvotes -= 1
-
-            if upvote:
-                # New vote is upvote
-                bill.upvotes += 1
-            else:
-                # New vote is downvote
-                bill.downvotes += 1
-
-            existing_vote.upvote = upvote
-    else:
-        # New vote
-        if upvote:
-            bill.upvotes += 1
-        else:
-            bill.downvotes += 1
-        
-        # Create new vote record
-        db_vote = models.UserBillVote(user_id=user.id, bill_id=bill_id, upvote=upvote)
-        db.add(db_vote)
-    
-    db.commit()
-    db.refresh(bill)
-    
-    # Refresh the existing_vote if it was updated
-    if existing_vote:
-        db.refresh(existing_vote)
-    new_notification = models.Notification(user_id=user.id, message=notification_message)
-    db.add(new_notification)
-    db.commit()
+    # Upsert the vote and bump the counters server-side in a single transaction
+    vote, tally = await crud.vote_bill(db, user_id=user.id, bill_id=bill_id, upvote=upvote)
+    if tally is None:
+        # No change in vote, do nothing
+        return {"detail": "No change in vote", "vote": vote}
 
-    # Optionally, send the notification to connected moderators if needed
-    await manager.broadcast_to_moderators("New notification")
-    return {"detail": "Vote recorded", "vote": existing_vote if existing_vote else db_vote}
+    notification_message = f"{user.username} has {'upvoted' if upvote else 'downvoted'} the bill '{tally.name_en}'."  
+    notification_batcher.add(user.id, notification_message)
+    return {"detail": "Vote recorded", "vote": vote, "upvotes": tally.upvotes, "downvotes": tally.downvotes}
 
 
 
@@ -506,24 +679,19 @@ async def vote_on_bill(
 @router.websocket("/ws/notifications")
 async def websocket_endpoint(
     websocket: WebSocket, 
-    db: Session = Depends(get_db),
     token: Optional[str] = Query(...)
     ):
-    # user = None
-    if token:
+    # Use a short-lived session for the handshake instead of holding one for the socket's lifetime
+    async with AsyncSessionLocal() as db:
         try:
-            user = get_current_user(token, db)
+            user = await get_current_user_async(token, db)
         except HTTPException:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
+        missed_count, missed_ids = await unread_summary(db, user.id)
     
     try:
-        await manager.connect(websocket, user)
-        missed_notifications = db.query(models.Notification).filter(
-        models.Notification.user_id == user.id,models.Notification.read == False).all()
-        if missed_notifications:
-            for notification in missed_notifications:
-                await websocket.send_text("New notification")
+        await manager.connect(websocket, user, backlog=[push_message(missed_count, missed_ids)] if missed_count else [])
         while True:
             data = await websocket.receive_text()
             # Process the received data if needed
@@ -534,11 +702,13 @@ async def websocket_endpoint(
         
         
 @router.get("/notifications/", response_model=List[schemas.Notification])
-async def get_notifications( db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    user = get_current_user(token, db)  # Verify user with the token
+async def get_notifications( db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)):
+    user = await get_current_user_async(token, db)  # Verify user with the token
     if not user.is_moderator:
         raise HTTPException(status_code=403, detail="You do not have permission to view notifications")
-    notifications = db.query(models.Notification).filter(models.Notification.user_id == user.id).all()
+    notifications = (await db.execute(
+        select(models.Notification).where(models.Notification.user_id == user.id)
+    )).scalars().all()
     response_notifications = [{
         "id": notification.id,
         "user_id": notification.user_id,
@@ -547,7 +717,7 @@ async def get_notifications( db: Session = Depends(get_db), token: str = Depends
     } for notification in notifications]
     for notification in notifications:
         notification.read = True 
-    db.commit()
+    await db.commit()
     if not notifications:
         raise HTTPException(status_code=404, detail="No notifications found.")
     
@@ -1,8 +1,18 @@
 from datetime import datetime, timedelta
-from typing import Union
+from typing import Union, Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+import asyncio
+import os
+import threading
 from jose import JWTError, jwt
+from passlib.context import CryptContext
 from .schemas import TokenData
-from sqlalchemy.orm import Session
+from .models import User
+from .cache import TTLCache
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException, status
 
@@ -24,16 +34,47 @@ def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Bcrypt is deliberately slow, so async endpoints hash and verify on a bounded worker pool
+# instead of the event loop. bcrypt releases the GIL, so threads scale across cores;
+# PASSWORD_HASH_POOL=process is available if that ever stops being true.
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+
+def get_hash_executor():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            if PASSWORD_HASH_POOL == "process":
+                _hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+            else:
+                _hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+        return _hash_executor
+
+def shutdown_hash_executor():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=True)
+            _hash_executor = None
+
 def verify_password(plain_password: str, hashed_password: str):
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str):
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), get_password_hash, password)
+
 def authenticate_user(db: Session, email: str, password: str):
     get_user = get_user_from_crud()
     user = get_user(db, email=email)
@@ -43,26 +84,130 @@ def authenticate_user(db: Session, email: str, password: str):
         return False
     return user
 
-def get_current_user(token: str, db: Session):
-   
-    get_user = get_user_from_crud()
-    credentials_exception = HTTPException(
+async def authenticate_user_async(db: AsyncSession, email: str, password: str):
+    from .crud import get_user_async  # Local import to avoid circular import
+    user = await get_user_async(db, email=email)
+    if not user:
+        return False
+    if not await verify_password_async(password, user.password):
+        return False
+    return user
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_access_token(token: str) -> TokenData:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
+            raise credentials_exception()
+        return TokenData(email=email)
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    # Read-only view of the authenticated user; load the User row to change it
+    id: int
+    name: str
+    email: str
+    username: str
+    is_moderator: bool
+    profile_picture: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: User):
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            username=user.username,
+            is_moderator=bool(user.is_moderator),
+            profile_picture=user.profile_picture,
+        )
+
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Token subject (email) -> UserSnapshot. Entries are dropped when a transaction that updated
+# or deleted the User row through the ORM commits; the TTL bounds how long other worker
+# processes can serve a stale snapshot. Flushes only record what to drop: invalidating
+# before the commit would let a concurrent request cache the old row again.
+user_cache = TTLCache(ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE)
+CHANGED_USERS_KEY = "changed_user_emails"  # Session.info entry; None means "clear everything"
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _collect_changed_user(mapper, connection, target):
+    # Covers profile picture uploads, password resets and is_moderator changes
+    session = object_session(target)
+    if session is None:
+        user_cache.invalidate(target.email)
+        return
+    emails = session.info.setdefault(CHANGED_USERS_KEY, set())
+    if emails is not None:
+        emails.add(target.email)
+        emails.update(inspect(target).attrs.email.history.deleted)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_user_write(orm_execute_state):
+    # Bulk UPDATE/DELETE on users skips the mapper events above and can touch any row
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+        mapper.class_ is User for mapper in orm_execute_state.all_mappers
+    ):
+        orm_execute_state.session.info[CHANGED_USERS_KEY] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    if CHANGED_USERS_KEY not in session.info:
+        return
+    emails = session.info.pop(CHANGED_USERS_KEY)
+    if emails is None:
+        user_cache.clear()
+        return
+    for email in emails:
+        user_cache.invalidate(email)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop(CHANGED_USERS_KEY, None)
+
+
+def get_current_user(token: str, db: Session):
+   
+    token_data = decode_access_token(token)
+    snapshot = user_cache.get(token_data.email)
+    if snapshot is not None:
+        return snapshot
+    get_user = get_user_from_crud()
     user = get_user(db, email=token_data.email)
     if user is None:
-        raise credentials_exception
-    return user
+        raise credentials_exception()
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.put(token_data.email, snapshot)
+    return snapshot
+
+async def get_current_user_async(token: str, db: AsyncSession):
+    from .crud import get_user_async  # Local import to avoid circular import
+    token_data = decode_access_token(token)
+    snapshot = user_cache.get(token_data.email)
+    if snapshot is not None:
+        return snapshot
+    user = await get_user_async(db, email=token_data.email)
+    if user is None:
+        raise credentials_exception()
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.put(token_data.email, snapshot)
+    return snapshot
 
 
 def verify_password_reset_token(token: str):
@@ -1,35 +1,67 @@
 import os
 import re
-from openai import OpenAI,OpenAIError
+from openai import OpenAI,AsyncOpenAI,OpenAIError
 from fastapi import HTTPException
+from .cache import TTLCache
 
-# Initialize the OpenAI client
+# Initialize the OpenAI clients; the async one serves the async and streaming endpoints
 client = OpenAI(
     api_key=os.getenv('OPENAI_API_KEY')
 )
+async_client = AsyncOpenAI(
+    api_key=os.getenv('OPENAI_API_KEY')
+)
+
+
+# Per-bill chat context (bill_info with its rendered system prompt), so follow-up turns
+# don't reload the bill and its texts from the database
+BILL_CONTEXT_TTL = float(os.getenv("BILL_CONTEXT_TTL", "300"))
+bill_context_cache = TTLCache(ttl=BILL_CONTEXT_TTL, max_size=1024)
+
+
+def build_system_prompt(bill_info: dict) -> str:
+    return (
+        "You are a helpful assistant that provides information about bills. Respond concisely and helpfully. "
+        "Here are the details of the bill:\n"
+        f"Bill Name: {bill_info['bill_name']}\n"
+        f"Bill Number: {bill_info['bill_number']}\n"
+        f"Summary: {bill_info['summary']}\n"
+        f"Status: {bill_info['status']}\n"
+        f"Introduced Date: {bill_info['introduced_date']}\n"
+        "Please ensure your responses are relevant, detailed, and free from unnecessary repetition."
+    )
+
+
+def build_messages(conversation: list, bill_info: dict, history_summary: str = None, passages: list = None) -> list:
+    messages = [
+        {
+            "role": "system",
+            "content": bill_info.get("system_prompt") or build_system_prompt(bill_info)
+        }
+    ]
+    if passages:
+        # Bill text passages retrieved for the latest question
+        excerpts = "\n\n".join(f"[{number}] {passage}" for number, passage in enumerate(passages, 1))
+        messages.append({
+            "role": "system",
+            "content": f"Relevant excerpts from the bill text:\n{excerpts}"
+        })
+    if history_summary:
+        # Older turns that no longer fit in the window, condensed
+        messages.append({
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{history_summary}"
+        })
+    # Add the previous conversation history
+    messages.extend(conversation)
+    return messages
 
 
 def generate(conversation: list, bill_info: dict): 
     try:
         # Create a response from the OpenAI API
         response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a helpful assistant that provides information about bills. Respond concisely and helpfully. "
-                        "Here are the details of the bill:\n"
-                        f"Bill Name: {bill_info['bill_name']}\n"
-                        f"Bill Number: {bill_info['bill_number']}\n"
-                        f"Summary: {bill_info['summary']}\n"
-                        f"Status: {bill_info['status']}\n"
-                        f"Introduced Date: {bill_info['introduced_date']}\n"
-                        "Please ensure your responses are relevant, detailed, and free from unnecessary repetition."
-                    )
-                },
-                # Add the previous conversation history
-                *conversation
-            ],
+            messages=build_messages(conversation, bill_info),
             model="gpt-3.5-turbo",
         )
         
@@ -50,4 +82,57 @@ def generate(conversation: list, bill_info: dict):
     
     except Exception as ex:
         # Handle other exceptions
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {ex}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {ex}")
+
+
+async def generate_async(conversation: list, bill_info: dict, history_summary: str = None, passages: list = None):
+    try:
+        response = await async_client.chat.completions.create(
+            messages=build_messages(conversation, bill_info, history_summary, passages),
+            model="gpt-3.5-turbo",
+        )
+        assistant_response = response.choices[0].message.content.strip()
+        conversation.append({
+            "role": "assistant",
+            "content": assistant_response
+        })
+        return conversation
+
+    except OpenAIError as openai_err:
+        raise HTTPException(status_code=500, detail=f"OpenAI API error occurred: {openai_err}")
+
+    except Exception as ex:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {ex}")
+
+
+async def stream(conversation: list, bill_info: dict, history_summary: str = None, passages: list = None):
+    # Yields the assistant's reply piece by piece as the completion streams in
+    response = await async_client.chat.completions.create(
+        messages=build_messages(conversation, bill_info, history_summary, passages),
+        model="gpt-3.5-turbo",
+        stream=True,
+    )
+    async for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def summarize_turns(previous_summary: str, turns: list) -> str:
+    # Folds turns that are leaving the prompt window into the running conversation summary
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    response = await async_client.chat.completions.create(
+        messages=[
+            {
+                "role": "system",
+                "content": "You maintain a brief running summary of a conversation about a bill. "
+                           "Keep the facts, questions and answers that later turns may refer to."
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}\n\n"
+                           "Return the updated summary."
+            }
+        ],
+        model="gpt-3.5-turbo",
+    )
+    return response.choices[0].message.content.strip()
@@ -0,0 +1,93 @@
+import os
+import logging
+from uuid import uuid4
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, chatbot
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Server-side chat history. Each turn sends the model a running summary of the older turns
+# plus every message after them. Once more than CHAT_WINDOW_MESSAGES unsummarized messages
+# have piled up by at least CHAT_SUMMARY_BATCH, the oldest are folded into the summary, so
+# the prompt stays bounded however long the chat runs.
+CHAT_WINDOW_MESSAGES = int(os.getenv("CHAT_WINDOW_MESSAGES", "8"))
+CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "6"))
+
+
+def message_dict(message: models.ChatMessage) -> dict:
+    return {"role": message.role, "content": message.content}
+
+
+async def create_conversation(db: AsyncSession, bill_id: int, greeting: dict) -> models.ChatConversation:
+    conversation = models.ChatConversation(id=uuid4().hex, bill_id=bill_id, summarized_through_id=0)
+    db.add(conversation)
+    db.add(models.ChatMessage(conversation_id=conversation.id, role=greeting["role"], content=greeting["content"]))
+    await db.commit()
+    return conversation
+
+
+async def get_conversation(db: AsyncSession, conversation_id: str, bill_id: int) -> models.ChatConversation:
+    conversation = await db.get(models.ChatConversation, conversation_id)
+    if conversation is None or conversation.bill_id != bill_id:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+
+async def add_message(db: AsyncSession, conversation_id: str, role: str, content: str):
+    db.add(models.ChatMessage(conversation_id=conversation_id, role=role, content=content))
+    await db.commit()
+
+
+async def get_window(db: AsyncSession, conversation: models.ChatConversation) -> list:
+    # Messages not yet folded into the summary, oldest first. The limit only matters if
+    # compaction keeps failing; normally fewer messages than that are pending.
+    messages = (await db.execute(
+        select(models.ChatMessage)
+        .where(
+            models.ChatMessage.conversation_id == conversation.id,
+            models.ChatMessage.id > conversation.summarized_through_id
+        )
+        .order_by(models.ChatMessage.id.desc())
+        .limit(CHAT_WINDOW_MESSAGES + CHAT_SUMMARY_BATCH)
+    )).scalars().all()
+    return [message_dict(message) for message in reversed(messages)]
+
+
+async def compact_conversation(conversation_id: str):
+    # Runs after the reply is sent, with its own session
+    async with AsyncSessionLocal() as db:
+        try:
+            conversation = await db.get(models.ChatConversation, conversation_id)
+            if conversation is None:
+                return
+            unsummarized = (await db.execute(
+                select(models.ChatMessage)
+                .where(
+                    models.ChatMessage.conversation_id == conversation_id,
+                    models.ChatMessage.id > conversation.summarized_through_id
+                )
+                .order_by(models.ChatMessage.id)
+            )).scalars().all()
+            # Everything older than the window; nothing until the window itself is full
+            turns = unsummarized[:max(0, len(unsummarized) - CHAT_WINDOW_MESSAGES)]
+            if len(turns) < CHAT_SUMMARY_BATCH:
+                return
+
+            summary = await chatbot.summarize_turns(conversation.summary, [message_dict(turn) for turn in turns])
+
+            # Only the first of two concurrent compactions of the same turns wins
+            await db.execute(
+                update(models.ChatConversation)
+                .where(
+                    models.ChatConversation.id == conversation_id,
+                    models.ChatConversation.summarized_through_id == conversation.summarized_through_id
+                )
+                .values(summary=summary, summarized_through_id=turns[-1].id)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        except Exception:
+            logger.exception("Failed to compact chat conversation %s", conversation_id)
@@ -1,11 +1,21 @@
+from collections import defaultdict, namedtuple
+from datetime import date
+from sqlalchemy import and_, or_, update, select, exists
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from . import models, schemas,auth,helpers
-import requests
+from .vote_buffer import vote_buffer
 from fastapi import HTTPException 
 
 def get_user(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
+async def get_user_async(db: AsyncSession, email: str):
+    return (await db.execute(select(models.User).where(models.User.email == email))).scalars().first()
+
 def get_users(db: Session, skip: int = 0, limit: int = 10):
     return db.query(models.User).offset(skip).limit(limit).all()
 
@@ -14,6 +24,9 @@ def get_user_by_email(db: Session, email: str):
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
+async def get_user_by_username_async(db: AsyncSession, username: str):
+    return (await db.execute(select(models.User).where(models.User.username == username))).scalars().first()
+
 def create_user(db: Session, user: schemas.UserCreate):
     existing_user = db.query(models.User).filter(models.User.email == user.email).first()
     if existing_user:
@@ -30,6 +43,22 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
+async def create_user_async(db: AsyncSession, user: schemas.UserCreate):
+    existing_user = await get_user_async(db, email=user.email)
+    if existing_user:
+        return existing_user 
+    hashed_password = await auth.get_password_hash_async(user.password)
+    db_user = models.User(
+        name=user.name,
+        email=user.email,
+        username=user.username,
+        password=hashed_password
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
 
 def get_bill(db: Session, bill_id: int):
     return db.query(models.Bill).filter(models.Bill.id == bill_id).first()
@@ -37,123 +66,245 @@ def get_bill(db: Session, bill_id: int):
 def get_bill_by_id(db: Session, bill_id: int):
     return db.query(models.Bill).filter(models.Bill.id == bill_id).first()
 
-def get_bills(db: Session):
-    return db.query(models.Bill).all()
-
-EXTERNAL_API_URL = "https://api.openparliament.ca/bills/"
-
-def fetch_bills_from_external_api(url: str):
-    headers = {
-        'Accept': 'application/json'
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return None
-
-def seed_bills(db: Session, initial_url: str = EXTERNAL_API_URL):  
-    url = initial_url
-    while url:
-        data = fetch_bills_from_external_api(url)
-        if not data:
-            break
-
-        # Process each bill from the current page
-        for item in data.get('objects', []):
-            bill_data = {
-                "session": item.get("session"),
-                "introduced": item.get("introduced"),
-                "name": item.get("name", {}).get("en", ""),
-                "number": item.get("number"),
-                "home_chamber": "",  # Placeholder
-                "law": False,  # Placeholder
-                "sponsor_politician_url": "",  # Placeholder
-                "sponsor_politician_membership_url": "",  # Placeholder
-                "status": "",  # Placeholder
-            }
-
-            # Create or update the bill in the database
-            db_bill = models.Bill(**bill_data)
-            db_bill.pdf_url= helpers.convert_to_pdf_url(item.get('url', ''))
-            
-            db.add(db_bill)
-
-            # Fetch additional details from the URL if necessary
-            bill_details = fetch_bills_from_external_api(f"https://api.openparliament.ca{item.get('url', '')}")
-            if bill_details:
-                db_bill.status = bill_details.get("status", {}).get("en", db_bill.status)
-        
-        
-        db.commit()
-
-        # Get the next page URL
-        next_url = data.get('pagination', {}).get('next_url')
-        if next_url:
-            url = f"https://api.openparliament.ca{next_url}"
-        else:
-            url = None
-            
-            
-def create_comment(db: Session, comment: models.Comment):
+# Columns callers may ask for through ?fields=
+BILL_FIELDS = (
+    "id", "session", "introduced", "name", "number", "home_chamber", "law",
+    "sponsor_politician_url", "sponsor_politician_membership_url", "status", "pdf_url",
+    "upvotes", "downvotes",
+)
+
+def bill_columns(fields: str = None) -> list:
+    # Projection for ?fields=id,name,status; the id is always included since cursors use it
+    if not fields:
+        return [getattr(models.Bill, name) for name in BILL_FIELDS]
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BILL_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    names = ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+    return [getattr(models.Bill, name) for name in names]
+
+def get_bills(db: Session, limit: int, after_id: int = None, fields: str = None) -> list:
+    query = db.query(*bill_columns(fields)).order_by(models.Bill.id)
+    if after_id is not None:
+        query = query.filter(models.Bill.id > after_id)
+    return [dict(row._mapping) for row in query.limit(limit).all()]
+
+def iter_bills(session_factory, fields: str = None, batch_size: int = 500):
+    # Streams every bill in id order, fetching batch_size rows at a time (server-side
+    # cursor on Postgres) so the full table is never held in memory
+    columns = bill_columns(fields)
+    with session_factory() as db:
+        result = db.execute(
+            select(*columns).order_by(models.Bill.id).execution_options(yield_per=batch_size)
+        )
+        for row in result:
+            yield dict(row._mapping)
+
+def _attach_bill_texts(bills: list, texts: list):
+    texts_by_docid = defaultdict(list)
+    for text in texts:
+        texts_by_docid[text.docid].append(text)
+    for bill in bills:
+        # set_committed_value populates the attribute without marking the bill dirty
+        set_committed_value(bill, "texts", texts_by_docid.get(bill.text_docid, []))
+    return bills
+
+def load_bill_texts(db: Session, bills: list):
+    # Bill texts are linked through text_docid rather than the bill_id foreign key,
+    # so fill `texts` for a whole page of bills with a single IN (...) query.
+    docids = {bill.text_docid for bill in bills if bill.text_docid is not None}
+    texts = db.query(models.BillsBillText).filter(models.BillsBillText.docid.in_(docids)).all() if docids else []
+    return _attach_bill_texts(bills, texts)
+
+async def load_bill_texts_async(db: AsyncSession, bills: list):
+    docids = {bill.text_docid for bill in bills if bill.text_docid is not None}
+    texts = []
+    if docids:
+        texts = (await db.execute(
+            select(models.BillsBillText).where(models.BillsBillText.docid.in_(docids))
+        )).scalars().all()
+    return _attach_bill_texts(bills, texts)
+
+def bills_bill_after_cursor(cursor: str):
+    # Rows that sort after the cursor in ORDER BY introduced DESC NULLS FIRST, id DESC
+    values = helpers.decode_cursor(cursor)
+    try:
+        introduced, bill_id = values
+        introduced = date.fromisoformat(introduced) if introduced is not None else None
+        bill_id = int(bill_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if introduced is None:
+        return or_(
+            and_(models.BillsBill.introduced.is_(None), models.BillsBill.id < bill_id),
+            models.BillsBill.introduced.isnot(None)
+        )
+    return or_(
+        models.BillsBill.introduced < introduced,
+        and_(models.BillsBill.introduced == introduced, models.BillsBill.id < bill_id)
+    )
+
+async def create_comment(db: AsyncSession, comment: models.Comment):
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
     return comment
 
 
-def vote_poll(db: Session, user_id: int, poll_id: int, vote: bool ,ipaddress: str, location: str):
-    # Check if the user has already voted
-    existing_vote = db.query(models.UserPollVote).filter(
-        models.UserPollVote.user_id == user_id,
-        models.UserPollVote.poll_id == poll_id
-    ).first()
-    
-  
-    ip_vote = db.query(models.UserPollVote).filter(
+def _insert(db, model):
+    # INSERT ... ON CONFLICT is dialect specific: Postgres in production, SQLite for local runs
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+BillTally = namedtuple("BillTally", ["name_en", "upvotes", "downvotes"])
+
+def _vote_deltas(new_vote: bool, previous_vote):
+    # Counter deltas (for, against) for moving from previous_vote (None if first vote) to new_vote
+    for_delta = int(new_vote) - int(previous_vote is True)
+    against_delta = int(not new_vote) - int(previous_vote is False)
+    return for_delta, against_delta
+
+async def vote_poll(db: AsyncSession, user_id: int, poll_id: int, vote: bool ,ipaddress: str, location: str):
+    # Check the poll exists and whether this IP already voted on it in one round trip
+    ip_vote = exists().where(
         models.UserPollVote.ipaddress == ipaddress,
         models.UserPollVote.poll_id == poll_id
-    ).first()
-    
-    
-    poll = db.query(models.Poll).filter(models.Poll.id == poll_id).first()
+    )
+    poll = (await db.execute(select(models.Poll.id, ip_vote).where(models.Poll.id == poll_id))).first()
     if not poll:
         raise HTTPException(status_code=404, detail="Poll not found")
-    if ip_vote:
+    if poll[1]:
         raise HTTPException(status_code=400, detail="A vote from this IP address has already been cast for this poll.")
 
+    # Insert the vote, or flip an existing one; the unique (user_id, poll_id) constraint
+    # serializes concurrent votes from the same user
+    vote_id = (await db.execute(
+        _insert(db, models.UserPollVote)
+        .values(user_id=user_id, poll_id=poll_id, vote=vote, ipaddress=ipaddress, location=location)
+        .on_conflict_do_nothing(index_elements=["user_id", "poll_id"])
+        .returning(models.UserPollVote.id)
+    )).scalar()
+    previous_vote = None
+    if vote_id is None:
+        vote_id = (await db.execute(
+            update(models.UserPollVote)
+            .where(
+                models.UserPollVote.user_id == user_id,
+                models.UserPollVote.poll_id == poll_id,
+                models.UserPollVote.vote != vote
+            )
+            .values(vote=vote, ipaddress=ipaddress, location=location)
+            .returning(models.UserPollVote.id)
+            .execution_options(synchronize_session=False)
+        )).scalar()
+        if vote_id is None:
+            # User already voted with the same option
+            await db.rollback()
+            return None
+        previous_vote = not vote
 
-    if existing_vote:
-        if existing_vote.vote == vote:
-            return None  
-        else:
-            # If the vote is different, update it
-            if  vote:
-                poll.yes_votes +=1
-                poll.no_votes -=1
-            else:
-                poll.no_votes +=1
-                poll.yes_votes -=1
-            existing_vote.vote = vote
-            existing_vote.ipaddress = ipaddress  # Save IP address
-            existing_vote.location = location
-    else:
-        # Add new vote
-        if vote:
-            poll.yes_votes +=1
-        else:
-            poll.no_votes +=1
-        db_vote = models.UserPollVote(user_id=user_id, poll_id=poll_id, vote=vote,ipaddress=ipaddress, location=location)
-        db.add(db_vote)
+    yes_delta, no_delta = _vote_deltas(vote, previous_vote)
+    await db.execute(
+        update(models.Poll)
+        .where(models.Poll.id == poll_id)
+        .values(yes_votes=models.Poll.yes_votes + yes_delta, no_votes=models.Poll.no_votes + no_delta)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return {"id": vote_id, "user_id": user_id, "poll_id": poll_id, "vote": vote}
 
-    db.commit()
-    db.refresh(poll) 
-    db.refresh(existing_vote if existing_vote else db_vote)
-    return existing_vote if existing_vote else db_vote
+async def vote_bill(db: AsyncSession, user_id: int, bill_id: int, upvote: bool):
+    # Returns (vote, tally); tally is None when the vote did not change
+    try:
+        vote_id = (await db.execute(
+            _insert(db, models.UserBillVote)
+            .values(user_id=user_id, bill_id=bill_id, upvote=upvote)
+            .on_conflict_do_nothing(index_elements=["user_id", "bill_id"])
+            .returning(models.UserBillVote.id)
+        )).scalar()
+    except IntegrityError:
+        # Foreign key violation: the bill does not exist
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Bill not found")
+
+    previous_vote = None
+    if vote_id is None:
+        # The user voted before: lock their row and read the old vote, which may be NULL
+        vote_id, previous_vote = (await db.execute(
+            select(models.UserBillVote.id, models.UserBillVote.upvote)
+            .where(
+                models.UserBillVote.user_id == user_id,
+                models.UserBillVote.bill_id == bill_id
+            )
+            .with_for_update()
+        )).one()
+        if previous_vote == upvote:
+            # No change in vote
+            await db.rollback()
+            return {"id": vote_id, "user_id": user_id, "bill_id": bill_id, "upvote": upvote}, None
+        await db.execute(
+            update(models.UserBillVote)
+            .where(models.UserBillVote.id == vote_id)
+            .values(upvote=upvote)
+            .execution_options(synchronize_session=False)
+        )
+
+    up_delta, down_delta = _vote_deltas(upvote, previous_vote)
+    if vote_buffer.enabled:
+        # Write-behind mode: commit the vote row now and leave the counter row to the periodic flush
+        tally = (await db.execute(
+            select(models.BillsBill.name_en, models.BillsBill.upvotes, models.BillsBill.downvotes)
+            .where(models.BillsBill.id == bill_id)
+        )).first()
+        if tally is None:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail="Bill not found")
+        await db.commit()
+        vote_buffer.add(bill_id, up_delta, down_delta)
+        pending_up, pending_down = vote_buffer.pending(bill_id)
+        tally = BillTally(tally.name_en, tally.upvotes + pending_up, tally.downvotes + pending_down)
+        return {"id": vote_id, "user_id": user_id, "bill_id": bill_id, "upvote": upvote}, tally
+
+    tally = (await db.execute(
+        update(models.BillsBill)
+        .where(models.BillsBill.id == bill_id)
+        .values(
+            upvotes=models.BillsBill.upvotes + up_delta,
+            downvotes=models.BillsBill.downvotes + down_delta
+        )
+        .returning(models.BillsBill.name_en, models.BillsBill.upvotes, models.BillsBill.downvotes)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if tally is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Bill not found")
+    await db.commit()
+    return {"id": vote_id, "user_id": user_id, "bill_id": bill_id, "upvote": upvote}, BillTally(*tally)
 
 def get_polls(db: Session):
     return db.query(models.Poll).all()
 
+def get_polls_with_user_vote(db: Session, user_id: int, skip: int = 0, limit: int = None):
+    # Resolve the user's vote for every poll with a single outer join
+    query = db.query(models.Poll, models.UserPollVote.vote).outerjoin(
+        models.UserPollVote,
+        and_(
+            models.UserPollVote.poll_id == models.Poll.id,
+            models.UserPollVote.user_id == user_id
+        )
+    ).order_by(models.Poll.id).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+
+    polls = []
+    for poll, vote in query.all():
+        poll.current_user_vote = vote  # None when the user has not voted
+        polls.append(poll)
+    return polls
+
 def create_poll(db: Session, poll: schemas.PollCreate):
     db_poll = models.Poll(question=poll.question)
     db.add(db_poll)
@@ -1,17 +1,161 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Async drivers for the same database, used by the async endpoints
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(url: str) -> str:
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or get_async_database_url(DATABASE_URL)
+
+# Connection pool settings. Every uvicorn worker has its own pools, so the Postgres backends
+# used by the app are at most workers * 2 engines * (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 disables it
+
+
+class PoolMetrics:
+    # Counters for one engine's pool, exposed through /metrics/db-pool
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool = None
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    def record_checkout(self, wait: float, opened_overflow: bool):
+        with self.lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if opened_overflow:
+                self.overflow_events += 1
+
+    def record_timeout(self, wait: float):
+        with self.lock:
+            self.timeouts += 1
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            stats = {
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+            }
+        if isinstance(self.pool, QueuePool):
+            stats.update({
+                "pool_size": self.pool.size(),
+                "checked_out": self.pool.checkedout(),
+                "idle": self.pool.checkedin(),
+                "overflow": max(self.pool.overflow(), 0),
+            })
+        return stats
+
+
+class MeteredPoolMixin:
+    # Times every checkout; _do_get is where QueuePool waits for or opens a connection
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        overflow_before = self._overflow
+        try:
+            record = super()._do_get()
+        except TimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - started)
+            raise
+        opened_overflow = self._overflow > overflow_before and self._overflow > 0
+        self.metrics.record_checkout(time.perf_counter() - started, opened_overflow)
+        return record
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        self.metrics.pool = pool
+        return pool
+
+
+class MeteredQueuePool(MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+sync_pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        # SQLite is only used for local runs; keep SQLAlchemy's default pooling for it
+        return {}
+    options = {
+        "poolclass": MeteredAsyncQueuePool if is_async else MeteredQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS and url.get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def _attach_metrics(engine, metrics: PoolMetrics):
+    metrics.pool = engine.pool
+    if isinstance(engine.pool, MeteredPoolMixin):
+        engine.pool.metrics = metrics
+
+
+def pool_status() -> dict:
+    return {"sync": sync_pool_metrics.snapshot(), "async": async_pool_metrics.snapshot()}
+
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+_attach_metrics(engine, sync_pool_metrics)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+_attach_metrics(async_engine.sync_engine, async_pool_metrics)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 # Dependency for getting DB session
 def get_db():
     db = SessionLocal()
@@ -19,3 +163,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency for getting an async DB session in async def endpoints
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
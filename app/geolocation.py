@@ -0,0 +1,174 @@
+import os
+import csv
+import bisect
+import logging
+import ipaddress
+import httpx
+from sqlalchemy import update
+from . import models
+from .cache import TTLCache
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# City lookup for poll votes. The provider is chosen with GEOLOCATION_PROVIDER: "ipinfo"
+# (ipinfo.io over one shared pooled client), "csv" (an offline range database at
+# GEOLOCATION_CSV_PATH) or "none". Results are cached per /24 (IPv4) or /48 (IPv6) network,
+# since neighbouring addresses almost always resolve to the same city. With
+# GEOLOCATION_DEFERRED the vote is stored first and its location is filled in afterwards.
+GEOLOCATION_PROVIDER = os.getenv("GEOLOCATION_PROVIDER", "ipinfo")
+GEOLOCATION_CSV_PATH = os.getenv("GEOLOCATION_CSV_PATH", "")
+GEOLOCATION_DEFERRED = os.getenv("GEOLOCATION_DEFERRED", "true").lower() in ("1", "true", "yes")
+GEOLOCATION_TIMEOUT = float(os.getenv("GEOLOCATION_TIMEOUT", "2"))
+GEOLOCATION_CACHE_TTL = float(os.getenv("GEOLOCATION_CACHE_TTL", "86400"))
+IPINFO_URL = "https://ipinfo.io/{ip}/json"
+IPINFO_TOKEN = os.getenv("IPINFO_TOKEN")
+
+UNKNOWN_CITY = "Unknown city"
+UNKNOWN_LOCATION = "Unknown location"
+
+location_cache = TTLCache(ttl=GEOLOCATION_CACHE_TTL, max_size=10000)
+
+
+def cache_key(ip: str):
+    # The /24 or /48 network of the address, or None if it can't be located at all
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    if not address.is_global:
+        return None
+    prefix = 24 if address.version == 4 else 48
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+def describe(location: dict) -> str:
+    # Same wording the votes have always stored
+    return (location.get("city") or UNKNOWN_CITY) if location else UNKNOWN_LOCATION
+
+
+class IpinfoProvider:
+    def __init__(self, url: str = IPINFO_URL, token: str = IPINFO_TOKEN, timeout: float = GEOLOCATION_TIMEOUT):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self._client = None
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                params={"token": self.token} if self.token else None,
+            )
+        return self._client
+
+    async def lookup(self, ip: str):
+        try:
+            response = await self.client().get(self.url.format(ip=ip))
+            return response.json() if response.status_code == 200 else None
+        except (httpx.HTTPError, ValueError) as e:
+            # ValueError: a 200 whose body is not JSON, e.g. a proxy's error page
+            logger.warning("IP lookup for %s failed: %s", ip, e)
+            return None
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class CsvRangeProvider:
+    # Offline lookups from a CSV of start_ip,end_ip,city[,region,country] rows, e.g. an
+    # export of a free IP-to-city database. Ranges must not overlap.
+    def __init__(self, path: str):
+        ranges = {4: [], 6: []}
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#"):
+                    continue
+                try:
+                    start, end = ipaddress.ip_address(row[0].strip()), ipaddress.ip_address(row[1].strip())
+                except ValueError:
+                    continue  # header or malformed row
+                fields = [field.strip() for field in row[2:5]]
+                location = dict(zip(("city", "region", "country"), fields))
+                ranges[start.version].append((int(start), int(end), location))
+        self._starts = {}
+        self._ranges = {}
+        for version, rows in ranges.items():
+            rows.sort(key=lambda row: row[0])
+            self._starts[version] = [row[0] for row in rows]
+            self._ranges[version] = rows
+
+    async def lookup(self, ip: str):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        index = bisect.bisect_right(self._starts[address.version], int(address)) - 1
+        if index < 0:
+            return None
+        start, end, location = self._ranges[address.version][index]
+        return location if int(address) <= end else None
+
+    async def close(self):
+        pass
+
+
+class NoProvider:
+    async def lookup(self, ip: str):
+        return None
+
+    async def close(self):
+        pass
+
+
+def make_provider(name: str = GEOLOCATION_PROVIDER):
+    if name == "csv":
+        return CsvRangeProvider(GEOLOCATION_CSV_PATH)
+    if name == "none":
+        return NoProvider()
+    return IpinfoProvider()
+
+
+provider = make_provider()
+
+
+def cached_location(ip: str):
+    # The stored description if it is known without a lookup, else None
+    key = cache_key(ip)
+    if key is None:
+        return UNKNOWN_LOCATION
+    return location_cache.get(key)
+
+
+async def locate(ip: str) -> str:
+    location = cached_location(ip)
+    if location is not None:
+        return location
+    result = await provider.lookup(ip)
+    if result is not None:
+        # Failed lookups are not cached, so the next vote from the network tries again
+        location_cache.put(cache_key(ip), describe(result))
+    return describe(result)
+
+
+async def update_vote_location(vote_id: int, ip: str):
+    # Runs after the vote response is sent
+    try:
+        location = await locate(ip)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.UserPollVote)
+                .where(models.UserPollVote.id == vote_id, models.UserPollVote.ipaddress == ip)
+                .values(location=location)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+    except Exception:
+        logger.exception("Failed to store the location of poll vote %s", vote_id)
+
+
+async def close():
+    await provider.close()
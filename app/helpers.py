@@ -1,11 +1,26 @@
 
 import os
+import base64
+import functools
+import hashlib
+import io
+import itertools
+import json
+import logging
+import random
+import shutil
+import threading
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import requests
-from fastapi import Request
+from fastapi import Request, HTTPException
 import re
 import pdfplumber
-from openai import OpenAI
-import httpx
+from openai import OpenAI, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
 
 client = OpenAI(
     api_key= os.getenv('OPENAI_API_KEY')
@@ -29,41 +44,174 @@ def generate(text:str):
     return summary
 
 def split_text(text: str, max_characters: int) -> list:
+    # Works on offsets so the remainder of the text is never copied
     chunks = []
-    while len(text) > max_characters:
-        split_index = text.rfind(' ', 0, max_characters)
-        if split_index == -1:
-            split_index = max_characters
+    start, length = 0, len(text)
+    while start < length and text[start].isspace():
+        start += 1
+    while length - start > max_characters:
+        split_index = text.rfind(' ', start, start + max_characters)
+        if split_index <= start:
+            split_index = start + max_characters
         
-        chunks.append(text[:split_index].strip())
-        text = text[split_index:].strip()
+        chunks.append(text[start:split_index].strip())
+        start = split_index
+        while start < length and text[start].isspace():
+            start += 1
     
-    if text:
-        chunks.append(text)
+    if start < length:
+        chunks.append(text[start:].strip())
     
     return chunks
 
-def generate_summary(text: str) -> str:
-    if len(text) > 15000:
-        try:
-            max_characters = 15000  # Adjust based on testing
-        
-            chunks = split_text(text, max_characters)
-            section_summaries = [generate(chunk) for chunk in chunks]
-        
-            combined_summary = ' '.join(section_summaries)
-            final_summary = generate(combined_summary)
-        
-            return combined_summary
-        except Exception as e:
-            return f"Error generating summary {e}"
-    else:    
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text with OpenAI tokenizers
+    return (len(text) + 3) // 4
+
+@functools.lru_cache(maxsize=None)
+def get_token_counter(model: str = "gpt-3.5-turbo"):
+    # Exact counts when tiktoken and its encoding are available, the character estimate otherwise
+    try:
+        import tiktoken
+    except ImportError:
+        # tiktoken is in requirements.txt; without it chunks are sized by estimate and can
+        # overshoot the model's context on text that tokenizes densely
+        logger.warning("Counting tokens by estimate; tiktoken is not installed")
+        return estimate_tokens
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except Exception as e:
+        # The encoding file is downloaded on first use and may be unreachable
+        logger.warning("Counting tokens by estimate; could not load the %s encoding: %s", model, e)
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+def count_tokens(text: str) -> int:
+    # Loads the tokenizer on first call rather than at import time
+    return get_token_counter()(text)
+
+# Places a chunk may end, most preferred first: section breaks, the start of a numbered
+# section or lettered clause, the end of a sentence or clause, then any whitespace
+CHUNK_BOUNDARIES = [
+    re.compile(r'\n\s*\n'),
+    re.compile(r'[.;:]\s+(?=(?:\(\w{1,4}\)|\d+(?:\.\d+)*\s|PART\b|DIVISION\b|SCHEDULE\b))'),
+    re.compile(r'[.;:!?]\s+'),
+    re.compile(r'\s+'),
+]
+
+def _chunk_end(text: str, start: int, end: int) -> int:
+    # Last preferred boundary in the back half of text[start:end], so chunks stay reasonably full
+    search_from = start + (end - start) // 2
+    for pattern in CHUNK_BOUNDARIES:
+        last = None
+        for last in pattern.finditer(text, search_from, end):
+            pass
+        if last is not None:
+            return last.end()
+    return end
+
+def iter_token_chunks(text: str, max_tokens: int, token_counter=None, chars_per_token: int = 4):
+    # Streams chunks of at most max_tokens tokens, cutting on clause and section boundaries.
+    # Each chunk is measured once or a few times, so the whole pass is linear in the text.
+    token_counter = token_counter or count_tokens
+    start, length = 0, len(text)
+    while start < length:
+        while start < length and text[start].isspace():
+            start += 1
+        if start >= length:
+            break
+
+        end = min(length, start + max_tokens * chars_per_token)
+        if end < length:
+            end = _chunk_end(text, start, end)
+        while token_counter(text[start:end]) > max_tokens and end - start > 1:
+            # Denser text than estimated: shrink the window and snap back to a boundary
+            end = _chunk_end(text, start, start + (end - start) * 3 // 4)
+
+        chunk = text[start:end].strip()
+        if chunk:
+            yield chunk
+        start = end
+
+# Long bills are summarized map-reduce style: chunk summaries run in parallel on a shared,
+# bounded pool (so concurrent requests can't exceed the OpenAI rate limit together), then the
+# joined summaries are summarized again until they fit into a single call.
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3500"))  # Adjust based on testing
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+SUMMARY_MAX_RETRIES = int(os.getenv("SUMMARY_MAX_RETRIES", "5"))
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+_summary_executor = None
+_summary_executor_lock = threading.Lock()
+
+def get_summary_executor() -> ThreadPoolExecutor:
+    global _summary_executor
+    with _summary_executor_lock:
+        if _summary_executor is None:
+            _summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_MAX_CONCURRENCY, thread_name_prefix="summary")
+        return _summary_executor
+
+def generate_with_retry(text: str, summarize=None, max_retries: int = None) -> str:
+    # Exponential backoff with jitter on rate limits and transient API errors
+    summarize = summarize or generate
+    max_retries = SUMMARY_MAX_RETRIES if max_retries is None else max_retries
+    delay = 1.0
+    for attempt in range(max_retries + 1):
         try:
-            response = generate(text)
-            return response
-        except Exception as e:
-            return f"Error generating summary {e}"
+            return summarize(text)
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            response = getattr(e, "response", None)
+            retry_after = response.headers.get("retry-after") if response is not None else None
+            try:
+                wait = float(retry_after)
+            except (TypeError, ValueError):
+                wait = delay + random.uniform(0, delay)
+            time.sleep(min(wait, 60))
+            delay = min(delay * 2, 30)
+
+def summarize_text(text: str, summarize=None, max_tokens: int = SUMMARY_CHUNK_TOKENS, executor=None) -> str:
+    # Raises on OpenAI errors so callers can tell a failure from a summary
+    summarize = summarize or generate
+    chunks = iter_token_chunks(text, max_tokens)
+    first_chunk = next(chunks, "")
+    second_chunk = next(chunks, None)
+    if second_chunk is None:
+        return generate_with_retry(first_chunk, summarize)
+
+    executor = executor or get_summary_executor()
+    all_chunks = itertools.chain((first_chunk, second_chunk), chunks)
+    section_summaries = list(executor.map(lambda chunk: generate_with_retry(chunk, summarize), all_chunks))
 
+    combined_summary = ' '.join(section_summaries)
+    if len(combined_summary) >= len(text):
+        raise ValueError("Chunk summaries are not shorter than the text they summarize")
+    # Reduce step: recurses while the combined summaries still exceed one call
+    return summarize_text(combined_summary, summarize, max_tokens, executor)
+
+
+def encode_cursor(*values) -> str:
+    # Opaque keyset pagination token, e.g. (introduced, id) of the last row on a page
+    raw = json.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def format_sse(data: dict, event: str = None) -> str:
+    # One server-sent event frame
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, default=str)}\n\n"
 
 
 def convert_to_pdf_url(general_url):
@@ -93,31 +241,107 @@ def clean_text(text: str) -> str:
     return text
 
 
-def fetch_pdf_text(pdf_url: str) -> str:
-    response = requests.get(pdf_url)
+# PDF text extraction. The download streams into a spooled buffer (memory first, disk past
+# PDF_SPOOL_MAX_BYTES) while it is hashed, the Private and Government URLs are probed at the
+# same time, and large documents are split into page ranges extracted on a process pool. The
+# workers open a per-call temporary copy of the file by path rather than receiving its bytes.
+# Text is cached by content hash, and each URL remembers its hash for PDF_CACHE_TTL seconds.
+PDF_SPOOL_MAX_BYTES = int(os.getenv("PDF_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_CACHE_TTL = float(os.getenv("PDF_CACHE_TTL", "86400"))
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", "60"))
+
+pdf_url_hashes = TTLCache(ttl=PDF_CACHE_TTL, max_size=4096)
+pdf_texts = TTLCache(ttl=PDF_CACHE_TTL, max_size=64)
+
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+        return _pdf_executor
+
+def shutdown_pdf_executor():
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is not None:
+            _pdf_executor.shutdown(wait=False, cancel_futures=True)
+            _pdf_executor = None
+
+def _extract_page_range(path: str, start: int, stop: int) -> list:
+    # Runs in a worker process
+    with pdfplumber.open(path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:stop]]
+
+def extract_pdf_text(buffer) -> str:
+    buffer.seek(0)
+    with pdfplumber.open(buffer) as pdf:
+        page_count = len(pdf.pages)
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_WORKERS < 2:
+            return "".join(page.extract_text() or "" for page in pdf.pages)
+
+    buffer.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as copy:
+        shutil.copyfileobj(buffer, copy)
+        copy.flush()
+        step = -(-page_count // PDF_EXTRACT_WORKERS)
+        executor = get_pdf_executor()
+        futures = [executor.submit(_extract_page_range, copy.name, start, min(start + step, page_count))
+                   for start in range(0, page_count, step)]
+        return "".join(text for future in futures for text in future.result())
+
+def _open_pdf_download(url: str):
+    # requests.get uses a session of its own, so concurrent probes share nothing
+    try:
+        response = requests.get(url, stream=True, timeout=PDF_DOWNLOAD_TIMEOUT)
+    except requests.RequestException:
+        return None
     if response.status_code != 200:
-        pdf_url = pdf_url.replace("/Private/", "/Government/")
-        response = requests.get(pdf_url)
-        if response.status_code != 200:
-            raise HTTPException(status_code=404, detail="PDF not found")
+        response.close()
+        return None
+    return response
 
-    with open("temp.pdf", "wb") as f:
-        f.write(response.content)
+def _download_pdf(pdf_url: str):
+    # Probes the URL and its Government variant concurrently and streams the first that
+    # exists, preferring the URL as given. Returns (url, spooled file, sha256 hex digest).
+    candidates = [pdf_url]
+    if "/Private/" in pdf_url:
+        candidates.append(pdf_url.replace("/Private/", "/Government/"))
 
-    text = ""
-    with pdfplumber.open("temp.pdf") as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
+    with ThreadPoolExecutor(max_workers=len(candidates)) as probes:
+        responses = list(probes.map(_open_pdf_download, candidates))
+        chosen = next((i for i, response in enumerate(responses) if response is not None), None)
+        for i, response in enumerate(responses):
+            if response is not None and i != chosen:
+                response.close()
+        if chosen is None:
+            raise HTTPException(status_code=404, detail="PDF not found")
 
-    # Remove temp file
-    os.remove("temp.pdf")
-    return text
+        digest = hashlib.sha256()
+        buffer = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+        with responses[chosen] as response:
+            for block in response.iter_content(chunk_size=64 * 1024):
+                digest.update(block)
+                buffer.write(block)
+        return candidates[chosen], buffer, digest.hexdigest()
 
+def fetch_pdf_text(pdf_url: str) -> str:
+    content_hash = pdf_url_hashes.get(pdf_url)
+    if content_hash is not None:
+        text = pdf_texts.get(content_hash)
+        if text is not None:
+            return text
 
-async def get_location_from_ip(ip: str):
-    url = f"https://ipinfo.io/{ip}/json"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        if response.status_code == 200:
-            return response.json()
-        return None
\ No newline at end of file
+    url, buffer, content_hash = _download_pdf(pdf_url)
+    with buffer:
+        text = pdf_texts.get(content_hash)
+        if text is None:
+            text = extract_pdf_text(buffer)
+            pdf_texts.put(content_hash, text)
+    pdf_url_hashes.put(pdf_url, content_hash)
+    pdf_url_hashes.put(url, content_hash)
+    return text
@@ -0,0 +1,447 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import aclosing
+from datetime import date, datetime
+import httpx
+from sqlalchemy import func, or_, select, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, helpers, crud
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Bulk importer for the openparliament bill list. Listing pages are walked in order (each
+# page names the next), the per-bill detail requests of a page run concurrently over one
+# pooled client under a global rate limit, and each page is upserted in a single statement
+# together with a checkpoint of the next page URL, so an interrupted run resumes where it
+# stopped instead of starting over.
+API_BASE_URL = "https://api.openparliament.ca"
+BILLS_PATH = "/bills/"
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "8"))
+IMPORT_RATE_LIMIT = float(os.getenv("IMPORT_RATE_LIMIT", "10"))  # requests per second, 0 for none
+IMPORT_MAX_RETRIES = int(os.getenv("IMPORT_MAX_RETRIES", "5"))
+IMPORT_TIMEOUT = float(os.getenv("IMPORT_TIMEOUT", "30"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Incremental sync: bills introduced on or after the high-water mark are listed again, and
+# only bills of the latest session that haven't reached a final status are re-checked. The
+# session listing is requested conditionally first, so an unchanged session costs one 304;
+# statuses carried by the listing are applied directly, and only bills listed without one
+# get a (conditional) detail request.
+SYNC_CHECKPOINT = "bills_sync"
+SYNC_STATUS_CHECKPOINT = "bills_sync_statuses"
+FINAL_STATUS_CODES = {"RoyalAssentGiven", "BillDefeated", "WillNotBeProceededWith", "BillNotActive"}
+
+
+class RateLimiter:
+    # Spaces request starts at least 1/rate seconds apart across all tasks
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class BillImporter:
+    def __init__(self, base_url: str = API_BASE_URL, concurrency: int = IMPORT_CONCURRENCY,
+                 rate_limit: float = IMPORT_RATE_LIMIT, session_factory=AsyncSessionLocal, transport=None):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate_limit)
+        self.session_factory = session_factory
+        self.transport = transport  # e.g. httpx.MockTransport for a local fixture server
+        self.errors = 0  # Requests that failed for good
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Accept": "application/json"},
+            timeout=IMPORT_TIMEOUT,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            transport=self.transport,
+        )
+
+    async def request(self, client: httpx.AsyncClient, url: str, headers: dict = None):
+        # Retries rate limits, server errors and network failures with backoff. Returns the
+        # 200 or 304 response, or None once the request has failed for good.
+        delay = 1.0
+        for attempt in range(IMPORT_MAX_RETRIES + 1):
+            await self.limiter.wait()
+            try:
+                response = await client.get(url, headers=headers)
+            except httpx.TransportError as e:
+                if attempt == IMPORT_MAX_RETRIES:
+                    self.errors += 1
+                    raise
+                logger.warning("Request to %s failed (%s), retrying", url, e)
+            else:
+                if response.status_code in (200, 304):
+                    return response
+                if response.status_code not in RETRY_STATUSES or attempt == IMPORT_MAX_RETRIES:
+                    logger.warning("Request to %s returned %s", url, response.status_code)
+                    self.errors += 1
+                    return None
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, 60)
+
+    async def fetch_json(self, client: httpx.AsyncClient, url: str):
+        response = await self.request(client, url)
+        return response.json() if response is not None and response.status_code == 200 else None
+
+    async def fetch_detail(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, item: dict):
+        if not item.get("url"):
+            return None
+        async with semaphore:
+            return await self.fetch_json(client, item["url"])
+
+    async def pages(self, client: httpx.AsyncClient, page: dict):
+        # Yields (items, details, next_url) from an already fetched listing page onwards
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while page is not None:
+            next_url = page.get("pagination", {}).get("next_url")
+            # Fetch the next listing page while this page's details are loading
+            next_page = asyncio.create_task(self.fetch_json(client, next_url)) if next_url else None
+            try:
+                items = page.get("objects", [])
+                details = await asyncio.gather(*(self.fetch_detail(client, semaphore, item) for item in items))
+                yield items, details, next_url
+            except BaseException:
+                if next_page is not None:
+                    next_page.cancel()
+                raise
+            page = await next_page if next_page is not None else None
+
+    async def run(self, initial_url: str = BILLS_PATH, name: str = "bills", restart: bool = False,
+                  progress=None) -> dict:
+        # progress, if given, is awaited with the running counters after every stored page
+        started = time.monotonic()
+        stored_this_run = 0
+        async with self.session_factory() as db:
+            checkpoint = await db.get(models.ImportCheckpoint, name)
+            if checkpoint is None:
+                checkpoint = models.ImportCheckpoint(name=name)
+                db.add(checkpoint)
+            resumed = not restart and checkpoint.completed_at is None and bool(checkpoint.next_url)
+            if not resumed:
+                checkpoint.next_url = initial_url
+                checkpoint.pages = 0
+                checkpoint.items = 0
+                checkpoint.started_at = datetime.utcnow()
+                checkpoint.completed_at = None
+            await db.commit()
+            url = checkpoint.next_url
+            if resumed:
+                logger.info("Resuming %s import at %s", name, url)
+
+            async with self.client() as client:
+                page = await self.fetch_json(client, url)
+                async with aclosing(self.pages(client, page)) as pages:
+                    async for items, details, next_url in pages:
+                        rows = [bill_row(item, detail) for item, detail in zip(items, details)]
+                        stored = await upsert_bills(db, rows)
+                        checkpoint.next_url = next_url
+                        checkpoint.pages += 1
+                        checkpoint.items += stored
+                        if next_url is None:
+                            checkpoint.completed_at = datetime.utcnow()
+                        # The page and its checkpoint are stored together
+                        await db.commit()
+                        stored_this_run += stored
+                        if progress is not None:
+                            await progress(
+                                pages=checkpoint.pages,
+                                bills=checkpoint.items,
+                                errors=self.errors,
+                                rate=round(stored_this_run / max(time.monotonic() - started, 1e-6), 2),
+                            )
+
+            if checkpoint.completed_at is None:
+                logger.warning("%s import stopped at %s; run it again to resume", name, checkpoint.next_url)
+            return {
+                "pages": checkpoint.pages,
+                "bills": checkpoint.items,
+                "errors": self.errors,
+                "resumed": resumed,
+                "completed": checkpoint.completed_at is not None,
+            }
+
+    async def sync(self, progress=None) -> dict:
+        # Fetches only what changed since the last sync; falls back to a full import when
+        # nothing has been imported yet
+        started = time.monotonic()
+        async with self.session_factory() as db:
+            checkpoint = await db.get(models.ImportCheckpoint, SYNC_CHECKPOINT)
+            if checkpoint is None:
+                checkpoint = models.ImportCheckpoint(name=SYNC_CHECKPOINT)
+                db.add(checkpoint)
+            previous_mark = checkpoint.high_water_mark or (
+                await db.execute(select(func.max(models.Bill.introduced)))
+            ).scalar()
+            if previous_mark is None:
+                await db.rollback()
+                return await self.initial_sync(started, progress)
+            high_water_mark = previous_mark
+            checkpoint.started_at = datetime.utcnow()
+            checkpoint.completed_at = None
+            checkpoint.pages = 0
+            checkpoint.items = 0
+
+            async def report(stage: str):
+                if progress is not None:
+                    await progress(
+                        stage=stage,
+                        pages=checkpoint.pages,
+                        bills=checkpoint.items,
+                        errors=self.errors,
+                        rate=round(checkpoint.items / max(time.monotonic() - started, 1e-6), 2),
+                    )
+
+            async with self.client() as client:
+                # New bills: list from the high-water mark on (inclusive, for same-day additions).
+                # next_url holds the listing URL of the previous sync, whose validators still apply.
+                url = sync_listing_url(previous_mark)
+                validators = {}
+                if checkpoint.next_url == url:
+                    validators = conditional_headers(checkpoint.etag, checkpoint.last_modified)
+                response = await self.request(client, url, validators)
+                if response is not None and response.status_code == 200:
+                    async with aclosing(self.pages(client, response.json())) as pages:
+                        async for items, details, _ in pages:
+                            rows = [bill_row(item, detail) for item, detail in zip(items, details)]
+                            checkpoint.items += await upsert_bills(db, rows)
+                            checkpoint.pages += 1
+                            high_water_mark = max([high_water_mark, *(row["introduced"] for row in rows if row["introduced"])])
+                            await db.commit()
+                            await report("new")
+                    checkpoint.etag = response.headers.get("ETag")
+                    checkpoint.last_modified = response.headers.get("Last-Modified")
+
+                # Status changes of bills still in progress
+                checkpoint.items += await self.sync_statuses(db, client)
+
+            if high_water_mark != previous_mark:
+                # The next sync lists from a new mark, so these validators no longer apply
+                checkpoint.etag = checkpoint.last_modified = None
+            checkpoint.next_url = sync_listing_url(high_water_mark)
+            checkpoint.high_water_mark = high_water_mark
+            checkpoint.completed_at = datetime.utcnow()
+            await db.commit()
+            await report("done")
+            return {
+                "pages": checkpoint.pages,
+                "bills": checkpoint.items,
+                "errors": self.errors,
+                "high_water_mark": high_water_mark.isoformat(),
+                "seconds": round(time.monotonic() - started, 2),
+            }
+
+    async def initial_sync(self, started: float, progress=None) -> dict:
+        # First sync on an empty database: a full import, after which the mark is recorded
+        result = await self.run(restart=True, progress=progress)
+        async with self.session_factory() as db:
+            high_water_mark = (await db.execute(select(func.max(models.Bill.introduced)))).scalar()
+            checkpoint = await db.get(models.ImportCheckpoint, SYNC_CHECKPOINT)
+            if checkpoint is None:
+                checkpoint = models.ImportCheckpoint(name=SYNC_CHECKPOINT)
+                db.add(checkpoint)
+            checkpoint.started_at = datetime.utcnow()
+            checkpoint.pages = result["pages"]
+            checkpoint.items = result["bills"]
+            checkpoint.high_water_mark = high_water_mark
+            checkpoint.next_url = sync_listing_url(high_water_mark) if high_water_mark else None
+            checkpoint.etag = checkpoint.last_modified = None
+            checkpoint.completed_at = datetime.utcnow() if result["completed"] else None
+            await db.commit()
+        return {
+            "pages": result["pages"],
+            "bills": result["bills"],
+            "errors": result["errors"],
+            "high_water_mark": high_water_mark.isoformat() if high_water_mark else None,
+            "seconds": round(time.monotonic() - started, 2),
+        }
+
+    async def sync_statuses(self, db: AsyncSession, client: httpx.AsyncClient) -> int:
+        # Re-checks open bills of the latest session; returns the number of bills updated
+        latest_session = (await db.execute(
+            select(models.Bill.session)
+            .where(models.Bill.introduced.isnot(None))
+            .order_by(models.Bill.introduced.desc())
+            .limit(1)
+        )).scalar()
+        if latest_session is None:
+            return 0
+        bills = (await db.execute(
+            select(
+                models.Bill.id, models.Bill.session, models.Bill.number, models.Bill.status,
+                models.Bill.status_code, models.Bill.etag, models.Bill.last_modified
+            )
+            .where(
+                models.Bill.session == latest_session,
+                models.Bill.number.isnot(None),
+                or_(models.Bill.status_code.is_(None), models.Bill.status_code.notin_(FINAL_STATUS_CODES))
+            )
+        )).all()
+        if not bills:
+            return 0
+
+        checkpoint = await db.get(models.ImportCheckpoint, SYNC_STATUS_CHECKPOINT)
+        if checkpoint is None:
+            checkpoint = models.ImportCheckpoint(name=SYNC_STATUS_CHECKPOINT)
+            db.add(checkpoint)
+        url = status_listing_url(latest_session)
+        validators = {}
+        if checkpoint.next_url == url:
+            validators = conditional_headers(checkpoint.etag, checkpoint.last_modified)
+        response = await self.request(client, url, validators)
+        if response is None or response.status_code == 304:
+            return 0
+
+        open_bills = {bill.number: bill for bill in bills}
+        changes = []
+        unlisted = []  # open bills whose listing entry has no status
+        page = response.json()
+        while page is not None:
+            for item in page.get("objects", []):
+                bill = open_bills.pop(item.get("number"), None)
+                if bill is None:
+                    continue
+                if "status_code" in item:
+                    change = status_change(bill, item)
+                    if change:
+                        changes.append(change)
+                else:
+                    unlisted.append(bill)
+            next_url = page.get("pagination", {}).get("next_url")
+            page = await self.fetch_json(client, next_url) if next_url else None
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(bill):
+            async with semaphore:
+                response = await self.request(
+                    client,
+                    f"{BILLS_PATH}{bill.session}/{bill.number}/",
+                    conditional_headers(bill.etag, bill.last_modified)
+                )
+            if response is None or response.status_code == 304:
+                return None
+            return status_change(bill, response.json(), response.headers)
+
+        changes += [change for change in await asyncio.gather(*(check(bill) for bill in unlisted)) if change]
+        if changes:
+            await db.execute(
+                update(models.Bill.__table__)
+                .where(models.Bill.__table__.c.id == bindparam("b_id"))
+                .values(
+                    status=bindparam("status"),
+                    status_code=bindparam("status_code"),
+                    etag=bindparam("etag"),
+                    last_modified=bindparam("last_modified"),
+                ),
+                changes
+            )
+        # The listing's validators are only kept once its changes are stored
+        checkpoint.next_url = url
+        checkpoint.etag = response.headers.get("ETag")
+        checkpoint.last_modified = response.headers.get("Last-Modified")
+        await db.commit()
+        return len(changes)
+
+
+def sync_listing_url(high_water_mark: date) -> str:
+    return f"{BILLS_PATH}?introduced__gte={high_water_mark.isoformat()}"
+
+
+def status_listing_url(session: str) -> str:
+    return f"{BILLS_PATH}?session={session}"
+
+
+def status_change(bill, data: dict, headers=None):
+    # The update for `bill` from a listing entry or detail response, or None if nothing changed.
+    # Validators only come with detail responses; listing entries keep the stored ones.
+    change = {
+        "b_id": bill.id,
+        "status": (data.get("status") or {}).get("en") or bill.status,
+        "status_code": data.get("status_code") or bill.status_code,
+        "etag": headers.get("ETag") if headers is not None else bill.etag,
+        "last_modified": headers.get("Last-Modified") if headers is not None else bill.last_modified,
+    }
+    if all(change[key] == getattr(bill, key) for key in ("status", "status_code", "etag", "last_modified")):
+        return None
+    return change
+
+
+def conditional_headers(etag: str = None, last_modified: str = None) -> dict:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def bill_row(item: dict, detail: dict = None) -> dict:
+    introduced = item.get("introduced")
+    try:
+        pdf_url = helpers.convert_to_pdf_url(item.get("url", ""))
+    except (ValueError, IndexError):
+        pdf_url = None
+    return {
+        "session": item.get("session"),
+        "introduced": date.fromisoformat(introduced) if introduced else None,
+        "name": (item.get("name") or {}).get("en", ""),
+        "number": item.get("number"),
+        "home_chamber": "",  # Placeholder
+        "law": False,  # Placeholder
+        "sponsor_politician_url": "",  # Placeholder
+        "sponsor_politician_membership_url": "",  # Placeholder
+        "status": ((detail or {}).get("status") or {}).get("en", ""),
+        "status_code": (detail or {}).get("status_code"),
+        "pdf_url": pdf_url,
+    }
+
+
+async def upsert_bills(db: AsyncSession, rows: list) -> int:
+    # One INSERT ... ON CONFLICT (session, number) per page; vote counters are left alone and
+    # rows that would come out unchanged are not rewritten. Returns the rows inserted or changed.
+    rows = list({(row["session"], row["number"]): row for row in rows}.values())
+    if not rows:
+        return 0
+    stmt = crud._insert(db, models.Bill).values(rows)
+    values = {
+        "introduced": stmt.excluded.introduced,
+        "name": stmt.excluded.name,
+        "pdf_url": stmt.excluded.pdf_url,
+        # Keep the stored status when this run couldn't load the bill's details
+        "status": func.coalesce(func.nullif(stmt.excluded.status, ""), models.Bill.status),
+        "status_code": func.coalesce(stmt.excluded.status_code, models.Bill.status_code),
+    }
+    result = await db.execute(stmt.on_conflict_do_update(
+        index_elements=["session", "number"],
+        set_=values,
+        where=or_(*(getattr(models.Bill, column).is_distinct_from(value) for column, value in values.items()))
+    ))
+    return result.rowcount
+
+
+async def import_bills(restart: bool = False, progress=None) -> dict:
+    return await BillImporter().run(restart=restart, progress=progress)
+
+
+async def sync_bills(progress=None) -> dict:
+    return await BillImporter().sync(progress=progress)
@@ -0,0 +1,120 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from uuid import uuid4
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Long-running work (e.g. the bill import) runs as a task on the worker's event loop, with
+# its state in the jobs table so any worker can answer status polls. A partial unique index
+# allows one running job per kind. While a job's task is alive a heartbeat bumps its
+# updated_at every JOB_HEARTBEAT_SECONDS, even when one step (a slow or rate-limited page) takes
+# long; a job not bumped for JOB_STALE_SECONDS is assumed to have died with its worker and no
+# longer blocks new ones.
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_STALE_SECONDS / 5)))
+
+_tasks = set()
+
+
+async def submit(db: AsyncSession, kind: str, work) -> models.Job:
+    # work(report) is a coroutine function; report(**counters) stores progress counters
+    await db.execute(
+        update(models.Job)
+        .where(
+            models.Job.kind == kind,
+            models.Job.status == "running",
+            models.Job.updated_at < datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+        )
+        .values(status="failed", error="The job stopped reporting progress", finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    job = models.Job(id=uuid4().hex, kind=kind, status="running", progress={})
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        running = (await db.execute(
+            select(models.Job.id).where(models.Job.kind == kind, models.Job.status == "running")
+        )).scalar()
+        raise HTTPException(
+            status_code=409,
+            detail={"message": f"A {kind} job is already running", "job_id": running}
+        )
+
+    task = asyncio.create_task(_run(job.id, work))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+async def _run(job_id: str, work):
+    async def report(**counters):
+        await _update(job_id, progress=counters, updated_at=datetime.utcnow())
+
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        result = await work(report)
+    except asyncio.CancelledError:
+        await _update(job_id, status="failed", error="Interrupted by shutdown", finished_at=datetime.utcnow())
+        raise
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        await _update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+    else:
+        await _update(job_id, status="succeeded", result=result, finished_at=datetime.utcnow())
+    finally:
+        heartbeat.cancel()
+
+
+async def _heartbeat(job_id: str):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(models.Job).where(models.Job.id == job_id, models.Job.status == "running")
+                    .values(updated_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception:
+            logger.warning("Heartbeat of job %s failed", job_id, exc_info=True)
+
+
+async def _update(job_id: str, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.Job).where(models.Job.id == job_id).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+
+def describe(job: models.Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress or {},
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def shutdown():
+    # Cancel jobs still running in this worker; each marks itself failed on the way out
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
@@ -1,9 +1,33 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from .database import engine, Base
 from .api import endpoints
+from .vote_buffer import vote_buffer
+from .auth import shutdown_hash_executor
+from .retrieval import start_preload
+from . import jobs, geolocation
+from .helpers import shutdown_pdf_executor
+from .websocket_manager import manager
+from .notifications import notification_batcher
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    vote_buffer.start()
+    start_preload()
+    await manager.start()
+    yield
+    await notification_batcher.stop()
+    await manager.stop()
+    await jobs.shutdown()
+    await geolocation.close()
+    vote_buffer.stop()
+    shutdown_hash_executor()
+    shutdown_pdf_executor()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 Base.metadata.create_all(bind=engine)
 
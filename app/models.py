@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, Date, Boolean, ForeignKey, TIMESTAMP,String,DateTime,UniqueConstraint
+from sqlalchemy import Column, Integer, Text, Date, Boolean, ForeignKey, TIMESTAMP,String,DateTime,UniqueConstraint,Index,DDL,event,JSON,text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -44,6 +44,15 @@ class Bill(Base):
     pdf_url = Column(Text) 
     upvotes = Column(Integer, default=0)
     downvotes = Column(Integer, default=0)
+    # Kept by the incremental sync to skip bills that are final or unchanged upstream
+    status_code = Column(String(50), nullable=True)
+    etag = Column(Text, nullable=True)
+    last_modified = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Upsert key for the bulk importer
+        UniqueConstraint('session', 'number', name='unique_bill_session_number'),
+    )
     
 class Comment(Base):
     __tablename__ = "comments"
@@ -77,6 +86,10 @@ class UserPollVote(Base):
     location = Column(Text, nullable=True)
     user = relationship("User")
     poll = relationship("Poll")
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'poll_id', name='unique_user_poll_vote'),
+    )
     
     
     
@@ -108,6 +121,11 @@ class BillsBill(Base):
     texts = relationship("BillsBillText", back_populates="bill")
     comments = relationship("Comment", back_populates="bill")
 
+    __table_args__ = (
+        # Backs keyset pagination of /bills-bill/ ordered by newest introduced first
+        Index('ix_bills_bill_introduced_id', introduced.desc(), id.desc()),
+    )
+
 class BillsBillText(Base):
     __tablename__ = 'bills_billtext'
 
@@ -123,6 +141,27 @@ class BillsBillText(Base):
     bill = relationship("BillsBill", back_populates="texts")
 
 
+# Full-text search on Postgres: generated tsvector columns with GIN indexes. They are left
+# unmapped so SQLite databases keep the plain schema; app/search.py queries them by name.
+SEARCH_VECTORS = {
+    BillsBill.__table__: (
+        "setweight(to_tsvector('english', coalesce(name_en, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(short_title_en, '')), 'B')"
+    ),
+    BillsBillText.__table__: (
+        "setweight(to_tsvector('english', coalesce(summary_en, '')), 'B') || "
+        "setweight(to_tsvector('english', left(text_en, 500000)), 'C')"  # stays under the 1MB tsvector limit
+    ),
+}
+for table, expression in SEARCH_VECTORS.items():
+    event.listen(table, "after_create", DDL(
+        f"ALTER TABLE {table.name} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({expression}) STORED"
+    ).execute_if(dialect="postgresql"))
+    event.listen(table, "after_create", DDL(
+        f"CREATE INDEX ix_{table.name}_search_vector ON {table.name} USING GIN (search_vector)"
+    ).execute_if(dialect="postgresql"))
+
+
 class CoreParty(Base):
     __tablename__ = "core_party"
 
@@ -178,4 +217,63 @@ class UserBillVote(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'bill_id', name='unique_user_bill_vote'),
-    )
\ No newline at end of file
+    )
+
+
+class ChatConversation(Base):
+    __tablename__ = "chat_conversations"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex handed to the client
+    bill_id = Column(Integer, ForeignKey('bills_bill.id', ondelete="CASCADE"), nullable=False, index=True)
+    summary = Column(Text, nullable=True)  # Rolling summary of the turns that left the prompt window
+    summarized_through_id = Column(Integer, default=0, nullable=False)  # Last ChatMessage.id folded into the summary
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+    messages = relationship("ChatMessage", back_populates="conversation", order_by="ChatMessage.id")
+
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(String(32), ForeignKey('chat_conversations.id', ondelete="CASCADE"), nullable=False, index=True)
+    role = Column(String(20), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+
+    conversation = relationship("ChatConversation", back_populates="messages")
+
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+
+    name = Column(String(50), primary_key=True)  # One row per importer, e.g. "bills"
+    next_url = Column(Text, nullable=True)  # Next page to fetch; resuming starts here
+    pages = Column(Integer, default=0, nullable=False)
+    items = Column(Integer, default=0, nullable=False)
+    started_at = Column(TIMESTAMP, default=datetime.utcnow)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(TIMESTAMP, nullable=True)  # Set once the last page is stored
+    high_water_mark = Column(Date, nullable=True)  # Latest introduced date seen by the incremental sync
+    etag = Column(Text, nullable=True)  # Validators of the listing at next_url
+    last_modified = Column(Text, nullable=True)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex handed to the client
+    kind = Column(String(50), nullable=False)  # e.g. "seed_bills"
+    status = Column(String(20), nullable=False, default="running")  # running, succeeded, failed
+    progress = Column(JSON, nullable=True)  # Counters reported by the running job
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow)  # Bumped by progress reports and the heartbeat
+    finished_at = Column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        # At most one running job of each kind, across all workers
+        Index('uq_jobs_kind_running', 'kind', unique=True,
+              postgresql_where=text("status = 'running'"), sqlite_where=text("status = 'running'")),
+    )
@@ -0,0 +1,140 @@
+import os
+import json
+import asyncio
+import logging
+from sqlalchemy import select, func, insert
+from sqlalchemy.exc import IntegrityError, DataError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import AsyncSessionLocal
+from .websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# Moderator notifications are written and pushed in batches. add() only buffers the row;
+# a flusher task inserts everything buffered during NOTIFICATION_FLUSH_MS with one bulk
+# INSERT and then sends moderators a single push for the whole window, carrying the count
+# and the newest NOTIFICATION_LATEST_IDS ids. A batch the database rejects is written row by
+# row so only the bad rows are dropped; other failures are retried with backoff. At most
+# NOTIFICATION_MAX_PENDING rows are buffered (the oldest are dropped beyond that), and
+# whatever is still buffered is written on shutdown.
+NOTIFICATION_FLUSH_MS = int(os.getenv("NOTIFICATION_FLUSH_MS", "200"))
+NOTIFICATION_MAX_BATCH = int(os.getenv("NOTIFICATION_MAX_BATCH", "1000"))
+NOTIFICATION_MAX_PENDING = int(os.getenv("NOTIFICATION_MAX_PENDING", "10000"))
+NOTIFICATION_MAX_BACKOFF = float(os.getenv("NOTIFICATION_MAX_BACKOFF", "30"))  # seconds
+NOTIFICATION_STOP_TIMEOUT = float(os.getenv("NOTIFICATION_STOP_TIMEOUT", "5"))  # seconds
+NOTIFICATION_LATEST_IDS = 10
+
+REJECTED = (IntegrityError, DataError)  # the database refused the rows; retrying won't help
+
+
+def push_message(count: int, latest_ids: list) -> str:
+    return json.dumps({"type": "notifications", "count": count, "latest_ids": latest_ids})
+
+
+class NotificationBatcher:
+    def __init__(self, flush_interval_ms: int = NOTIFICATION_FLUSH_MS, session_factory=AsyncSessionLocal,
+                 max_pending: int = NOTIFICATION_MAX_PENDING):
+        self.flush_interval = flush_interval_ms / 1000
+        self.session_factory = session_factory
+        self.max_pending = max_pending
+        self.dropped = 0  # rows lost to the buffer limit or rejected by the database
+        self._pending = []
+        self._task = None
+
+    def add(self, user_id: int, message: str):
+        if len(self._pending) >= self.max_pending:
+            del self._pending[:len(self._pending) - self.max_pending + 1]
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("Notification buffer is full; dropped %d notifications so far", self.dropped)
+        self._pending.append({"user_id": user_id, "message": message, "read": False})
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self):
+        batch, self._pending = self._pending[:NOTIFICATION_MAX_BATCH], self._pending[NOTIFICATION_MAX_BATCH:]
+        if not batch:
+            return []
+        try:
+            ids = await self._write(batch)
+        except REJECTED:
+            # e.g. a row whose user was deleted meanwhile; isolate it instead of blocking the rest
+            ids = await self._write_each(batch)
+        ids.sort()
+        if ids:
+            await manager.broadcast_to_moderators(push_message(len(ids), ids[-NOTIFICATION_LATEST_IDS:]))
+        return ids
+
+    async def _write(self, rows: list) -> list:
+        # Inserts and commits the rows, returning their ids. When this fails or is cancelled the
+        # rows go back to the front of the buffer, unless the database rejected them or the
+        # failure hit the commit itself: those may already be stored, and a retry could
+        # write them twice.
+        committing = False
+        try:
+            async with self.session_factory() as db:
+                ids = list(await db.scalars(insert(models.Notification).returning(models.Notification.id), rows))
+                committing = True
+                await db.commit()
+            return ids
+        except BaseException as e:
+            if committing and not isinstance(e, REJECTED):
+                logger.error("Commit of %d notifications was interrupted (%r); not retrying them", len(rows), e)
+            elif not isinstance(e, REJECTED):
+                self._pending[:0] = rows
+            raise
+
+    async def _write_each(self, rows: list) -> list:
+        ids = []
+        for index, row in enumerate(rows):
+            try:
+                ids += await self._write([row])
+            except REJECTED as e:
+                self.dropped += 1
+                logger.error("Dropping notification for user %s: %s", row["user_id"], e)
+            except BaseException:
+                self._pending[:0] = rows[index + 1:]
+                raise
+        return ids
+
+    async def _run(self):
+        delay = self.flush_interval
+        while self._pending:
+            await asyncio.sleep(delay)
+            try:
+                while self._pending:
+                    await self.flush()
+            except Exception:
+                delay = min(delay * 2, NOTIFICATION_MAX_BACKOFF)
+                logger.exception("Failed to write buffered notifications; retrying in %.1fs", delay)
+            else:
+                delay = self.flush_interval
+
+    async def stop(self):
+        if self._task is not None:
+            # A flush interrupted here keeps its rows buffered unless its commit had started
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Final flush so no notification is lost on shutdown
+        try:
+            async with asyncio.timeout(NOTIFICATION_STOP_TIMEOUT):
+                while self._pending:
+                    await self.flush()
+        except Exception:
+            logger.exception("Dropping %d notifications that could not be written", len(self._pending))
+
+
+async def unread_summary(db: AsyncSession, user_id: int):
+    # (count, newest ids) of the user's unread notifications, for the push sent on connect
+    unread = (models.Notification.user_id == user_id, models.Notification.read == False)
+    count = (await db.execute(select(func.count()).select_from(models.Notification).where(*unread))).scalar()
+    latest_ids = list(await db.scalars(
+        select(models.Notification.id).where(*unread)
+        .order_by(models.Notification.id.desc()).limit(NOTIFICATION_LATEST_IDS)
+    ))
+    return count, sorted(latest_ids)
+
+
+notification_batcher = NotificationBatcher()
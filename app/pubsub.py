@@ -0,0 +1,150 @@
+import os
+import json
+import asyncio
+import logging
+from uuid import uuid4
+import asyncpg
+from sqlalchemy.engine import make_url
+from .database import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# Websocket notifications go through a bus so that every worker delivers them to its own
+# sockets. PUBSUB_BACKEND "memory" (the default) only reaches this process; "postgres" relays
+# them with LISTEN/NOTIFY on PUBSUB_CHANNEL, so all workers and nodes sharing the database see
+# every message. Each worker delivers its own messages to its sockets right away and skips
+# their NOTIFY echo; publishing otherwise only enqueues, and a background task sends the
+# NOTIFYs in batches. The listener connection is probed every PUBSUB_KEEPALIVE_INTERVAL so
+# a half-open connection is replaced. Other workers' messages published while this worker's
+# listener is reconnecting are not replayed to it.
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+PUBSUB_DATABASE_URL = os.getenv("PUBSUB_DATABASE_URL") or DATABASE_URL
+PUBSUB_CHANNEL = os.getenv("PUBSUB_CHANNEL", "ws_notifications")
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "1000"))
+PUBSUB_RECONNECT_DELAY = float(os.getenv("PUBSUB_RECONNECT_DELAY", "1"))
+PUBSUB_KEEPALIVE_INTERVAL = float(os.getenv("PUBSUB_KEEPALIVE_INTERVAL", "15"))
+PUBSUB_KEEPALIVE_TIMEOUT = float(os.getenv("PUBSUB_KEEPALIVE_TIMEOUT", "5"))
+PUBSUB_BATCH_SIZE = 100
+NOTIFY_MAX_BYTES = 7900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+
+
+def postgres_dsn(url: str) -> str:
+    # asyncpg takes a plain libpq-style URL without the SQLAlchemy driver suffix
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class MemoryBus:
+    def __init__(self, handler):
+        self.handler = handler
+
+    async def start(self):
+        pass
+
+    async def publish(self, event: dict):
+        self.handler(event)
+
+    async def stop(self):
+        pass
+
+
+class PostgresBus:
+    def __init__(self, handler, dsn: str = None, channel: str = PUBSUB_CHANNEL):
+        self.handler = handler
+        self.dsn = dsn or postgres_dsn(PUBSUB_DATABASE_URL)
+        self.channel = channel
+        self.worker_id = uuid4().hex  # marks this worker's own NOTIFYs
+        self.queue = None
+        self._tasks = []
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=PUBSUB_QUEUE_SIZE)
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._send())]
+
+    async def publish(self, event: dict):
+        self.handler(event)
+        if self.queue is None:
+            # Not started (e.g. a script without the app lifespan): local sockets only
+            return
+        payload = json.dumps({**event, "origin": self.worker_id})
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            logger.warning("Notification of %d bytes is too large for NOTIFY; delivered locally only", len(payload))
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            logger.warning("Dropping notification: the pub/sub queue is full")
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notify)
+                while not closed.is_set():
+                    # A half-open connection never reports termination, so probe it
+                    try:
+                        async with asyncio.timeout(PUBSUB_KEEPALIVE_INTERVAL):
+                            await closed.wait()
+                    except TimeoutError:
+                        async with asyncio.timeout(PUBSUB_KEEPALIVE_TIMEOUT):
+                            await connection.execute("SELECT 1")
+                logger.warning("Pub/sub listener connection closed; reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Pub/sub listener failed: %s", e)
+            finally:
+                if connection is not None:
+                    connection.terminate()
+            await asyncio.sleep(PUBSUB_RECONNECT_DELAY)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed notification on %s", channel)
+            return
+        if event.pop("origin", None) == self.worker_id:
+            return  # already delivered by publish()
+        self.handler(event)
+
+    async def _send(self):
+        batch = []
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                while True:
+                    if not batch:
+                        batch.append(await self.queue.get())
+                        while len(batch) < PUBSUB_BATCH_SIZE and not self.queue.empty():
+                            batch.append(self.queue.get_nowait())
+                    async with asyncio.timeout(PUBSUB_KEEPALIVE_TIMEOUT):
+                        await connection.executemany(
+                            "SELECT pg_notify($1, $2)", [(self.channel, payload) for payload in batch]
+                        )
+                    batch = []
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The batch is kept and sent again once a new connection is up
+                logger.warning("Pub/sub publisher failed: %s", e)
+            finally:
+                if connection is not None:
+                    connection.terminate()
+            await asyncio.sleep(PUBSUB_RECONNECT_DELAY)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.queue = None
+
+
+def make_bus(handler, name: str = PUBSUB_BACKEND):
+    if name == "postgres":
+        return PostgresBus(handler)
+    return MemoryBus(handler)
@@ -0,0 +1,139 @@
+import os
+import re
+import math
+import time
+import heapq
+import logging
+import threading
+from sqlalchemy import select
+from . import models, helpers
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Local BM25 index over bill text passages, so each chat turn can ground the model in the
+# few clauses relevant to the question instead of the summary alone. Texts are indexed as
+# they are added (or the first time a bill is chatted about) and never re-scanned.
+RETRIEVAL_PASSAGE_TOKENS = int(os.getenv("RETRIEVAL_PASSAGE_TOKENS", "256"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_PRELOAD = os.getenv("RETRIEVAL_PRELOAD", "false").lower() in ("1", "true", "yes")
+RETRIEVAL_BATCH_SIZE = 200
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall that the this "
+    "to was were which will with any such not no may under".split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [term for term in TERM_PATTERN.findall(text.lower()) if len(term) > 1 and term not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, passage_tokens: int = RETRIEVAL_PASSAGE_TOKENS):
+        self.passage_tokens = passage_tokens
+        self._passages = []  # passage id -> (bill_id, text)
+        self._lengths = []  # passage id -> number of terms
+        self._postings = {}  # bill_id -> term -> {passage id: term frequency}
+        self._df = {}  # term -> number of passages containing it, across all bills
+        self._total_length = 0
+        self._text_ids = set()
+        self._synced_through = 0  # highest bill text id covered by sync()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._passages)
+
+    def has_text(self, text_id: int) -> bool:
+        return text_id in self._text_ids
+
+    def add_text(self, text_id: int, bill_id: int, text: str) -> int:
+        # Chunking and tokenizing happen outside the lock; returns the number of new passages
+        if text_id in self._text_ids or not text or not text.strip():
+            return 0
+        chunks = [
+            (chunk, tokenize(chunk))
+            for chunk in helpers.iter_token_chunks(helpers.clean_text(text), self.passage_tokens)
+        ]
+
+        with self._lock:
+            if text_id in self._text_ids:
+                return 0
+            self._text_ids.add(text_id)
+            postings = self._postings.setdefault(bill_id, {})
+            for chunk, terms in chunks:
+                passage_id = len(self._passages)
+                self._passages.append((bill_id, chunk))
+                self._lengths.append(len(terms))
+                self._total_length += len(terms)
+                frequencies = {}
+                for term in terms:
+                    frequencies[term] = frequencies.get(term, 0) + 1
+                for term, frequency in frequencies.items():
+                    postings.setdefault(term, {})[passage_id] = frequency
+                    self._df[term] = self._df.get(term, 0) + 1
+        return len(chunks)
+
+    def search(self, bill_id: int, query: str, k: int = RETRIEVAL_TOP_K) -> list:
+        # Top-k passages of one bill; idf and average length come from the whole index
+        terms = set(tokenize(query))
+        with self._lock:
+            postings = self._postings.get(bill_id)
+            if not postings or not terms:
+                return []
+            total = len(self._passages)
+            average_length = self._total_length / total or 1
+            scores = {}
+            for term in terms:
+                matches = postings.get(term)
+                if not matches:
+                    continue
+                df = self._df[term]
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                for passage_id, frequency in matches.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[passage_id] / average_length)
+                    scores[passage_id] = scores.get(passage_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [self._passages[passage_id][1] for passage_id, _ in best]
+
+    def sync(self, session_factory=SessionLocal) -> int:
+        # Indexes every bill text added since the last sync, in id order
+        started = time.perf_counter()
+        added = 0
+        with session_factory() as db:
+            query = (
+                select(models.BillsBillText.id, models.BillsBill.id, models.BillsBillText.text_en)
+                .join(models.BillsBill, models.BillsBill.text_docid == models.BillsBillText.docid)
+                .where(models.BillsBillText.id > self._synced_through)
+                .order_by(models.BillsBillText.id)
+                .execution_options(yield_per=RETRIEVAL_BATCH_SIZE)
+            )
+            for text_id, bill_id, text_en in db.execute(query):
+                added += self.add_text(text_id, bill_id, text_en)
+                self._synced_through = max(self._synced_through, text_id)
+        logger.info("Indexed %d bill text passages in %.2fs (%d total)",
+                    added, time.perf_counter() - started, len(self._passages))
+        return added
+
+
+bill_text_index = BM25Index()
+
+
+def start_preload():
+    # Optionally build the whole index in the background at startup
+    if not RETRIEVAL_PRELOAD:
+        return None
+    thread = threading.Thread(target=_preload, name="retrieval-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def _preload():
+    try:
+        bill_text_index.sync()
+    except Exception:
+        logger.exception("Failed to build the bill text index")
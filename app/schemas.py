@@ -139,12 +139,27 @@ class Bills_bill(BaseModel):
         orm_mode = True
         
         
+class BillSearchResult(BaseModel):
+    id: int
+    name_en: str
+    short_title_en: Optional[str]
+    number: Optional[str]
+    status_code: str
+    introduced: Optional[date]
+    rank: float
+    headline: str  # name_en with matches wrapped in <b></b>
+    snippet: Optional[str]  # Highlighted fragment of the bill text, when the text matched
+        
+        
 class Message(BaseModel):
     role: str
     content: str
 
 class ChatRequest(BaseModel):
     conversation: Optional[List[Message]] = None 
+    # Server-side mode: send only the new message and the id returned by the first call
+    conversation_id: Optional[str] = None
+    message: Optional[str] = None
     
     
 class Notification(BaseModel):
@@ -0,0 +1,186 @@
+import re
+import html
+from fastapi import HTTPException
+from sqlalchemy import select, union, func, or_, and_, case, literal, literal_column
+from sqlalchemy.orm import Session
+from . import models, helpers
+
+# Ranked bill search. On Postgres it runs against the generated search_vector columns (GIN
+# indexed, see app/models.py); other databases fall back to LIKE matching with a simple
+# weighted rank so the endpoint still works on a local SQLite file. Both paths page by
+# (rank, id) cursors.
+SEARCH_CONFIG = "english"
+# Titles and texts are user-supplied, so highlights are HTML-escaped and only the <b> tags are
+# ours: ts_headline marks matches with control characters that are swapped for tags afterwards.
+HIGHLIGHT_START, HIGHLIGHT_STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MaxWords=30, MinWords=10"
+TITLE_HEADLINE_OPTIONS = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, HighlightAll=true"  # whole title
+HEADLINE_MAX_CHARS = 100000  # ts_headline re-parses the document, so only look at its start
+SNIPPET_CHARS = 120
+
+bill_vector = literal_column("bills_bill.search_vector")
+text_vector = literal_column("bills_billtext.search_vector")
+
+
+def search_bills(db: Session, q: str, limit: int, after: str = None):
+    # Returns (results, next cursor or None)
+    postgres = db.bind.dialect.name == "postgresql"
+    if postgres:
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        ranked = _ranked_postgres(tsquery)
+    else:
+        terms = search_terms(q)
+        if not terms:
+            return [], None
+        ranked = _ranked_fallback(terms)
+
+    query = select(ranked.c.id, ranked.c.rank).order_by(ranked.c.rank.desc(), ranked.c.id.desc())
+    if after:
+        rank, bill_id = _decode_search_cursor(after)
+        query = query.where(or_(
+            ranked.c.rank < rank,
+            and_(ranked.c.rank == rank, ranked.c.id < bill_id)
+        ))
+    page = db.execute(query.limit(limit)).all()
+    if not page:
+        return [], None
+
+    ranks = {bill_id: rank for bill_id, rank in page}
+    if postgres:
+        highlights = _highlights_postgres(db, list(ranks), tsquery)
+    else:
+        highlights = _highlights_fallback(db, list(ranks), terms)
+
+    results = []
+    for bill_id, rank in page:
+        bill, headline, snippet = highlights[bill_id]
+        results.append({
+            "id": bill.id,
+            "name_en": bill.name_en,
+            "short_title_en": bill.short_title_en,
+            "number": bill.number,
+            "status_code": bill.status_code,
+            "introduced": bill.introduced,
+            "rank": rank,
+            "headline": headline,
+            "snippet": snippet,
+        })
+
+    next_cursor = helpers.encode_cursor(page[-1].rank, page[-1].id) if len(page) == limit else None
+    return results, next_cursor
+
+
+def _decode_search_cursor(cursor: str):
+    try:
+        rank, bill_id = helpers.decode_cursor(cursor)
+        return float(rank), int(bill_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _ranked_postgres(tsquery):
+    # Bills whose own title vector or whose text vector matches; each side can use its GIN index
+    matched = union(
+        select(models.BillsBill.id).where(bill_vector.op("@@")(tsquery)),
+        select(models.BillsBill.id)
+        .join(models.BillsBillText, models.BillsBillText.docid == models.BillsBill.text_docid)
+        .where(text_vector.op("@@")(tsquery)),
+    ).subquery()
+    rank = func.ts_rank_cd(bill_vector, tsquery) + func.coalesce(func.ts_rank_cd(text_vector, tsquery), 0)
+    return (
+        select(models.BillsBill.id, rank.label("rank"))
+        .join(matched, matched.c.id == models.BillsBill.id)
+        .outerjoin(models.BillsBillText, models.BillsBillText.docid == models.BillsBill.text_docid)
+        .subquery()
+    )
+
+
+def _highlights_postgres(db: Session, bill_ids: list, tsquery) -> dict:
+    snippet = case(
+        (
+            text_vector.op("@@")(tsquery),
+            func.ts_headline(
+                SEARCH_CONFIG,
+                func.left(models.BillsBillText.text_en, HEADLINE_MAX_CHARS),
+                tsquery,
+                HEADLINE_OPTIONS
+            )
+        ),
+        else_=None
+    )
+    rows = db.execute(
+        select(
+            models.BillsBill,
+            func.ts_headline(SEARCH_CONFIG, models.BillsBill.name_en, tsquery, TITLE_HEADLINE_OPTIONS),
+            snippet
+        )
+        .outerjoin(models.BillsBillText, models.BillsBillText.docid == models.BillsBill.text_docid)
+        .where(models.BillsBill.id.in_(bill_ids))
+    ).all()
+    return {bill.id: (bill, _markup(headline), _markup(snippet)) for bill, headline, snippet in rows}
+
+
+def _markup(headline):
+    if headline is None:
+        return None
+    return html.escape(headline).replace(HIGHLIGHT_START, "<b>").replace(HIGHLIGHT_STOP, "</b>")
+
+
+def _highlight(pattern, text: str) -> str:
+    # Escapes the text and wraps each match in <b></b>
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f"<b>{html.escape(match.group(0))}</b>")
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+
+def search_terms(q: str) -> list:
+    return list(dict.fromkeys(term.lower() for term in re.findall(r"\w+", q)))[:10]
+
+
+def _like(column, term: str):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.ilike(f"%{escaped}%", escape="\\")
+
+
+def _ranked_fallback(terms: list):
+    # Every term has to appear somewhere; title hits weigh more than body hits
+    text = models.BillsBillText
+    conditions = []
+    rank = literal(0.0)
+    for term in terms:
+        in_name = _like(models.BillsBill.name_en, term)
+        in_title = _like(models.BillsBill.short_title_en, term)
+        in_text = or_(_like(text.summary_en, term), _like(text.text_en, term))
+        conditions.append(or_(in_name, in_title, in_text))
+        rank = rank + case((in_name, 1.0), else_=0.0) + case((in_title, 0.4), else_=0.0) + case((in_text, 0.1), else_=0.0)
+    return (
+        select(models.BillsBill.id, rank.label("rank"))
+        .outerjoin(text, text.docid == models.BillsBill.text_docid)
+        .where(and_(*conditions))
+        .subquery()
+    )
+
+
+def _highlights_fallback(db: Session, bill_ids: list, terms: list) -> dict:
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    rows = db.execute(
+        select(models.BillsBill, models.BillsBillText.text_en)
+        .outerjoin(models.BillsBillText, models.BillsBillText.docid == models.BillsBill.text_docid)
+        .where(models.BillsBill.id.in_(bill_ids))
+    ).all()
+    highlights = {}
+    for bill, text_en in rows:
+        headline = _highlight(pattern, bill.name_en or "")
+        snippet = None
+        match = pattern.search(text_en or "")
+        if match:
+            start = max(0, match.start() - SNIPPET_CHARS)
+            fragment = text_en[start:match.end() + SNIPPET_CHARS]
+            snippet = _highlight(pattern, fragment)
+        highlights[bill.id] = (bill, headline, snippet)
+    return highlights
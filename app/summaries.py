@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from . import models, helpers
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Bill text id -> Future of the summary being generated, so concurrent requests for the
+# same bill wait for one OpenAI run instead of starting their own
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_or_create_summary(db: Session, bill_text: models.BillsBillText) -> str:
+    # Read-through cache over BillsBillText.summary_en
+    if bill_text.summary_en:
+        return bill_text.summary_en
+
+    with _inflight_lock:
+        future = _inflight.get(bill_text.id)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _inflight[bill_text.id] = future
+    if not is_owner:
+        return future.result()
+
+    try:
+        # Another request may have stored the summary after this row was loaded
+        db.refresh(bill_text, ["summary_en"])
+        summary = bill_text.summary_en
+        if not summary:
+            summary = helpers.summarize_text(helpers.clean_text(bill_text.text_en))
+            bill_text.summary_en = summary
+            db.commit()
+        future.set_result(summary)
+        return summary
+    except BaseException as e:
+        db.rollback()
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(bill_text.id, None)
+
+
+def missing_summary_ids(db: Session, limit: int = None) -> list:
+    # Bill texts with text but no stored summary; init.sql stores a missing one as ''
+    query = db.query(models.BillsBillText.id).filter(
+        or_(models.BillsBillText.summary_en.is_(None), models.BillsBillText.summary_en == ""),
+        models.BillsBillText.text_en != ""
+    ).order_by(models.BillsBillText.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return [text_id for text_id, in query.all()]
+
+
+def summarize_one(text_id: int) -> str:
+    # "summarized", "skipped" or "failed", with a session of its own
+    db = SessionLocal()
+    try:
+        bill_text = db.get(models.BillsBillText, text_id)
+        if bill_text is None or not bill_text.text_en.strip():
+            return "skipped"
+        get_or_create_summary(db, bill_text)
+        return "summarized"
+    except Exception:
+        logger.exception("Failed to summarize bill text %s", text_id)
+        return "failed"
+    finally:
+        db.close()
+
+
+def backfill_summaries(db: Session, limit: int = None) -> dict:
+    # Summarize every bill text that has text but no stored summary yet
+    counts = {"summarized": 0, "failed": 0}
+    for text_id in missing_summary_ids(db, limit):
+        outcome = summarize_one(text_id)
+        if outcome in counts:
+            counts[outcome] += 1
+    return counts
+
+
+async def backfill_summaries_job(limit: int = None, progress=None) -> dict:
+    # Same as backfill_summaries, for jobs.submit: each text is summarized in a worker thread
+    # and progress is reported after every one
+    def load_ids():
+        db = SessionLocal()
+        try:
+            return missing_summary_ids(db, limit)
+        finally:
+            db.close()
+
+    text_ids = await asyncio.to_thread(load_ids)
+    counts = {"summarized": 0, "failed": 0}
+    for done, text_id in enumerate(text_ids, 1):
+        outcome = await asyncio.to_thread(summarize_one, text_id)
+        if outcome in counts:
+            counts[outcome] += 1
+        if progress is not None:
+            await progress(**counts, remaining=len(text_ids) - done)
+    return counts
@@ -0,0 +1,135 @@
+import os
+import threading
+import logging
+from sqlalchemy import update, bindparam
+from sqlalchemy.orm.attributes import set_committed_value
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Write-behind aggregation of bill vote counters. When enabled, each vote still writes its
+# UserBillVote row immediately, but the upvotes/downvotes deltas are summed in memory and
+# applied to bills_bill in one batch every VOTE_FLUSH_INTERVAL_MS, so a hot bill's row is
+# locked once per interval instead of once per vote. A batch being written stays in
+# _inflight, and is still counted by pending(), until its commit succeeds. The commit and
+# the clearing of _inflight share _commit_lock with pending(), so a reader never counts a
+# batch both in bills_bill and in the buffer (one that loaded the row just before the commit
+# can miss it until its next read). Readers may wait out a commit; add() never does.
+#
+# The deltas live only in this process. If it dies without running stop() (killed, OOM,
+# crash), the votes of the last flush interval, and any batch whose flush kept failing,
+# are missing from bills_bill; their user_bill_votes rows are already committed, so the
+# counters can be recomputed from them.
+VOTE_AGGREGATION = os.getenv("VOTE_AGGREGATION", "false").lower() in ("1", "true", "yes")
+VOTE_FLUSH_INTERVAL_MS = int(os.getenv("VOTE_FLUSH_INTERVAL_MS", "250"))
+
+
+class VoteCounterBuffer:
+    def __init__(self, enabled: bool = VOTE_AGGREGATION, flush_interval_ms: int = VOTE_FLUSH_INTERVAL_MS,
+                 session_factory=SessionLocal):
+        self.enabled = enabled
+        self.flush_interval = flush_interval_ms / 1000
+        self.session_factory = session_factory
+        self._pending = {}  # bill_id -> [upvotes delta, downvotes delta]
+        self._inflight = {}  # the batch flush() is writing, same shape
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, bill_id: int, up_delta: int, down_delta: int):
+        with self._lock:
+            deltas = self._pending.setdefault(bill_id, [0, 0])
+            deltas[0] += up_delta
+            deltas[1] += down_delta
+
+    def pending(self, bill_id: int):
+        with self._commit_lock, self._lock:
+            up_delta, down_delta = self._pending.get(bill_id, (0, 0))
+            inflight_up, inflight_down = self._inflight.get(bill_id, (0, 0))
+        return up_delta + inflight_up, down_delta + inflight_down
+
+    def apply_pending(self, bills: list):
+        # Overlay unflushed deltas on loaded bills without marking them dirty
+        if not self.enabled:
+            return bills
+        for bill in bills:
+            up_delta, down_delta = self.pending(bill.id)
+            if up_delta or down_delta:
+                set_committed_value(bill, "upvotes", bill.upvotes + up_delta)
+                set_committed_value(bill, "downvotes", bill.downvotes + down_delta)
+        return bills
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = self._inflight = self._pending
+                self._pending = {}
+            rows = [
+                {"b_id": bill_id, "up_delta": up_delta, "down_delta": down_delta}
+                for bill_id, (up_delta, down_delta) in sorted(batch.items())  # fixed order avoids deadlocks between workers
+                if up_delta or down_delta
+            ]
+            if not rows:
+                with self._lock:
+                    self._inflight = {}
+                return 0
+
+            table = models.BillsBill.__table__
+            statement = (
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(
+                    upvotes=table.c.upvotes + bindparam("up_delta"),
+                    downvotes=table.c.downvotes + bindparam("down_delta")
+                )
+            )
+            db = self.session_factory()
+            try:
+                db.execute(statement, rows)
+                # The commit makes the batch part of the stored counts; leave the buffer in the same step
+                with self._commit_lock:
+                    db.commit()
+                    with self._lock:
+                        self._inflight = {}
+            except BaseException:
+                db.rollback()
+                # Put the deltas back so the next flush retries them
+                with self._lock:
+                    for bill_id, (up_delta, down_delta) in self._inflight.items():
+                        deltas = self._pending.setdefault(bill_id, [0, 0])
+                        deltas[0] += up_delta
+                        deltas[1] += down_delta
+                    self._inflight = {}
+                raise
+            finally:
+                db.close()
+            return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered vote counters")
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vote-counter-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        # Final flush so no counted vote is lost on shutdown
+        self.flush()
+
+
+vote_buffer = VoteCounterBuffer()
@@ -1,28 +1,121 @@
+import os
+import asyncio
+import logging
 from fastapi import WebSocket, WebSocketDisconnect, HTTPException
-from typing import List, Dict
+from typing import List, Dict, Set
 from app.models import User
+from app import pubsub
+
+logger = logging.getLogger(__name__)
+
+# Each socket gets a bounded outbound queue drained by its own sender task, so a broadcast
+# only enqueues and one slow client can't hold up the rest. A socket whose queue overflows
+# or whose send times out or fails is closed and dropped from the registry.
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+
+class Connection:
+    def __init__(self, websocket: WebSocket, user: User, queue_size: int):
+        self.websocket = websocket
+        self.user = user
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sender = None
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[WebSocket, Dict[str, User]] = {}
+    def __init__(self, bus=None):
+        self.active_connections: Dict[WebSocket, Connection] = {}
+        self.by_user: Dict[int, Set[Connection]] = {}
+        self.moderators: Set[Connection] = set()
+        # Messages are published to every worker and each one delivers to its own sockets
+        self.bus = bus or pubsub.make_bus(self.deliver)
+
+    async def start(self):
+        await self.bus.start()
+
+    async def stop(self):
+        await self.bus.stop()
 
-    async def connect(self, websocket: WebSocket, user: User):
+    async def connect(self, websocket: WebSocket, user: User, backlog: List[str] = ()):
+        # backlog: messages to deliver first, e.g. notifications missed while offline
         if not user:
             raise HTTPException(status_code=403, detail="Authentication required")
         await websocket.accept()
-        self.active_connections[websocket] = {"user": user}
+        connection = Connection(websocket, user, WS_QUEUE_SIZE + len(backlog))
+        for message in backlog:
+            connection.queue.put_nowait(message)
+        self.active_connections[websocket] = connection
+        self.by_user.setdefault(user.id, set()).add(connection)
+        if user.is_moderator:
+            self.moderators.add(connection)
+        connection.sender = asyncio.create_task(self._send_loop(connection))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.pop(websocket, None)
+        connection = self.active_connections.pop(websocket, None)
+        if connection is None:
+            return
+        user_connections = self.by_user.get(connection.user.id)
+        if user_connections is not None:
+            user_connections.discard(connection)
+            if not user_connections:
+                del self.by_user[connection.user.id]
+        self.moderators.discard(connection)
+        if connection.sender is not None and connection.sender is not asyncio.current_task():
+            connection.sender.cancel()
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-    
+        await self.bus.publish({"to": "all", "message": message})
+
     async def broadcast_to_moderators(self, message: str):
-        for websocket, info in self.active_connections.items():
-            if info["user"].is_moderator:  # Only send to moderators
-                await websocket.send_text(message)
+        await self.bus.publish({"to": "moderators", "message": message})
+
+    async def send_to_user(self, user_id: int, message: str):
+        await self.bus.publish({"to": "user", "user_id": user_id, "message": message})
+
+    def deliver(self, event: dict):
+        # Called by the bus for every published message, including other workers' ones
+        if event.get("to") == "moderators":
+            connections = list(self.moderators)
+        elif event.get("to") == "user":
+            connections = list(self.by_user.get(event.get("user_id"), ()))
+        else:
+            connections = list(self.active_connections.values())
+        self._enqueue(connections, event["message"])
+
+    def _enqueue(self, connections: list, message: str):
+        for connection in connections:
+            try:
+                connection.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                logger.warning("Dropping websocket of user %s: outbound queue is full", connection.user.id)
+                self._evict(connection)
+
+    async def _send_loop(self, connection: Connection):
+        while True:
+            message = await connection.queue.get()
+            try:
+                async with asyncio.timeout(WS_SEND_TIMEOUT):
+                    await connection.websocket.send_text(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.info("Dropping websocket of user %s: send failed (%r)", connection.user.id, e)
+                self._evict(connection)
+                return
+
+    def _evict(self, connection: Connection):
+        if self.active_connections.get(connection.websocket) is not connection:
+            return
+        self.disconnect(connection.websocket)
+        # Closing a half-dead socket can block too, so don't wait for it
+        asyncio.ensure_future(self._close(connection.websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
 
 # Instantiate the manager
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
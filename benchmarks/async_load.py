@@ -0,0 +1,114 @@
+"""Latency of a read route while bill votes and comments are in flight.
+
+Against a running server, measures the probe route alone, then again while --writers
+concurrent clients keep voting on and commenting on one bill. Blocking database calls in
+the async write endpoints would stall the event loop and show up in the probe's p99.
+
+    uvicorn app.main:app --port 8000 &
+    python benchmarks/async_load.py --url http://127.0.0.1:8000 --bill-id 1 --writers 50
+
+The bill must exist; the writers are registered as new users.
+"""
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies: list) -> dict:
+    return {
+        "requests": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def register_writers(client: httpx.AsyncClient, count: int) -> list:
+    run = uuid.uuid4().hex[:8]
+    headers = []
+    for i in range(count):
+        email = f"load-{run}-{i}@example.com"
+        await client.post("/register/", json={"name": "load", "email": email, "username": f"load-{run}-{i}",
+                                              "password": "secret"})
+        token = (await client.post("/login", json={"email": email, "password": "secret"})).json()["access_token"]
+        headers.append({"Authorization": f"Bearer {token}"})
+    return headers
+
+
+async def probe(client: httpx.AsyncClient, path: str, count: int, interval: float) -> list:
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = await client.get(path)
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def write(client: httpx.AsyncClient, headers: dict, bill_id: int, stop: asyncio.Event) -> int:
+    requests = 0
+    upvote = True
+    while not stop.is_set():
+        # Alternating votes always change the tally, so every one is a real write
+        response = await client.post(f"/bills-bill/{bill_id}/vote", params={"upvote": upvote}, headers=headers)
+        response.raise_for_status()
+        response = await client.post("/comments/", json={"bill_id": bill_id, "comment": "load test"},
+                                     headers=headers)
+        response.raise_for_status()
+        upvote = not upvote
+        requests += 2
+    return requests
+
+
+async def run(url: str, bill_id: int, writers: int = 50, probes: int = 200, probe_path: str = "/metrics/db-pool",
+              interval: float = 0.005) -> dict:
+    limits = httpx.Limits(max_connections=writers + 1)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        headers = await register_writers(client, writers)
+        baseline = await probe(client, probe_path, probes, interval)
+
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(write(client, h, bill_id, stop)) for h in headers]
+        await asyncio.sleep(0.2)  # let the writers ramp up
+        started = time.perf_counter()
+        loaded = await probe(client, probe_path, probes, interval)
+        stop.set()
+        writes = sum(await asyncio.gather(*tasks))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "baseline": summarize(baseline),
+        "under_load": summarize(loaded),
+        "writes": writes,
+        "writes_per_second": writes / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--bill-id", type=int, default=1)
+    parser.add_argument("--writers", type=int, default=50, help="concurrent voting/commenting clients")
+    parser.add_argument("--probes", type=int, default=200, help="probe requests per phase")
+    parser.add_argument("--probe-path", default="/metrics/db-pool")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.bill_id, args.writers, args.probes, args.probe_path))
+    for phase in ("baseline", "under_load"):
+        stats = result[phase]
+        print(f"{phase:>10}: {stats['requests']} probes  p50 {stats['p50_ms']:.1f} ms  p99 {stats['p99_ms']:.1f} ms")
+    print(f"    writes: {result['writes']} ({result['writes_per_second']:.0f}/s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Chunking benchmark: the original split_text against the offset-based chunkers.
+
+Builds a synthetic bill of --megabytes of text, made of numbered sections and lettered
+clauses, and times each chunker over it:
+
+    python benchmarks/chunking.py --megabytes 2 4 8
+
+"legacy" is split_text as it was before chunking moved to offsets; it copies the rest of
+the text on every cut, so its time grows with the square of the size.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # the client is built on import, never called
+
+from app import helpers  # noqa: E402
+
+WORDS = ("the minister may by order amend schedule person corporation tax credit amount "
+         "subsection paragraph respect year prescribed regulation agreement province").split()
+
+
+def legacy_split_text(text: str, max_characters: int) -> list:
+    chunks = []
+    while len(text) > max_characters:
+        split_index = text.rfind(' ', 0, max_characters)
+        if split_index == -1:
+            split_index = max_characters
+
+        chunks.append(text[:split_index].strip())
+        text = text[split_index:].strip()
+
+    if text:
+        chunks.append(text)
+
+    return chunks
+
+
+def make_bill(size: int, seed: int = 12) -> str:
+    rng = random.Random(seed)
+    parts, length, section = [], 0, 0
+    while length < size:
+        section += 1
+        clauses = []
+        for letter in "abcdef"[:rng.randint(1, 6)]:
+            clauses.append(f"({letter}) " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))) + ";")
+        part = f"{section} " + " ".join(rng.choice(WORDS) for _ in range(12)) + ":\n" + "\n".join(clauses) + "\n\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def chunkers(max_tokens: int) -> dict:
+    max_characters = max_tokens * 4
+    return {
+        "legacy split_text": lambda text: legacy_split_text(text, max_characters),
+        "split_text": lambda text: helpers.split_text(text, max_characters),
+        "iter_token_chunks": lambda text: list(helpers.iter_token_chunks(text, max_tokens, helpers.estimate_tokens)),
+    }
+
+
+def run(megabytes: list, max_tokens: int = helpers.SUMMARY_CHUNK_TOKENS) -> list:
+    results = []
+    for size in megabytes:
+        text = make_bill(int(size * 1024 * 1024))
+        for name, chunk in chunkers(max_tokens).items():
+            started = time.perf_counter()
+            chunks = chunk(text)
+            results.append({"megabytes": size, "chunker": name, "chunks": len(chunks),
+                            "seconds": time.perf_counter() - started})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-tokens", type=int, default=helpers.SUMMARY_CHUNK_TOKENS)
+    args = parser.parse_args()
+
+    for result in run(args.megabytes, args.max_tokens):
+        print(f"{result['megabytes']:>6g} MB  {result['chunker']:<18} {result['chunks']:>6} chunks  "
+              f"{result['seconds'] * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Login throughput at different password-hash pool sizes.
+
+Drives POST /login in-process (ASGI, no network) with --concurrency clients for one user
+whose bcrypt hash uses --rounds, once per pool size, and reports logins/sec along with the
+worst event-loop stall seen meanwhile:
+
+    python benchmarks/login_throughput.py --pool-sizes 1 2 4 8 --logins 200
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='login-bench-')}/bench.db")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # the client is built on import, never called
+
+import httpx  # noqa: E402
+from app import auth, models  # noqa: E402
+from app.database import Base, SessionLocal, async_engine, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+EMAIL, PASSWORD = "bench@example.com", "secret"
+
+
+def add_user(rounds: int):
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.query(models.User).filter(models.User.email == EMAIL).delete()
+        db.add(models.User(name="bench", email=EMAIL, username="bench",
+                           password=auth.pwd_context.using(bcrypt__rounds=rounds).hash(PASSWORD)))
+        db.commit()
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    # Longest time the event loop took to come back to a task that only sleeps
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def login_burst(logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login():
+            async with semaphore:
+                response = await client.post("/login", json={"email": EMAIL, "password": PASSWORD})
+                response.raise_for_status()
+
+        stop = asyncio.Event()
+        lag = asyncio.create_task(measure_loop_lag(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        return {"logins_per_second": logins / elapsed, "max_loop_lag_ms": await lag * 1000}
+
+
+async def run_bursts(pool_sizes: list, logins: int, concurrency: int) -> list:
+    # One event loop for every burst: the async engine's pool belongs to the loop that used it
+    results = []
+    try:
+        for size in pool_sizes:
+            auth.shutdown_hash_executor()
+            auth.PASSWORD_HASH_WORKERS = size
+            results.append({"pool_size": size, **await login_burst(logins, concurrency)})
+    finally:
+        auth.shutdown_hash_executor()
+        await async_engine.dispose()
+    return results
+
+
+def run(pool_sizes: list, logins: int = 100, concurrency: int = 32, rounds: int = 12) -> list:
+    add_user(rounds)
+    return asyncio.run(run_bursts(pool_sizes, logins, concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost of the stored hash")
+    args = parser.parse_args()
+
+    print(f"{auth.PASSWORD_HASH_POOL} pool, bcrypt rounds {args.rounds}, {os.cpu_count()} CPUs")
+    for result in run(args.pool_sizes, args.logins, args.concurrency, args.rounds):
+        print(f"pool {result['pool_size']:>3}: {result['logins_per_second']:>7.1f} logins/s  "
+              f"max loop stall {result['max_loop_lag_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
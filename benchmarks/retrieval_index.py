@@ -0,0 +1,98 @@
+"""Build time and query latency of the BM25 bill text index.
+
+Indexes the whole bills_billtext table of DATABASE_URL with BM25Index.sync(), then times
+--queries searches against random bills:
+
+    DATABASE_URL=postgresql://... python benchmarks/retrieval_index.py --queries 2000
+
+Without DATABASE_URL, a throwaway SQLite database is filled with --synthetic-bills generated
+bills of about --text-kb kilobytes each.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+SYNTHETIC = "DATABASE_URL" not in os.environ
+if SYNTHETIC:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='retrieval-bench-')}/bench.db"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # the client is built on import, never called
+
+from sqlalchemy import select  # noqa: E402
+from app import models, retrieval  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from chunking import WORDS, make_bill  # noqa: E402
+
+QUESTIONS = [
+    "what does the bill change about the tax credit",
+    "who may amend the schedule by order",
+    "does the minister need an agreement with the province",
+    "which regulation applies to a corporation in a prescribed year",
+]
+
+
+def add_synthetic_bills(count: int, text_kb: int):
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        for i in range(1, count + 1):
+            db.add(models.BillsBill(id=i, name_en=f"Bill {i}", status_code="introduced", text_docid=1000 + i))
+            db.add(models.BillsBillText(bill_id=i, docid=1000 + i, created="2024-01-01",
+                                        text_en=make_bill(text_kb * 1024, seed=i)))
+        db.commit()
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(queries: int = 1000, k: int = retrieval.RETRIEVAL_TOP_K, seed: int = 15) -> dict:
+    index = retrieval.BM25Index()
+    started = time.perf_counter()
+    index.sync()
+    build = time.perf_counter() - started
+
+    with SessionLocal() as db:
+        bill_ids = list(db.scalars(select(models.BillsBill.id).where(models.BillsBill.text_docid.is_not(None))))
+    rng = random.Random(seed)
+    latencies, hits = [], 0
+    for _ in range(queries):
+        question = rng.choice(QUESTIONS) + " " + " ".join(rng.sample(WORDS, 2))
+        started = time.perf_counter()
+        hits += bool(index.search(rng.choice(bill_ids), question, k))
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "bills": len(bill_ids),
+        "passages": len(index),
+        "build_seconds": build,
+        "queries": queries,
+        "queries_with_hits": hits,
+        "query_p50_ms": statistics.median(latencies) * 1000,
+        "query_p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=retrieval.RETRIEVAL_TOP_K)
+    parser.add_argument("--synthetic-bills", type=int, default=500)
+    parser.add_argument("--text-kb", type=int, default=60)
+    args = parser.parse_args()
+
+    if SYNTHETIC:
+        add_synthetic_bills(args.synthetic_bills, args.text_kb)
+    result = run(args.queries, args.k)
+    print(f"index: {result['bills']} bills, {result['passages']} passages in {result['build_seconds']:.2f}s")
+    print(f"query: {result['queries']} searches (k={args.k})  p50 {result['query_p50_ms']:.2f} ms  "
+          f"p99 {result['query_p99_ms']:.2f} ms  {result['queries_with_hits']} with hits")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
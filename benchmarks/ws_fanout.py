@@ -0,0 +1,94 @@
+"""Fan-out benchmark for app.websocket_manager.ConnectionManager.
+
+Connects N simulated websocket clients (in-process fakes, no network) as moderators, a few of
+them failing or stalled, and measures how long broadcast_to_moderators takes to enqueue and
+how long each healthy client waits for its message.
+
+    python benchmarks/ws_fanout.py --clients 10000 --rounds 3
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # the manager never touches the database here
+os.environ["PUBSUB_BACKEND"] = "memory"
+
+from app import websocket_manager  # noqa: E402
+
+
+class SimulatedSocket:
+    def __init__(self, mode: str, latency: float):
+        self.mode = mode  # "ok", "dead" (send raises) or "stalled" (send never returns)
+        self.latency = latency
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.mode == "dead":
+            raise ConnectionResetError("broken pipe")
+        if self.mode == "stalled":
+            await asyncio.sleep(3600)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.received.append(time.perf_counter())
+
+
+class SimulatedUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.is_moderator = True
+
+
+async def run(args):
+    websocket_manager.WS_SEND_TIMEOUT = args.send_timeout
+    manager = websocket_manager.ConnectionManager()
+    sockets = []
+    for i in range(args.clients):
+        mode = "dead" if i < args.dead else "stalled" if i < args.dead + args.stalled else "ok"
+        socket = SimulatedSocket(mode, args.latency / 1000)
+        sockets.append(socket)
+        await manager.connect(socket, SimulatedUser(i))
+    healthy = [socket for socket in sockets if socket.mode == "ok"]
+
+    print(f"{args.clients} clients ({args.dead} failing, {args.stalled} stalled), "
+          f"send timeout {args.send_timeout}s, simulated send latency {args.latency}ms")
+    for round_number in range(args.rounds):
+        started = time.perf_counter()
+        await manager.broadcast_to_moderators(f"message {round_number}")
+        enqueued = time.perf_counter() - started
+        # Wait until every healthy client has its message and every stalled one has timed out
+        deadline = started + args.send_timeout + 5
+        while time.perf_counter() < deadline and any(len(s.received) <= round_number for s in healthy):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(args.send_timeout if round_number == 0 else 0)
+
+        latencies = sorted((s.received[round_number] - started) * 1000
+                           for s in healthy if len(s.received) > round_number)
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(f"round {round_number + 1}: enqueue {enqueued * 1000:.1f}ms, delivered {len(latencies)}/{len(healthy)}, "
+              f"p50 {percentiles[49]:.1f}ms p95 {percentiles[94]:.1f}ms p99 {percentiles[98]:.1f}ms "
+              f"max {latencies[-1]:.1f}ms, connections left {len(manager.active_connections)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--dead", type=int, default=20, help="clients whose sends fail")
+    parser.add_argument("--stalled", type=int, default=10, help="clients whose sends never complete")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--send-timeout", type=float, default=0.5)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated per-send latency in ms")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import argparse
+import asyncio
+import logging
+from app.importer import import_bills, sync_bills
+
+def main():
+    parser = argparse.ArgumentParser(description="Import bills from the openparliament API, resuming an interrupted run")
+    parser.add_argument("--restart", action="store_true", help="Start from the first page instead of the last checkpoint")
+    parser.add_argument("--sync", action="store_true", help="Only fetch bills introduced or changed since the last sync")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.sync:
+        result = asyncio.run(sync_bills())
+        print(f"Synced {result['bills']} new or changed bills in {result['seconds']}s, "
+              f"up to {result['high_water_mark']}")
+        return
+    result = asyncio.run(import_bills(restart=args.restart))
+    print(f"Imported {result['bills']} bills from {result['pages']} pages"
+          f"{' (resumed)' if result['resumed'] else ''}{'' if result['completed'] else ', not finished'}")
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,7 @@ CREATE TABLE IF NOT EXISTS bills (
     pdf_url TEXT,
     upvotes INTEGER DEFAULT 0,
     downvotes INTEGER DEFAULT 0,
+    UNIQUE (session, number)
 );
 
 
@@ -81,6 +82,7 @@ CREATE INDEX IF NOT EXISTS bills_bill_institution ON bills_bill (institution);
 CREATE INDEX IF NOT EXISTS bills_bill_institution_like ON bills_bill (institution varchar_pattern_ops);
 CREATE INDEX IF NOT EXISTS bills_bill_sponsor_member_id ON bills_bill (sponsor_member_id);
 CREATE INDEX IF NOT EXISTS bills_bill_sponsor_politician_id ON bills_bill (sponsor_politician_id);
+CREATE INDEX IF NOT EXISTS ix_bills_bill_introduced_id ON bills_bill (introduced DESC, id DESC);
 
 
 CREATE TABLE IF NOT EXISTS bills_billtext (
@@ -0,0 +1,18 @@
+import argparse
+from app.database import SessionLocal
+from app.summaries import backfill_summaries
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and store summaries for bill texts that have none")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of bill texts to summarize")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = backfill_summaries(db, limit=args.limit)
+    finally:
+        db.close()
+    print(f"Summarized {result['summarized']} bill texts, {result['failed']} failed")
+
+if __name__ == "__main__":
+    main()
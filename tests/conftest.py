@@ -0,0 +1,167 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+# The app builds its engines from the environment at import time, so point it at a
+# throwaway SQLite file before anything under app/ is imported.
+_tmpdir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("GEOLOCATION_PROVIDER", "none")
+os.environ.setdefault("PUBSUB_BACKEND", "memory")
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app import models, auth, chatbot, geolocation, helpers, retrieval
+from app.database import Base, SessionLocal, engine
+from app.main import app
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Postgres-only checks run when TEST_POSTGRES_URL points at a scratch database
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+requires_postgres = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+@pytest.fixture(autouse=True)
+def fresh_database():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    for cache in (auth.user_cache, chatbot.bill_context_cache, geolocation.location_cache,
+                  helpers.pdf_url_hashes, helpers.pdf_texts):
+        cache.clear()
+    # Text ids restart with every database, so the index must too
+    retrieval.bill_text_index = retrieval.BM25Index()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def pg_session():
+    # A session on a freshly created schema in the TEST_POSTGRES_URL database
+    pg_engine = create_engine(TEST_POSTGRES_URL)
+    Base.metadata.drop_all(bind=pg_engine)
+    Base.metadata.create_all(bind=pg_engine)
+    session = sessionmaker(bind=pg_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        pg_engine.dispose()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def count_queries():
+    # count_queries() -> a list that collects every statement run on the sync engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield lambda: statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def register_users(client, count, prefix="user"):
+    # Registers and logs in `count` users; returns their Authorization headers
+    headers = []
+    for i in range(count):
+        email = f"{prefix}{i}@example.com"
+        client.post("/register/", json={"name": prefix, "email": email, "username": f"{prefix}{i}", "password": "secret"})
+        token = client.post("/login", json={"email": email, "password": "secret"}).json()["access_token"]
+        headers.append({"Authorization": f"Bearer {token}"})
+    return headers
+
+
+def add_bills(db, count, with_text=True, **fields):
+    bills = []
+    for i in range(1, count + 1):
+        bill = models.BillsBill(id=i, name_en=f"Bill {i}", status_code="introduced", upvotes=0, downvotes=0,
+                                text_docid=1000 + i if with_text else None, **fields)
+        db.add(bill)
+        if with_text:
+            db.add(models.BillsBillText(bill_id=i, docid=1000 + i, created="2024-01-01",
+                                        text_en=f"Text of bill {i}", summary_en=f"Summary {i}"))
+        bills.append(bill)
+    db.commit()
+    return bills
+
+
+class FakeOpenAI:
+    # Stands in for helpers.client: answers every completion with a short canned summary after
+    # `delay` seconds, raising the queued `failures` first
+    def __init__(self, delay=0.0, failures=()):
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.delay = delay
+        self.failures = list(failures)
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, model, **kwargs):
+        with self.lock:
+            self.calls += 1
+            failure = self.failures.pop(0) if self.failures else None
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if failure is not None:
+                raise failure
+            time.sleep(self.delay)
+        finally:
+            with self.lock:
+                self.active -= 1
+        content = f"summary of {len(messages[-1]['content'])} chars"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, **env):
+    # Runs the app under uvicorn in a subprocess, on the test database unless env overrides it;
+    # returns once GET /bills-bill/1 answers 200, so bill 1 must exist
+    env = {**os.environ, **env}
+    env.pop("ASYNC_DATABASE_URL", None)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/bills-bill/1").status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"server on port {port} did not start")
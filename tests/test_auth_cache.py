@@ -0,0 +1,63 @@
+from sqlalchemy import update
+from app import auth, models
+from app.database import SessionLocal
+
+
+def add_user(db, email="mod@example.com"):
+    db.add(models.User(id=1, name="m", email=email, username="m", password="x", is_moderator=False))
+    db.commit()
+    return auth.create_access_token({"sub": email})
+
+
+def current_user(token):
+    with SessionLocal() as session:
+        return auth.get_current_user(token, session)
+
+
+def test_cache_is_dropped_when_the_change_commits(db):
+    token = add_user(db)
+    assert current_user(token).is_moderator is False
+
+    user = db.get(models.User, 1)
+    user.is_moderator = True
+    db.flush()
+    # A request served between the flush and the commit caches the old row again
+    assert current_user(token).is_moderator is False
+    db.commit()
+
+    assert current_user(token).is_moderator is True
+
+
+def test_rolled_back_change_keeps_the_cache(db):
+    token = add_user(db)
+    cached = current_user(token)
+
+    db.get(models.User, 1).is_moderator = True
+    db.flush()
+    db.rollback()
+    db.commit()  # an unrelated later commit of the same session
+
+    assert auth.user_cache.get("mod@example.com") is cached
+
+
+def test_email_change_drops_both_addresses(db):
+    token = add_user(db)
+    current_user(token)
+    auth.user_cache.put("new@example.com", "stale")
+
+    db.get(models.User, 1).email = "new@example.com"
+    db.commit()
+
+    assert auth.user_cache.get("mod@example.com") is None
+    assert auth.user_cache.get("new@example.com") is None
+
+
+def test_bulk_update_clears_the_cache_on_commit(db):
+    token = add_user(db)
+    current_user(token)
+
+    db.execute(update(models.User).values(is_moderator=True))
+    assert auth.user_cache.get("mod@example.com") is not None
+    db.commit()
+
+    assert current_user(token).is_moderator is True
@@ -0,0 +1,24 @@
+from conftest import add_bills
+
+
+def bill_queries(statements):
+    return [s for s in statements if "bills_bill" in s]
+
+
+def test_bill_listing_query_count_is_constant(client, db, count_queries):
+    add_bills(db, 60)
+    counts = []
+    for limit in (5, 20, 60):
+        before = len(count_queries())
+        response = client.get(f"/bills-bill/?limit={limit}")
+        assert response.status_code == 200
+        assert len(response.json()) == limit
+        assert all(bill["texts"] for bill in response.json())
+        counts.append(len(bill_queries(count_queries()[before:])))
+    assert counts[0] == counts[1] == counts[2] == 2
+
+
+def test_single_bill_loads_its_texts(client, db):
+    add_bills(db, 2)
+    body = client.get("/bills-bill/2").json()
+    assert [text["docid"] for text in body["texts"]] == [1002]
@@ -0,0 +1,88 @@
+import pytest
+from datetime import date
+from sqlalchemy import desc
+from app import crud, helpers, models
+from conftest import add_bills, requires_postgres
+
+
+def add_mixed_bills(db):
+    # 30 bills: several share an introduced date and some have none at all
+    bills = add_bills(db, 30, with_text=False)
+    for bill in bills:
+        bill.introduced = None if bill.id % 7 == 0 else date(2023, 1 + bill.id % 4, 1)
+    db.commit()
+    return bills
+
+
+def offset_order(client, total):
+    return [bill["id"] for bill in client.get("/bills-bill/", params={"limit": total}).json()]
+
+
+def walk(client, limit):
+    ids, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"after": cursor} if cursor else {})}
+        response = client.get("/bills-bill/", params=params)
+        if response.status_code == 404:  # the page after a full last page
+            return ids
+        assert response.status_code == 200
+        ids += [bill["id"] for bill in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids
+
+
+def test_keyset_pages_match_the_offset_order(client, db):
+    add_mixed_bills(db)
+    expected = offset_order(client, 30)
+    assert sorted(expected) == list(range(1, 31))
+    # NULL dates sort first, newest first after them, ties broken by id descending
+    assert expected[:4] == [28, 21, 14, 7]
+
+    for limit in (1, 3, 4, 7, 29, 30, 100):
+        assert walk(client, limit) == expected
+
+
+def test_cursor_starting_inside_the_null_dates(client, db):
+    add_mixed_bills(db)
+    after_14 = helpers.encode_cursor(None, 14)
+    ids = [bill["id"] for bill in client.get("/bills-bill/", params={"after": after_14, "limit": 100}).json()]
+    assert ids == offset_order(client, 30)[3:]
+
+
+def test_offset_pages_also_match(client, db):
+    add_mixed_bills(db)
+    expected = offset_order(client, 30)
+    pages = [client.get("/bills-bill/", params={"limit": 8, "offset": offset}).json() for offset in range(0, 30, 8)]
+    assert [bill["id"] for page in pages for bill in page] == expected
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    helpers.encode_cursor("2023-01-01"),  # one value instead of two
+    helpers.encode_cursor("yesterday", 3),
+    helpers.encode_cursor("2023-01-01", "x"),
+    helpers.encode_cursor("2023-01-01", 3, 4),
+])
+def test_malformed_cursor_is_rejected(client, db, cursor):
+    add_mixed_bills(db)
+    response = client.get("/bills-bill/", params={"after": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@requires_postgres
+def test_keyset_cursor_on_postgres(pg_session):
+    add_mixed_bills(pg_session)
+    query = pg_session.query(models.BillsBill.id, models.BillsBill.introduced).order_by(
+        desc(models.BillsBill.introduced).nullsfirst(), desc(models.BillsBill.id))
+    expected = [row.id for row in query]
+    walked, cursor = [], None
+    while True:
+        page = (query.filter(crud.bills_bill_after_cursor(cursor)) if cursor else query).limit(4).all()
+        walked += [row.id for row in page]
+        if len(page) < 4:
+            break
+        cursor = helpers.encode_cursor(page[-1].introduced, page[-1].id)
+    assert walked == expected
+    assert expected[:4] == [28, 21, 14, 7]
@@ -0,0 +1,83 @@
+import json
+from datetime import date
+from app import crud, models
+
+
+def add_listed_bills(db, count):
+    db.add_all(models.Bill(session="44-1", number=f"C-{i}", name=f"Bill C-{i}", introduced=date(2022, 1 + i % 12, 1),
+                           status="Second reading", upvotes=i, downvotes=0)
+               for i in range(1, count + 1))
+    db.commit()
+    return sorted(bill.id for bill in db.query(models.Bill))
+
+
+def walk(client, limit, **params):
+    pages, cursor = [], None
+    while True:
+        response = client.get("/bills/", params={"limit": limit, **params, **({"after": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_bill_once(client, db):
+    ids = add_listed_bills(db, 23)
+
+    for limit in (1, 5, 23, 50):
+        pages = walk(client, limit)
+        seen = [bill["id"] for page in pages for bill in page]
+        assert seen == ids  # in id order, no duplicates, no gaps
+        assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_cursor_ending_exactly_on_a_page_boundary(client, db):
+    add_listed_bills(db, 10)
+    pages = walk(client, 5)
+    # The full second page still hands out a cursor, which then leads to an empty page
+    assert [len(page) for page in pages] == [5, 5, 0]
+
+
+def test_fields_limit_the_keys(client, db):
+    add_listed_bills(db, 3)
+
+    bills = client.get("/bills/", params={"fields": "name, status,name"}).json()
+
+    assert [set(bill) for bill in bills] == [{"id", "name", "status"}] * 3
+    assert client.get("/bills/", params={"fields": "id"}).json()[0] == {"id": bills[0]["id"]}
+    assert set(client.get("/bills/").json()[0]) == set(crud.BILL_FIELDS)
+
+
+def test_unknown_fields_and_bad_cursors_are_rejected(client, db):
+    add_listed_bills(db, 3)
+
+    response = client.get("/bills/", params={"fields": "name,password,secret"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown fields: password, secret"
+    assert client.get("/bills/export", params={"fields": "password"}).status_code == 400
+    for cursor in ("not-base64!", "WzEsMl0", "WyJ4Il0"):  # garbage, [1,2], ["x"]
+        assert client.get("/bills/", params={"after": cursor}).status_code == 400
+
+
+def test_export_streams_one_json_object_per_line(client, db):
+    ids = add_listed_bills(db, 1200)  # more than one batch of the server-side cursor
+
+    response = client.get("/bills/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.split("\n")
+    assert lines[-1] == ""
+    bills = [json.loads(line) for line in lines[:-1]]
+    assert [bill["id"] for bill in bills] == ids
+    assert bills[0]["introduced"] == "2022-02-01"
+    assert set(bills[0]) == set(crud.BILL_FIELDS)
+
+
+def test_export_honours_fields(client, db):
+    add_listed_bills(db, 3)
+    lines = client.get("/bills/export", params={"fields": "number"}).text.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": bill_id, "number": f"C-{n}"} for n, bill_id in enumerate(sorted(
+            b.id for b in db.query(models.Bill)), start=1)]
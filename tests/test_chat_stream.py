@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import pytest
+from app import chatbot, models
+from conftest import add_bills, free_port, start_server
+
+TOKENS = ["The ", "bill ", "amends ", "the ", "Income ", "Tax ", "Act."]
+TOKEN_DELAY = 0.15
+
+
+class FakeCompletions(BaseHTTPRequestHandler):
+    # Stand-in for the OpenAI chat completions API: streams TOKENS with a pause between them
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not request.get("stream"):
+            body = json.dumps({"id": "c", "object": "chat.completion", "created": 0, "model": request["model"],
+                               "choices": [{"index": 0, "finish_reason": "stop",
+                                            "message": {"role": "assistant", "content": "".join(TOKENS)}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, token in enumerate(TOKENS + [None]):
+            if index:
+                time.sleep(TOKEN_DELAY)
+            delta = {"content": token} if token is not None else {}
+            chunk = {"id": "c", "object": "chat.completion.chunk", "created": 0, "model": request["model"],
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None if token else "stop"}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self.write_chunk("data: [DONE]\n\n")
+        self.write_chunk("")
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 makes bursts of connections wait for SYN retries
+
+
+@pytest.fixture
+def chat_server(db):
+    add_bills(db, 1)
+    fake = FakeOpenAIServer(("127.0.0.1", 0), FakeCompletions)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+    port = free_port()
+    server = start_server(port, OPENAI_BASE_URL=f"http://127.0.0.1:{fake.server_port}/v1")
+    yield f"http://127.0.0.1:{port}"
+    server.terminate()
+    server.wait(10)
+    fake.shutdown()
+    fake.server_close()
+
+
+async def read_stream(client, url, payload):
+    # -> (seconds to the first delta, seconds to the end, deltas, done frame data)
+    started = time.perf_counter()
+    first = None
+    deltas, done, event = [], None, None
+    async with client.stream("POST", url, json=payload) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "done":
+                    done = data
+                elif event is None:
+                    first = first or time.perf_counter() - started
+                    deltas.append(data["delta"])
+                else:
+                    raise AssertionError(data)
+            elif not line:
+                event = None
+    return first, time.perf_counter() - started, deltas, done
+
+
+def test_tokens_reach_the_client_as_they_are_generated(chat_server):
+    async def main():
+        async with httpx.AsyncClient(base_url=chat_server, timeout=30) as client:
+            return await read_stream(client, "/chat/1/stream",
+                                     {"conversation": [{"role": "user", "content": "What does it change?"}]})
+
+    first, total, deltas, done = asyncio.run(main())
+
+    assert deltas == TOKENS
+    assert done["conversation"][-1] == {"role": "assistant", "content": "".join(TOKENS)}
+    full_completion = TOKEN_DELAY * len(TOKENS)
+    assert total >= full_completion
+    assert first < full_completion / 3
+
+
+def test_streamed_reply_is_stored_with_the_conversation(chat_server, db):
+    async def main():
+        async with httpx.AsyncClient(base_url=chat_server, timeout=30) as client:
+            return await read_stream(client, "/chat/1/stream", {"message": "What does it change?"})
+
+    _, _, deltas, done = asyncio.run(main())
+
+    assert "".join(deltas) == "".join(TOKENS)
+    stored = db.query(models.ChatMessage).filter_by(conversation_id=done["conversation_id"]) \
+        .order_by(models.ChatMessage.id).all()
+    # The stored conversation opens with the greeting, then the turn that was streamed
+    assert [(m.role, m.content) for m in stored[-2:]] == [("user", "What does it change?"),
+                                                           ("assistant", "".join(TOKENS))]
+
+
+def test_many_open_streams_do_not_queue_behind_worker_threads(chat_server):
+    # More concurrent chats than Starlette's 40 threadpool workers, all streaming at once
+    streams = 60
+
+    async def main():
+        limits = httpx.Limits(max_connections=streams)
+        async with httpx.AsyncClient(base_url=chat_server, timeout=60, limits=limits) as client:
+            payload = {"conversation": [{"role": "user", "content": "Summarize it"}]}
+            started = time.perf_counter()
+            results = await asyncio.gather(*(read_stream(client, "/chat/1/stream", payload)
+                                             for _ in range(streams)))
+            return time.perf_counter() - started, results
+
+    elapsed, results = asyncio.run(main())
+
+    assert all(deltas == TOKENS for _, _, deltas, _ in results)
+    assert elapsed < 2.5 * TOKEN_DELAY * len(TOKENS)
+
+
+def test_a_failed_completion_sends_a_generic_error_event(client, db, monkeypatch, caplog):
+    add_bills(db, 1)
+
+    async def failing_create(**kwargs):
+        raise RuntimeError("upstream said: invalid key sk-secret")
+
+    monkeypatch.setattr(chatbot.async_client.chat.completions, "create", failing_create)
+    response = client.post("/chat/1/stream", json={"conversation": [{"role": "user", "content": "Summarize it"}]})
+
+    assert response.status_code == 200
+    assert response.text == ('event: error\n'
+                             'data: {"detail": "An error occurred while generating the response"}\n\n')
+    # The client gets nothing of the exception, the log gets all of it
+    assert "sk-secret" in caplog.text
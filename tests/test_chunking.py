@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import types
+from app import helpers
+from conftest import REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+import chunking  # noqa: E402
+
+
+def word_count(text):
+    return len(text.split())
+
+
+def test_split_text_matches_the_original_implementation():
+    text = chunking.make_bill(300_000)
+    for max_characters in (50, 1000, 15000):
+        assert helpers.split_text(text, max_characters) == chunking.legacy_split_text(text, max_characters)
+
+
+def test_token_chunks_respect_the_budget_and_keep_every_word():
+    text = chunking.make_bill(200_000)
+    chunks = list(helpers.iter_token_chunks(text, 300, token_counter=word_count))
+
+    assert all(word_count(chunk) <= 300 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+    # Cuts land on section and clause boundaries rather than mid-sentence
+    assert sum(chunk.endswith((";", ":")) for chunk in chunks[:-1]) == len(chunks) - 1
+
+
+def test_token_chunks_shrink_when_text_is_denser_than_estimated():
+    text = " ".join(["a"] * 10_000)
+    # One token per character: four times denser than the chunker's first guess
+    chunks = list(helpers.iter_token_chunks(text, 100, token_counter=len))
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_chunking_is_not_quadratic():
+    text = chunking.make_bill(4 * 1024 * 1024)
+    started = time.perf_counter()
+    chunking.legacy_split_text(text, 14000)
+    legacy = time.perf_counter() - started
+    started = time.perf_counter()
+    list(helpers.iter_token_chunks(text, 3500, helpers.estimate_tokens))
+    streaming = time.perf_counter() - started
+    assert streaming * 5 < legacy
+
+
+def test_tokenizer_is_loaded_on_first_use(monkeypatch):
+    calls = []
+
+    def encoding_for_model(model):
+        calls.append(model)
+        raise OSError("no network")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(encoding_for_model=encoding_for_model))
+    helpers.get_token_counter.cache_clear()
+    try:
+        assert calls == []
+        # An encoding that cannot be downloaded falls back to the estimate, once
+        assert helpers.count_tokens("x" * 40) == 10
+        assert helpers.count_tokens("x" * 8) == 2
+        assert calls == ["gpt-3.5-turbo"]
+    finally:
+        helpers.get_token_counter.cache_clear()
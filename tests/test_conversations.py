@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app import chatbot, conversations, models
+from app.database import AsyncSessionLocal
+from conftest import add_bills
+
+WINDOW, BATCH = conversations.CHAT_WINDOW_MESSAGES, conversations.CHAT_SUMMARY_BATCH
+
+
+class FakeChatbot:
+    # Stands in for chatbot.async_client: records chat prompts and summary requests apart.
+    # Summary calls sleep for the next of `summary_delays`, if any.
+    def __init__(self, summary_delays=()):
+        self.prompts = []
+        self.summaries = []
+        self.summary_delays = list(summary_delays)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, model, **kwargs):
+        if messages[0]["content"].startswith("You maintain a brief running summary"):
+            self.summaries.append(messages[-1]["content"])
+            number = len(self.summaries)
+            if self.summary_delays:
+                await asyncio.sleep(self.summary_delays.pop(0))
+            content = f"summary {number}"
+        else:
+            self.prompts.append(messages)
+            content = f"answer {len(self.prompts)}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def fake_chatbot(monkeypatch):
+    fake = FakeChatbot()
+    monkeypatch.setattr(chatbot, "async_client", fake)
+    return fake
+
+
+async def conversation_with(messages: int) -> models.ChatConversation:
+    # A stored conversation of `messages` messages: the greeting, then alternating turns
+    async with AsyncSessionLocal() as db:
+        conversation = await conversations.create_conversation(db, 1, {"role": "assistant", "content": "hello"})
+        for number in range(1, messages):
+            role = "user" if number % 2 else "assistant"
+            await conversations.add_message(db, conversation.id, role, f"message {number}")
+        return conversation
+
+
+async def stored(conversation_id: str):
+    async with AsyncSessionLocal() as db:
+        conversation = await db.get(models.ChatConversation, conversation_id)
+        message_ids = [message.id for message in (await db.execute(
+            models.ChatMessage.__table__.select()
+            .where(models.ChatMessage.conversation_id == conversation_id)
+            .order_by(models.ChatMessage.id)
+        )).all()]
+        return conversation, message_ids
+
+
+def test_prompts_stay_within_window_and_summary(client, db, fake_chatbot):
+    add_bills(db, 1)
+    conversation_id = None
+    for turn in range(20):
+        payload = {"message": f"question {turn}"}
+        if conversation_id:
+            payload["conversation_id"] = conversation_id
+        response = client.post("/chat/1", json=payload)
+        assert response.status_code == 200
+        conversation_id = response.json()["conversation_id"]
+
+    history = [[m for m in prompt if m["role"] != "system"] for prompt in fake_chatbot.prompts]
+    assert max(len(messages) for messages in history) <= WINDOW + BATCH
+    first_summarized = next(i for i, prompt in enumerate(fake_chatbot.prompts)
+                            if any(m["content"].startswith("Summary of the earlier") for m in prompt))
+    # Once summarizing starts, the recent window is always kept whole
+    assert min(len(messages) for messages in history[first_summarized:]) > WINDOW
+    # Every prompt ends with the question it answers
+    assert [messages[-1]["content"] for messages in history] == [f"question {turn}" for turn in range(20)]
+    # Forty messages, compacted in batches rather than on every turn
+    assert 0 < len(fake_chatbot.summaries) <= 40 // BATCH
+
+
+@pytest.mark.parametrize("messages", [1, BATCH, WINDOW - 1, WINDOW, WINDOW + BATCH - 1])
+def test_compaction_waits_for_window_plus_batch(db, fake_chatbot, messages):
+    add_bills(db, 1)
+
+    async def main():
+        conversation = await conversation_with(messages)
+        await conversations.compact_conversation(conversation.id)
+        return await stored(conversation.id)
+
+    conversation, _ = asyncio.run(main())
+    assert fake_chatbot.summaries == []
+    assert (conversation.summary, conversation.summarized_through_id) == (None, 0)
+
+
+@pytest.mark.parametrize("messages", [WINDOW + BATCH, WINDOW + BATCH + 3])
+def test_compaction_folds_exactly_the_overflow(db, fake_chatbot, messages):
+    add_bills(db, 1)
+
+    async def main():
+        conversation = await conversation_with(messages)
+        await conversations.compact_conversation(conversation.id)
+        return await stored(conversation.id)
+
+    conversation, message_ids = asyncio.run(main())
+    folded = messages - WINDOW
+    assert conversation.summary == "summary 1"
+    assert conversation.summarized_through_id == message_ids[folded - 1]
+    turns = fake_chatbot.summaries[0].split("New turns:\n")[1].split("\n\nReturn")[0].splitlines()
+    assert turns[0] == "assistant: hello"
+    assert len(turns) == folded and turns[-1].endswith(f"message {folded - 1}")
+
+
+def test_concurrent_compactions_apply_once(db, monkeypatch):
+    add_bills(db, 1)
+    # The first summary comes back first; a second apply would overwrite it with "summary 2"
+    fake = FakeChatbot(summary_delays=[0.05, 0.2])
+    monkeypatch.setattr(chatbot, "async_client", fake)
+
+    async def main():
+        conversation = await conversation_with(WINDOW + BATCH)
+        await asyncio.gather(conversations.compact_conversation(conversation.id),
+                             conversations.compact_conversation(conversation.id))
+        return await stored(conversation.id)
+
+    conversation, message_ids = asyncio.run(main())
+    assert len(fake.summaries) == 2
+    assert conversation.summary == "summary 1"
+    assert conversation.summarized_through_id == message_ids[BATCH - 1]
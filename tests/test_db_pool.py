@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError
+
+from app import database
+from app.database import MeteredQueuePool, PoolMetrics, _attach_metrics, engine_options
+
+
+@pytest.fixture
+def metered_engine(tmp_path):
+    # SQLite keeps the default pooling in the app, so build the metered pool explicitly:
+    # one pooled connection, one overflow connection, short timeout
+    engine = create_engine(f"sqlite:///{tmp_path}/pool.db", poolclass=MeteredQueuePool,
+                           pool_size=1, max_overflow=1, pool_timeout=0.2)
+    metrics = PoolMetrics()
+    _attach_metrics(engine, metrics)
+    yield engine, metrics
+    engine.dispose()
+
+
+def test_postgres_engines_get_the_metered_pools():
+    assert engine_options("postgresql://u:p@db/app")["poolclass"] is database.MeteredQueuePool
+    assert engine_options("postgresql://u:p@db/app", is_async=True)["poolclass"] is database.MeteredAsyncQueuePool
+    assert engine_options("sqlite:///local.db") == {}
+
+
+def test_checkouts_overflow_and_timeouts_are_counted(metered_engine):
+    engine, metrics = metered_engine
+    first = engine.connect()
+    second = engine.connect()  # the pool is full, so this one opens the overflow connection
+    stats = metrics.snapshot()
+    assert (stats["checkouts"], stats["overflow_events"], stats["timeouts"]) == (2, 1, 0)
+    assert (stats["pool_size"], stats["checked_out"], stats["overflow"]) == (1, 2, 1)
+
+    with pytest.raises(TimeoutError):
+        engine.connect()
+    stats = metrics.snapshot()
+    assert (stats["checkouts"], stats["timeouts"]) == (2, 1)
+    assert stats["max_wait_ms"] >= 200
+
+    first.close()
+    second.close()
+    stats = metrics.snapshot()
+    assert (stats["checked_out"], stats["idle"]) == (0, 1)
+
+
+def test_waiting_for_a_connection_is_timed(metered_engine):
+    engine, metrics = metered_engine
+    held = [engine.connect(), engine.connect()]
+    metrics.max_wait = 0.0
+    threading.Timer(0.1, held.pop().close).start()
+
+    with engine.connect():
+        pass
+    stats = metrics.snapshot()
+    assert stats["checkouts"] == 3
+    assert stats["overflow_events"] == 1  # the freed connection was reused, not a new overflow
+    assert stats["max_wait_ms"] >= 100
+    held.pop().close()
+
+
+def test_metrics_follow_the_pool_across_dispose(metered_engine):
+    engine, metrics = metered_engine
+    engine.dispose()  # replaces the pool through recreate()
+    assert metrics.pool is engine.pool
+    with engine.connect():
+        pass
+    assert metrics.snapshot()["checkouts"] == 1
+
+
+def test_db_pool_endpoint_reports_both_engines(client, metered_engine, monkeypatch):
+    engine, metrics = metered_engine
+    monkeypatch.setattr(database, "sync_pool_metrics", metrics)
+    with engine.connect():
+        body = client.get("/metrics/db-pool").json()
+    assert set(body) == {"sync", "async"}
+    assert body["sync"]["checkouts"] == 1
+    assert body["sync"]["checked_out"] == 1
+    assert {"checkouts", "avg_wait_ms", "max_wait_ms", "overflow_events", "timeouts"} <= set(body["async"])
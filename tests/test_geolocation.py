@@ -0,0 +1,145 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from fastapi.testclient import TestClient
+from app import geolocation, models
+from app.database import SessionLocal
+from app.main import app
+from conftest import register_users
+
+CSV_ROWS = """start_ip,end_ip,city,region,country
+# comment rows and the header are skipped
+8.8.8.0,8.8.8.255,Mountain View,California,US
+24.48.0.0,24.48.255.255,Ottawa,Ontario,CA
+2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,Mountain View,California,US
+"""
+
+
+class StandInProvider:
+    # Answers from a dict after `delay` seconds, recording each lookup with the number of
+    # poll votes already stored when it started
+    def __init__(self, cities: dict, delay: float = 0):
+        self.cities = cities
+        self.delay = delay
+        self.lookups = []
+
+    async def lookup(self, ip: str):
+        with SessionLocal() as db:
+            self.lookups.append((ip, db.query(models.UserPollVote).count()))
+        await asyncio.sleep(self.delay)
+        city = self.cities.get(ip)
+        return {"city": city} if city else None
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def ipinfo_server():
+    # Local stand-in for ipinfo.io that records which client connection served each request
+    seen = {"paths": [], "connections": set()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            seen["paths"].append(self.path)
+            seen["connections"].add(self.client_address)
+            ip = self.path.split("/")[1]
+            if ip.startswith("31."):
+                # A 200 that is not JSON, like a proxy's or captive portal's page
+                status, content_type, data = 200, "text/html", b"<html>Service unavailable</html>"
+            else:
+                status, body = (200, {"ip": ip, "city": "Ottawa"}) if ip.startswith("24.") else (404, {})
+                content_type, data = "application/json", json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/{{ip}}/json", seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_cache_key_groups_networks_and_skips_private_addresses():
+    assert geolocation.cache_key("24.48.10.7") == geolocation.cache_key("24.48.10.200") == "24.48.10.0/24"
+    assert geolocation.cache_key("2001:4860:1:2::1") == "2001:4860:1::/48"
+    assert geolocation.cache_key("10.0.0.1") is None
+    assert geolocation.cache_key("testclient") is None
+
+
+def test_csv_provider_finds_ranges_by_binary_search(tmp_path):
+    path = tmp_path / "ranges.csv"
+    path.write_text(CSV_ROWS)
+    provider = geolocation.CsvRangeProvider(str(path))
+
+    async def lookup(ip):
+        return await provider.lookup(ip)
+
+    assert asyncio.run(lookup("24.48.200.1"))["city"] == "Ottawa"
+    assert asyncio.run(lookup("8.8.8.8")) == {"city": "Mountain View", "region": "California", "country": "US"}
+    assert asyncio.run(lookup("2001:4860::8888"))["city"] == "Mountain View"
+    assert asyncio.run(lookup("8.8.9.1")) is None  # between ranges
+    assert asyncio.run(lookup("1.1.1.1")) is None  # before the first range
+    assert asyncio.run(lookup("not an ip")) is None
+
+
+def test_ipinfo_provider_reuses_one_client_and_caches_per_network(ipinfo_server, monkeypatch):
+    url, seen = ipinfo_server
+    monkeypatch.setattr(geolocation, "provider", geolocation.IpinfoProvider(url=url))
+
+    async def main():
+        try:
+            return [await geolocation.locate(ip) for ip in ("24.48.10.7", "24.48.10.9", "9.9.9.9", "9.9.9.10")]
+        finally:
+            await geolocation.close()
+
+    assert asyncio.run(main()) == ["Ottawa", "Ottawa", "Unknown location", "Unknown location"]
+    # The second address of the /24 comes from the cache; failed lookups are retried
+    assert seen["paths"] == ["/24.48.10.7/json", "/9.9.9.9/json", "/9.9.9.10/json"]
+    assert len(seen["connections"]) == 1
+
+
+def test_ipinfo_provider_treats_a_non_json_answer_as_unknown(ipinfo_server, monkeypatch):
+    url, seen = ipinfo_server
+    monkeypatch.setattr(geolocation, "provider", geolocation.IpinfoProvider(url=url))
+
+    async def main():
+        try:
+            return await geolocation.provider.lookup("31.13.64.1"), await geolocation.locate("31.13.64.1")
+        finally:
+            await geolocation.close()
+
+    assert asyncio.run(main()) == (None, "Unknown location")
+
+
+def test_poll_vote_is_stored_before_its_location_is_resolved(db, monkeypatch):
+    stand_in = StandInProvider({"24.48.10.7": "Ottawa"}, delay=0.05)
+    monkeypatch.setattr(geolocation, "provider", stand_in)
+    monkeypatch.setattr(geolocation, "GEOLOCATION_DEFERRED", True)
+    db.add(models.Poll(id=1, question="Should it pass?", yes_votes=0, no_votes=0))
+    db.commit()
+
+    with TestClient(app, client=("24.48.10.7", 50000)) as first_client, \
+            TestClient(app, client=("24.48.10.99", 50000)) as second_client:
+        first = first_client.post("/polls/1/vote", json={"vote": True},
+                                  headers=register_users(first_client, 1, prefix="first")[0])
+        second = second_client.post("/polls/1/vote", json={"vote": False},
+                                    headers=register_users(second_client, 1, prefix="second")[0])
+
+    assert first.status_code == second.status_code == 200
+    # One lookup, made after the first vote was committed; the second vote, from the same
+    # /24, took its location from the cache
+    assert stand_in.lookups == [("24.48.10.7", 1)]
+    db.expire_all()
+    assert {vote.ipaddress: vote.location for vote in db.query(models.UserPollVote)} == {
+        "24.48.10.7": "Ottawa", "24.48.10.99": "Ottawa"}
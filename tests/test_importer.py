@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import json
+import time
+import httpx
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app import importer, models
+from app.database import get_async_database_url
+from conftest import TEST_POSTGRES_URL, requires_postgres
+
+
+class FixtureApi:
+    # A local stand-in for the openparliament bill API, served through httpx.MockTransport.
+    # Listing pages honour ETags; with listed_status the listing entries carry each bill's status.
+    # Every response takes `latency` seconds, and listing pages at `failing_offsets` answer 404.
+    def __init__(self, bills: int = 25, page_size: int = 10, listed_status: bool = True, latency: float = 0):
+        self.page_size = page_size
+        self.listed_status = listed_status
+        self.latency = latency
+        self.failing_offsets = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+        self.bills = {}
+        for i in range(bills):
+            session = "43-2" if i < bills // 2 else "44-1"
+            self.bills[(session, f"C-{i}")] = {
+                "introduced": f"2021-{1 + i % 12:02d}-01" if session == "43-2" else f"2022-{1 + i % 12:02d}-01",
+                "status_code": "HouseAt2ndReading",
+                "status": "Second reading",
+            }
+
+    def entry(self, key):
+        session, number = key
+        bill = self.bills[key]
+        item = {"session": session, "number": number, "name": {"en": f"Bill {number}"},
+                "introduced": bill["introduced"], "url": f"/bills/{session}/{number}/"}
+        if self.listed_status:
+            item.update(status_code=bill["status_code"], status={"en": bill["status"]})
+        return item
+
+    def handler(self, request: httpx.Request):
+        self.requests.append(request)
+        params = request.url.params
+        if request.url.path == "/bills/":
+            keys = sorted(self.bills, key=lambda key: self.bills[key]["introduced"], reverse=True)
+            if "session" in params:
+                keys = [key for key in keys if key[0] == params["session"]]
+            if "introduced__gte" in params:
+                keys = [key for key in keys if self.bills[key]["introduced"] >= params["introduced__gte"]]
+            objects = [self.entry(key) for key in keys]
+            etag = '"%s"' % hashlib.md5(json.dumps(objects).encode()).hexdigest()
+            if request.headers.get("If-None-Match") == etag:
+                return httpx.Response(304)
+            offset = int(params.get("offset", 0))
+            if offset in self.failing_offsets:
+                return httpx.Response(404)
+            next_url = None
+            if offset + self.page_size < len(objects):
+                next_url = str(request.url.copy_merge_params({"offset": offset + self.page_size}).raw_path, "ascii")
+            return httpx.Response(200, headers={"ETag": etag}, json={
+                "objects": objects[offset:offset + self.page_size], "pagination": {"next_url": next_url}
+            })
+        _, _, session, number, _ = request.url.path.split("/")
+        bill = self.bills.get((session, number))
+        if bill is None:
+            return httpx.Response(404)
+        return httpx.Response(200, json={"status_code": bill["status_code"], "status": {"en": bill["status"]}})
+
+    async def async_handler(self, request: httpx.Request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            return self.handler(request)
+        finally:
+            self.in_flight -= 1
+
+    def importer(self, concurrency: int = importer.IMPORT_CONCURRENCY):
+        return importer.BillImporter(base_url="http://fixture", concurrency=concurrency, rate_limit=0,
+                                     transport=httpx.MockTransport(self.async_handler))
+
+
+def stored_bills(db):
+    return {(bill.session, bill.number): bill for bill in db.scalars(select(models.Bill))}
+
+
+def test_import_fetches_details_concurrently_and_stores_every_bill(db):
+    api = FixtureApi(latency=0.05, listed_status=False)
+    started = time.monotonic()
+    result = asyncio.run(api.importer(concurrency=4).run())
+    elapsed = time.monotonic() - started
+
+    assert result == {"pages": 3, "bills": 25, "errors": 0, "resumed": False, "completed": True}
+    bills = stored_bills(db)
+    assert len(bills) == 25
+    assert {bill.status_code for bill in bills.values()} == {"HouseAt2ndReading"}
+    # Detail requests overlap up to the concurrency limit, plus the prefetched next listing page
+    assert 4 <= api.max_in_flight <= 5
+    assert elapsed < len(api.requests) * api.latency / 2
+
+
+def test_interrupted_import_resumes_from_its_checkpoint(db):
+    api = FixtureApi(listed_status=False)
+    api.failing_offsets = {20}
+    first = asyncio.run(api.importer().run())
+    assert (first["pages"], first["bills"], first["completed"], first["errors"]) == (2, 20, False, 1)
+
+    api.failing_offsets.clear()
+    api.requests.clear()
+    second = asyncio.run(api.importer().run())
+
+    assert (second["pages"], second["bills"], second["resumed"], second["completed"]) == (3, 25, True, True)
+    listings = [request.url.params.get("offset") for request in api.requests if request.url.path == "/bills/"]
+    assert listings == ["20"]
+    assert len(stored_bills(db)) == 25
+
+
+def test_reimport_upserts_without_duplicates_or_touching_votes(db):
+    api = FixtureApi(listed_status=False)
+    asyncio.run(api.importer().run())
+    db.query(models.Bill).filter_by(number="C-3").update({"upvotes": 7})
+    db.commit()
+    api.bills[("43-2", "C-3")]["status"] = "Third reading"
+
+    result = asyncio.run(api.importer().run(restart=True))
+
+    assert result["bills"] == 1  # only the changed row is rewritten
+    db.expire_all()
+    bills = stored_bills(db)
+    assert len(bills) == 25
+    assert (bills[("43-2", "C-3")].status, bills[("43-2", "C-3")].upvotes) == ("Third reading", 7)
+
+
+def test_first_sync_on_empty_database_returns_sync_result():
+    api = FixtureApi()
+    result = asyncio.run(api.importer().sync())
+    assert result["bills"] == 25
+    assert result["high_water_mark"] == "2022-12-01"
+    assert "seconds" in result
+
+
+@pytest.mark.parametrize("listed_status", [True, False])
+def test_sync_without_changes_costs_two_requests(db, listed_status):
+    api = FixtureApi(listed_status=listed_status)
+    asyncio.run(api.importer().sync())
+    asyncio.run(api.importer().sync())  # stores the validators of the status listing
+    api.requests.clear()
+
+    result = asyncio.run(api.importer().sync())
+    assert result["bills"] == 0
+    assert [request.headers.get("If-None-Match") is not None for request in api.requests] == [True, True]
+
+
+def test_sync_applies_status_changes_from_the_listing(db):
+    api = FixtureApi()
+    asyncio.run(api.importer().sync())
+    api.bills[("44-1", "C-20")].update(status_code="RoyalAssentGiven", status="Royal assent received")
+    api.requests.clear()
+
+    result = asyncio.run(api.importer().sync())
+    assert result["bills"] == 1
+    # Only the bill on the high-water day is fetched in detail, by the new-bills listing
+    details = [request.url.path for request in api.requests if request.url.path != "/bills/"]
+    assert details == ["/bills/44-1/C-23/"]
+    status = db.execute(select(models.Bill.status_code).where(models.Bill.number == "C-20")).scalar()
+    assert status == "RoyalAssentGiven"
+
+
+@requires_postgres
+def test_import_upserts_on_postgres(pg_session):
+    api = FixtureApi(listed_status=False)
+
+    async def main():
+        engine = create_async_engine(get_async_database_url(TEST_POSTGRES_URL))
+        sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+        def make():
+            return importer.BillImporter(base_url="http://fixture", rate_limit=0, session_factory=sessions,
+                                         transport=httpx.MockTransport(api.async_handler))
+
+        try:
+            first = await make().run()
+            api.bills[("44-1", "C-20")]["status"] = "Royal assent received"
+            second = await make().run(restart=True)
+        finally:
+            await engine.dispose()
+        return first, second
+
+    first, second = asyncio.run(main())
+
+    assert (first["bills"], second["bills"]) == (25, 1)
+    assert pg_session.query(models.Bill).count() == 25
+    assert pg_session.query(models.Bill).filter_by(number="C-20").one().status == "Royal assent received"
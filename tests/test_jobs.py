@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from app import jobs, models
+from app.database import AsyncSessionLocal
+
+
+def test_heartbeat_keeps_a_slow_job_from_going_stale(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", 0.3)
+    monkeypatch.setattr(jobs, "JOB_HEARTBEAT_SECONDS", 0.05)
+
+    async def slow_work(report):
+        await asyncio.sleep(1)  # one long step with no progress report
+        return {"done": True}
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            job = await jobs.submit(db, "slow", slow_work)
+        await asyncio.sleep(0.6)
+        async with AsyncSessionLocal() as db:
+            with pytest.raises(HTTPException) as rejected:
+                await jobs.submit(db, "slow", slow_work)
+        await asyncio.gather(*jobs._tasks)
+        async with AsyncSessionLocal() as db:
+            return rejected.value, await db.get(models.Job, job.id)
+
+    rejected, job = asyncio.run(main())
+    assert rejected.status_code == 409 and rejected.detail["job_id"] == job.id
+    assert job.status == "succeeded" and job.result == {"done": True}
+
+
+def test_job_without_heartbeat_is_expired(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_STALE_SECONDS", 60)
+
+    async def quick_work(report):
+        await report(pages=1)
+        return {}
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            # A job left running by a worker that died two minutes ago
+            db.add(models.Job(id="dead", kind="import", status="running", progress={},
+                              updated_at=datetime.utcnow() - timedelta(minutes=2)))
+            await db.commit()
+            job = await jobs.submit(db, "import", quick_work)
+        await asyncio.gather(*jobs._tasks)
+        async with AsyncSessionLocal() as db:
+            return await db.get(models.Job, "dead"), await db.get(models.Job, job.id)
+
+    dead, job = asyncio.run(main())
+    assert dead.status == "failed"
+    assert job.status == "succeeded" and job.progress == {"pages": 1}
@@ -0,0 +1,23 @@
+import asyncio
+import os
+import sys
+from conftest import REPO_ROOT, add_bills, free_port, start_server
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+import async_load  # noqa: E402
+
+
+def test_other_routes_stay_fast_while_votes_and_comments_are_in_flight(db):
+    add_bills(db, 1)
+    port = free_port()
+    server = start_server(port)
+    try:
+        result = asyncio.run(async_load.run(f"http://127.0.0.1:{port}", bill_id=1, writers=10, probes=100))
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    assert result["writes"] > 0
+    baseline, loaded = result["baseline"]["p99_ms"], result["under_load"]["p99_ms"]
+    # The write endpoints must not hold the event loop; allow scheduling noise on small machines
+    assert loaded < max(4 * baseline, 100), result
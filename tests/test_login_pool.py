@@ -0,0 +1,37 @@
+import os
+import sys
+import threading
+import pytest
+from app import auth
+from conftest import REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+import login_throughput  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def restore_pool_size(monkeypatch):
+    monkeypatch.setattr(auth, "PASSWORD_HASH_WORKERS", auth.PASSWORD_HASH_WORKERS)
+    yield
+    auth.shutdown_hash_executor()
+
+
+def test_logins_verify_passwords_on_the_hash_pool(db, monkeypatch):
+    threads = set()
+    verify = auth.verify_password
+
+    def recording_verify(plain_password, hashed_password):
+        threads.add(threading.current_thread().name)
+        return verify(plain_password, hashed_password)
+
+    monkeypatch.setattr(auth, "verify_password", recording_verify)
+    results = login_throughput.run([2], logins=20, concurrency=8, rounds=4)
+
+    assert results[0]["logins_per_second"] > 0
+    assert threads and all(name.startswith("password-hash") for name in threads)
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 4, reason="pool scaling needs several cores")
+def test_login_throughput_grows_with_the_pool(db):
+    single, pool = login_throughput.run([1, 4], logins=40, concurrency=16, rounds=10)
+    assert pool["logins_per_second"] > 1.5 * single["logins_per_second"]
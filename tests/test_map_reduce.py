@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+from openai import RateLimitError
+from app import helpers
+from conftest import FakeOpenAI
+
+# Long enough for every call of one level to be in flight at the same time
+LATENCY = 0.1
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    fake = FakeOpenAI(delay=LATENCY)
+    monkeypatch.setattr(helpers, "client", fake)
+    # Chunk sizes must not depend on whether tiktoken is installed
+    monkeypatch.setattr(helpers, "count_tokens", helpers.estimate_tokens)
+    return fake
+
+
+def bill_text(chunks, chunk_chars=1000):
+    section = ("word " * (chunk_chars // 5 - 1)).strip() + ".\n\n"
+    return section * chunks
+
+
+def run_summary(text, max_tokens, workers=64):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return helpers.summarize_text(text, max_tokens=max_tokens, executor=executor)
+
+
+@pytest.mark.parametrize("chunks", [4, 40])
+def test_map_calls_run_together_then_one_reduce(fake_llm, chunks):
+    summary = run_summary(bill_text(chunks), max_tokens=250)
+
+    # Every chunk is summarized at once, then one call combines the summaries
+    assert fake_llm.calls == chunks + 1
+    assert fake_llm.max_active == chunks
+    assert summary.startswith("summary of")
+
+
+def test_reduce_recurses_while_the_summaries_are_too_long(fake_llm):
+    # 60 chunk summaries of ~20 characters do not fit in one 100-token call
+    run_summary(bill_text(60, chunk_chars=400), max_tokens=100)
+
+    assert fake_llm.calls > 61
+    assert fake_llm.max_active == 60
+
+
+def test_parallelism_is_bounded_by_the_pool(fake_llm):
+    fake_llm.delay = 0.02
+    run_summary(bill_text(20), max_tokens=250, workers=3)
+    assert fake_llm.max_active == 3
+
+
+def test_rate_limited_calls_are_retried(fake_llm, monkeypatch):
+    response = httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "http://llm.test"))
+    fake_llm.failures = [RateLimitError("rate limited", response=response, body=None)] * 2
+    fake_llm.delay = 0
+
+    summary = run_summary(bill_text(3), max_tokens=250)
+
+    assert summary.startswith("summary of")
+    assert fake_llm.calls == 3 + 1 + 2
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import pytest
+from sqlalchemy import event, select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app import models
+from app.database import ASYNC_DATABASE_URL, AsyncSessionLocal, SessionLocal
+from app.notifications import NotificationBatcher
+from conftest import add_bills, register_users
+
+
+def stored_notifications():
+    with SessionLocal() as db:
+        return db.execute(select(func.count()).select_from(models.Notification)).scalar()
+
+
+def run_with_batcher(scenario, session_factory=AsyncSessionLocal, **options):
+    # Runs scenario(batcher) with a batcher whose own flusher never fires during the test
+    async def main():
+        batcher = NotificationBatcher(flush_interval_ms=60000, session_factory=session_factory, **options)
+        try:
+            return await scenario(batcher)
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def strict_sessions():
+    # SQLite only checks foreign keys when asked to, per connection
+    strict_engine = create_async_engine(ASYNC_DATABASE_URL)
+    event.listen(strict_engine.sync_engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+    yield async_sessionmaker(bind=strict_engine, expire_on_commit=False)
+    asyncio.run(strict_engine.dispose())
+
+
+def test_votes_are_written_in_batches_and_pushed_coalesced(client, db):
+    add_bills(db, 1)
+    voter, moderator = register_users(client, 2)
+    db.query(models.User).filter(models.User.username == "user1").update({"is_moderator": True})
+    db.commit()
+    token = moderator["Authorization"].split()[1]
+    with client.websocket_connect(f"/ws/notifications?token={token}") as websocket:
+        for i in range(30):
+            response = client.post(f"/bills-bill/1/vote?upvote={'true' if i % 2 else 'false'}", headers=voter)
+            assert response.json()["detail"] == "Vote recorded"
+        pushes = []
+        while sum(push["count"] for push in pushes) < 30:
+            pushes.append(json.loads(websocket.receive_text()))
+    assert len(pushes) < 30
+    assert all(push["type"] == "notifications" and len(push["latest_ids"]) <= 10 for push in pushes)
+    assert stored_notifications() == 30
+
+
+def test_rejected_row_is_dropped_without_blocking_the_batch(client, strict_sessions):
+    register_users(client, 1)
+
+    async def scenario(batcher):
+        batcher.add(1, "first")
+        batcher.add(999, "user was deleted")
+        batcher.add(1, "second")
+        ids = await batcher.flush()
+        return ids, batcher.dropped, list(batcher._pending)
+
+    ids, dropped, pending = run_with_batcher(scenario, strict_sessions)
+    assert len(ids) == 2 and dropped == 1 and pending == []
+    assert stored_notifications() == 2
+
+
+def test_failed_insert_is_retried():
+    calls = []
+
+    def flaky_sessions():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError("INSERT", {}, Exception("database is down"))
+        return AsyncSessionLocal()
+
+    async def scenario(batcher):
+        batcher.add(1, "a")
+        batcher.add(1, "b")
+        with pytest.raises(OperationalError):
+            await batcher.flush()
+        assert len(batcher._pending) == 2
+        return await batcher.flush()
+
+    assert len(run_with_batcher(scenario, flaky_sessions)) == 2
+    assert stored_notifications() == 2
+
+
+def test_buffer_is_bounded():
+    async def scenario(batcher):
+        for i in range(5):
+            batcher.add(1, f"message {i}")
+        return [row["message"] for row in batcher._pending], batcher.dropped
+
+    messages, dropped = run_with_batcher(scenario, max_pending=3)
+    assert messages == ["message 2", "message 3", "message 4"] and dropped == 2
+
+
+@pytest.mark.parametrize("interrupted_in_commit", [False, True])
+def test_cancelled_flush_only_requeues_uncommitted_rows(interrupted_in_commit):
+    entered = None
+
+    def stalling_sessions():
+        session = AsyncSessionLocal()
+        stalled = "commit" if interrupted_in_commit else "scalars"
+        original = getattr(session, stalled)
+
+        async def stall(*args, **kwargs):
+            if stalled == "scalars":
+                await original(*args, **kwargs)
+            entered.set()
+            await asyncio.sleep(60)
+
+        setattr(session, stalled, stall)
+        return session
+
+    async def scenario(batcher):
+        nonlocal entered
+        entered = asyncio.Event()
+        batcher.add(1, "a")
+        flush = asyncio.create_task(batcher.flush())
+        await entered.wait()
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        pending = len(batcher._pending)
+        batcher._pending.clear()
+        return pending
+
+    assert run_with_batcher(scenario, stalling_sessions) == (0 if interrupted_in_commit else 1)
@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import helpers
+
+
+def make_pdf(pages: int) -> bytes:
+    # Smallest PDF pdfplumber reads: one Helvetica line of text per page
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for number in range(1, pages + 1):
+        stream = f"BT /F1 12 Tf 72 720 Td (Page {number}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    body, offsets = b"%PDF-1.4\n", []
+    for index, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{index} 0 obj\n{obj}\nendobj\n".encode()
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return body
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append(args)
+        return super().submit(fn, *args)
+
+
+@pytest.fixture
+def pdf_server():
+    documents = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = documents.get(self.path)
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", documents
+    server.shutdown()
+    server.server_close()
+
+
+def test_parallel_extraction_hands_workers_a_path(monkeypatch, tmp_path):
+    executor = RecordingExecutor()
+    monkeypatch.setattr(helpers, "PDF_PARALLEL_MIN_PAGES", 4)
+    monkeypatch.setattr(helpers, "PDF_EXTRACT_WORKERS", 3)
+    monkeypatch.setattr(helpers, "get_pdf_executor", lambda: executor)
+    path = tmp_path / "bill.pdf"
+    path.write_bytes(make_pdf(7))
+
+    with open(path, "rb") as buffer:
+        text = helpers.extract_pdf_text(buffer)
+    executor.shutdown()
+
+    assert text == "".join(f"Page {n}" for n in range(1, 8))
+    assert [call[1:] for call in executor.calls] == [(0, 3), (3, 6), (6, 7)]
+    # Each worker gets the name of a temporary copy, never the document bytes
+    assert all(isinstance(call[0], str) for call in executor.calls)
+
+
+def test_fetch_falls_back_to_the_government_url(pdf_server, monkeypatch):
+    base, documents = pdf_server
+    documents["/Content/Bills/Government/C-1.pdf"] = make_pdf(2)
+    monkeypatch.setattr(helpers, "PDF_SPOOL_MAX_BYTES", 64)  # roll the download over to disk
+
+    text = helpers.fetch_pdf_text(f"{base}/Content/Bills/Private/C-1.pdf")
+
+    assert "Page 1" in text and "Page 2" in text
+    # The Private URL now resolves from the cache without another download
+    documents.clear()
+    assert helpers.fetch_pdf_text(f"{base}/Content/Bills/Private/C-1.pdf") == text
@@ -0,0 +1,42 @@
+from app import models
+from conftest import register_users
+
+
+def poll_queries(statements):
+    return [s for s in statements if "polls" in s or "user_poll_votes" in s]
+
+
+def add_polls(db, count, user_id):
+    # Polls 1..count; the user voted yes on the even ones and not at all on the odd ones
+    for i in range(1, count + 1):
+        db.add(models.Poll(id=i, question=f"Question {i}", yes_votes=0, no_votes=0))
+        if i % 2 == 0:
+            db.add(models.UserPollVote(user_id=user_id, poll_id=i, vote=True))
+    db.commit()
+
+
+def test_poll_listing_query_count_is_constant(client, db, count_queries):
+    headers = register_users(client, 1)
+    user_id = db.query(models.User.id).scalar()
+    add_polls(db, 30, user_id)
+    counts = []
+    for limit in (1, 10, 30):
+        before = len(count_queries())
+        response = client.get(f"/polls/?limit={limit}", headers=headers[0])
+        assert response.status_code == 200
+        assert len(response.json()) == limit
+        counts.append(len(poll_queries(count_queries()[before:])))
+    assert counts[0] == counts[1] == counts[2] == 1
+
+
+def test_polls_carry_the_users_own_vote(client, db):
+    headers = register_users(client, 2)
+    first, second = [user_id for (user_id,) in db.query(models.User.id).order_by(models.User.id)]
+    add_polls(db, 4, first)
+    db.add(models.UserPollVote(user_id=second, poll_id=1, vote=False))
+    db.commit()
+
+    votes = {poll["id"]: poll["current_user_vote"] for poll in client.get("/polls/", headers=headers[0]).json()}
+    assert votes == {1: None, 2: True, 3: None, 4: True}
+    votes = {poll["id"]: poll["current_user_vote"] for poll in client.get("/polls/", headers=headers[1]).json()}
+    assert votes == {1: False, 2: None, 3: None, 4: None}
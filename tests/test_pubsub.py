@@ -0,0 +1,73 @@
+import asyncio
+import json
+import httpx
+import websockets
+from app import models, pubsub
+from conftest import TEST_POSTGRES_URL, add_bills, free_port, requires_postgres, start_server
+
+
+def test_postgres_bus_delivers_locally_while_the_listener_is_down():
+    received = []
+
+    async def main():
+        # Nothing listens on port 9, so the listener and publisher keep reconnecting
+        bus = pubsub.PostgresBus(received.append, dsn="postgresql://postgres@127.0.0.1:9/none")
+        await bus.start()
+        await bus.publish({"to": "moderators", "message": "hello"})
+        await asyncio.sleep(0.1)
+        await bus.stop()
+
+    asyncio.run(main())
+    assert received == [{"to": "moderators", "message": "hello"}]
+
+
+@requires_postgres
+def test_vote_on_one_server_reaches_moderators_on_every_server(pg_session):
+    # Two separate app processes share the database, like two workers or nodes
+    add_bills(pg_session, 1)
+    ports = [free_port(), free_port()]
+    servers = [start_server(port, DATABASE_URL=TEST_POSTGRES_URL, PUBSUB_BACKEND="postgres", NOTIFICATION_FLUSH_MS="50")
+               for port in ports]
+    try:
+        voter_port = ports[1]
+        tokens = []
+        for name in ("voter", "mod_a", "mod_b"):
+            email = f"{name}@example.com"
+            httpx.post(f"http://127.0.0.1:{voter_port}/register/",
+                       json={"name": name, "email": email, "username": name, "password": "secret"})
+            tokens.append(httpx.post(f"http://127.0.0.1:{voter_port}/login",
+                                     json={"email": email, "password": "secret"}).json()["access_token"])
+        pg_session.query(models.User).filter(models.User.username.in_(["mod_a", "mod_b"])).update(
+            {"is_moderator": True}, synchronize_session=False)
+        pg_session.commit()
+
+        async def main():
+            sockets = [
+                await websockets.connect(f"ws://127.0.0.1:{port}/ws/notifications?token={token}")
+                for port, token in zip(ports, tokens[1:])
+            ]
+            await asyncio.sleep(1)  # let both listeners subscribe
+            async with httpx.AsyncClient() as client:
+                response = await client.post(f"http://127.0.0.1:{voter_port}/bills-bill/1/vote?upvote=true",
+                                             headers={"Authorization": f"Bearer {tokens[0]}"})
+                assert response.json()["detail"] == "Vote recorded"
+            received = []
+            for ws in sockets:
+                messages = [json.loads(await asyncio.wait_for(ws.recv(), 5))]
+                try:
+                    messages.append(json.loads(await asyncio.wait_for(ws.recv(), 0.5)))
+                except asyncio.TimeoutError:
+                    pass
+                received.append(messages)
+                await ws.close()
+            return received
+
+        received = asyncio.run(main())
+        # One push on the other server and exactly one, not an echo duplicate, on the voter's
+        for messages in received:
+            assert len(messages) == 1
+            assert messages[0]["type"] == "notifications" and messages[0]["count"] == 1
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait(10)
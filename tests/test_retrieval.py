@@ -0,0 +1,75 @@
+import os
+import sys
+from types import SimpleNamespace
+from app import chatbot, models, retrieval
+from conftest import REPO_ROOT, add_bills
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+import retrieval_index  # noqa: E402
+
+CLAUSES = [
+    "1 The Minister may enter into an agreement with a province respecting fisheries inspection.",
+    "2 A corporation that contravenes section 4 is liable to a fine not exceeding one million dollars.",
+    "3 The Governor in Council may make regulations prescribing the form of the annual report.",
+]
+
+
+def add_text(db, bill_id, text):
+    bill = models.BillsBill(id=bill_id, name_en=f"Bill {bill_id}", status_code="introduced", text_docid=2000 + bill_id)
+    db.add(bill)
+    db.add(models.BillsBillText(bill_id=bill_id, docid=2000 + bill_id, created="2024-01-01", text_en=text))
+    db.commit()
+
+
+def test_search_ranks_the_matching_clause_first():
+    index = retrieval.BM25Index(passage_tokens=40)
+    index.add_text(1, bill_id=1, text="\n\n".join(CLAUSES))
+    index.add_text(2, bill_id=2, text="A corporation that contravenes section 9 pays a fine.")
+
+    results = index.search(1, "What fine does a corporation pay?", k=2)
+
+    assert results[0] == CLAUSES[1]
+    assert len(results) <= 2
+    assert index.search(1, "unrelated weather forecast") == []
+
+
+def test_sync_only_indexes_new_texts(db):
+    add_text(db, 1, "\n\n".join(CLAUSES))
+    index = retrieval.BM25Index(passage_tokens=40)
+    first = index.sync()
+    add_text(db, 2, "The annual report is tabled in Parliament.")
+
+    assert first == len(index) >= len(CLAUSES)
+    assert index.sync() == 1
+    assert index.sync() == 0
+
+
+def test_chat_turn_sends_only_the_top_passages(client, db, monkeypatch):
+    add_text(db, 1, "\n\n".join(CLAUSES * 5))
+    sent = []
+
+    async def create(messages, model, **kwargs):
+        sent.append(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Up to a million dollars."))])
+
+    monkeypatch.setattr(chatbot, "async_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(retrieval.bill_text_index, "passage_tokens", 40)
+
+    response = client.post("/chat/1", json={"conversation": [{"role": "user", "content": "How large is the fine?"}]})
+
+    assert response.status_code == 200
+    excerpts = [m["content"] for m in sent[0] if m["content"].startswith("Relevant excerpts")]
+    assert len(excerpts) == 1
+    assert "fine not exceeding one million dollars" in excerpts[0]
+    assert excerpts[0].count("\n[") == retrieval.RETRIEVAL_TOP_K
+    # The full text is never put into the prompt
+    assert sum(len(m["content"]) for m in sent[0]) < len("\n\n".join(CLAUSES * 5))
+
+
+def test_benchmark_builds_and_queries_the_whole_table(db):
+    add_bills(db, 3)
+    result = retrieval_index.run(queries=50)
+
+    assert result["bills"] == 3 and result["passages"] >= 3
+    assert result["queries"] == 50
+    assert result["build_seconds"] > 0 and result["query_p99_ms"] > 0
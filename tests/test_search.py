@@ -0,0 +1,45 @@
+from app import models, search
+from conftest import add_bills, requires_postgres
+
+
+def add_searchable_bills(session):
+    add_bills(session, 3)
+    session.get(models.BillsBill, 1).name_en = "Clean water <script>alert(1)</script> act"
+    session.get(models.BillsBill, 2).name_en = "Fisheries act"
+    session.get(models.BillsBill, 3).name_en = "Water & wastewater act"
+    text = session.query(models.BillsBillText).filter_by(docid=1002).one()
+    text.text_en = "Rules on <img src=x onerror=alert(1)> water quality for lakes"
+    session.commit()
+
+
+def test_fallback_highlights_are_escaped(client, db):
+    add_searchable_bills(db)
+    results = client.get("/bills-bill/search?q=water").json()
+    by_id = {result["id"]: result for result in results}
+    assert set(by_id) == {1, 2, 3}
+    assert by_id[1]["headline"] == "Clean <b>water</b> &lt;script&gt;alert(1)&lt;/script&gt; act"
+    assert by_id[3]["headline"] == "<b>Water</b> &amp; waste<b>water</b> act"
+    assert "<img" not in by_id[2]["snippet"] and "&lt;img" in by_id[2]["snippet"]
+
+
+def test_fallback_search_pages_with_cursor(client, db):
+    add_searchable_bills(db)
+    first = client.get("/bills-bill/search?q=water&limit=2")
+    second = client.get(f"/bills-bill/search?q=water&limit=2&after={first.headers['X-Next-Cursor']}")
+    ids = [result["id"] for result in first.json() + second.json()]
+    assert sorted(ids) == [1, 2, 3]
+
+
+@requires_postgres
+def test_postgres_search_ranks_and_escapes_highlights(pg_session):
+    add_searchable_bills(pg_session)
+    results, next_cursor = search.search_bills(pg_session, "water", limit=2)
+    assert len(results) == 2 and next_cursor
+    more, _ = search.search_bills(pg_session, "water", limit=2, after=next_cursor)
+    results += more
+    assert sorted(result["id"] for result in results) == [1, 2, 3]
+    by_id = {result["id"]: result for result in results}
+    assert by_id[1]["headline"] == "Clean <b>water</b> &lt;script&gt;alert(1)&lt;/script&gt; act"
+    assert "<b>water</b>" in by_id[2]["snippet"]
+    assert "<img" not in by_id[2]["snippet"]
+    assert search.HIGHLIGHT_START not in by_id[2]["snippet"]
@@ -0,0 +1,62 @@
+import threading
+import time
+import pytest
+from app import helpers, models
+from conftest import FakeOpenAI, add_bills, register_users
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    fake = FakeOpenAI(delay=0.05)
+    monkeypatch.setattr(helpers, "client", fake)
+    return fake
+
+
+def clear_summaries(db, value):
+    db.query(models.BillsBillText).update({"summary_en": value})
+    db.commit()
+
+
+def test_stored_summary_is_served_without_calling_openai(client, db, fake_openai):
+    add_bills(db, 1)
+    assert client.get("/summarize/1").json() == {"summary": "Summary 1"}
+    assert fake_openai.calls == 0
+
+
+@pytest.mark.parametrize("missing", [None, ""])
+def test_missing_summary_is_generated_once_for_concurrent_requests(client, db, fake_openai, missing):
+    add_bills(db, 1)
+    clear_summaries(db, missing)
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(client.get("/summarize/1").json()))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fake_openai.calls == 1
+    assert len({response["summary"] for response in responses}) == 1
+    db.expire_all()
+    assert db.query(models.BillsBillText).one().summary_en == responses[0]["summary"]
+
+
+def test_backfill_job_summarizes_null_and_empty_summaries(client, db, fake_openai):
+    add_bills(db, 3)
+    db.query(models.BillsBillText).filter_by(docid=1001).update({"summary_en": None})
+    db.query(models.BillsBillText).filter_by(docid=1002).update({"summary_en": ""})
+    db.commit()
+    moderator, member = register_users(client, 2)
+    db.query(models.User).filter_by(username="user0").update({"is_moderator": True})
+    db.commit()
+
+    assert client.post("/summaries/backfill", headers=member).status_code == 403
+    response = client.post("/summaries/backfill", headers=moderator)
+    assert response.status_code == 202
+    deadline = time.monotonic() + 10
+    while (job := client.get(response.json()["status_url"]).json())["status"] == "running":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"summarized": 2, "failed": 0}
+    assert job["progress"]["remaining"] == 0
+    assert fake_openai.calls == 2
@@ -0,0 +1,100 @@
+import threading
+from app import models
+from app.database import SessionLocal
+from app.vote_buffer import VoteCounterBuffer
+from conftest import add_bills
+
+
+class BlockingCommitSession:
+    # Session factory whose commit waits until the test releases it, optionally failing
+    def __init__(self):
+        self.committing = threading.Event()
+        self.release = threading.Event()
+        self.fail = False
+
+    def __call__(self):
+        session = SessionLocal()
+        commit = session.commit
+
+        def blocked_commit():
+            self.committing.set()
+            self.release.wait(5)
+            if self.fail:
+                raise RuntimeError("commit failed")
+            commit()
+
+        session.commit = blocked_commit
+        return session
+
+
+def stored_counts(bill_id):
+    with SessionLocal() as session:
+        bill = session.get(models.BillsBill, bill_id)
+        return bill.upvotes, bill.downvotes
+
+
+def start_flush(buffer):
+    errors = []
+
+    def run():
+        try:
+            buffer.flush()
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, errors
+
+
+def test_readers_never_count_a_batch_twice(db):
+    add_bills(db, 1, with_text=False)
+    sessions = BlockingCommitSession()
+    buffer = VoteCounterBuffer(enabled=True, session_factory=sessions)
+    buffer.add(1, 3, 1)
+
+    buffer.add(1, 1, 0)
+    assert buffer.pending(1) == (4, 1)
+
+    thread, errors = start_flush(buffer)
+    assert sessions.committing.wait(5)
+    buffer.add(1, 0, 2)  # a vote arriving mid-commit is buffered without waiting
+    assert stored_counts(1) == (0, 0)
+
+    # A reader during the commit waits for it, then sees the batch in the table only
+    read = []
+    reader = threading.Thread(target=lambda: read.append(buffer.pending(1)))
+    reader.start()
+    reader.join(0.1)
+    assert not read
+
+    sessions.release.set()
+    thread.join()
+    reader.join(5)
+    assert not errors
+    assert stored_counts(1) == (4, 1)
+    assert read == [(0, 2)]
+    assert buffer.pending(1) == (0, 2)
+
+
+def test_failed_flush_requeues_its_batch(db):
+    add_bills(db, 1, with_text=False)
+    sessions = BlockingCommitSession()
+    sessions.fail = True
+    buffer = VoteCounterBuffer(enabled=True, session_factory=sessions)
+    buffer.add(1, 2, 0)
+
+    thread, errors = start_flush(buffer)
+    assert sessions.committing.wait(5)
+    buffer.add(1, 0, 1)
+    sessions.release.set()
+    thread.join()
+
+    assert len(errors) == 1
+    assert stored_counts(1) == (0, 0)
+    assert buffer.pending(1) == (2, 1)
+
+    buffer.session_factory = SessionLocal
+    assert buffer.flush() == 1
+    assert stored_counts(1) == (2, 1)
+    assert buffer.pending(1) == (0, 0)
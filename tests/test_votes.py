@@ -0,0 +1,121 @@
+import asyncio
+import random
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app import crud, models
+from app.database import AsyncSessionLocal, get_async_database_url
+from conftest import TEST_POSTGRES_URL, add_bills, requires_postgres
+
+
+def add_users(session, count):
+    session.add_all(models.User(id=i, name=f"u{i}", email=f"u{i}@example.com", username=f"u{i}", password="x")
+                    for i in range(1, count + 1))
+    session.commit()
+
+
+def test_changing_a_null_vote_only_counts_the_new_vote(db):
+    add_bills(db, 1, with_text=False)
+    add_users(db, 1)
+    db.add(models.UserBillVote(user_id=1, bill_id=1, upvote=None))
+    db.commit()
+
+    async def main():
+        async with AsyncSessionLocal() as session:
+            return await crud.vote_bill(session, user_id=1, bill_id=1, upvote=True)
+
+    vote, tally = asyncio.run(main())
+    assert vote["upvote"] is True
+    assert (tally.upvotes, tally.downvotes) == (1, 0)
+
+
+def test_repeated_and_flipped_votes_keep_counters_exact(db):
+    add_bills(db, 1, with_text=False)
+    add_users(db, 2)
+
+    async def vote(user_id, upvote):
+        async with AsyncSessionLocal() as session:
+            return (await crud.vote_bill(session, user_id=user_id, bill_id=1, upvote=upvote))[1]
+
+    async def main():
+        return [await vote(1, True), await vote(1, True), await vote(1, False), await vote(2, True)]
+
+    first, repeated, flipped, other = asyncio.run(main())
+    assert (first.upvotes, first.downvotes) == (1, 0)
+    assert repeated is None
+    assert (flipped.upvotes, flipped.downvotes) == (0, 1)
+    assert (other.upvotes, other.downvotes) == (1, 1)
+
+
+@requires_postgres
+def test_concurrent_votes_keep_exact_tallies(pg_session):
+    users = 100
+    add_bills(pg_session, 1, with_text=False)
+    add_users(pg_session, users)
+    # Some users start with a NULL bill vote
+    pg_session.add_all(models.UserBillVote(user_id=i, bill_id=1, upvote=None) for i in range(1, users + 1, 10))
+    pg_session.commit()
+
+    engine = create_async_engine(get_async_database_url(TEST_POSTGRES_URL), pool_size=20, max_overflow=0)
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+    rng = random.Random(4)
+
+    async def bill_vote(user_id):
+        async with sessions() as session:
+            await crud.vote_bill(session, user_id=user_id, bill_id=1, upvote=rng.random() < 0.5)
+
+    async def main():
+        calls = [bill_vote(user_id) for user_id in range(1, users + 1) for _ in range(4)]
+        rng.shuffle(calls)
+        await asyncio.gather(*calls)
+        await engine.dispose()
+
+    asyncio.run(main())
+    pg_session.expire_all()
+    bill = pg_session.get(models.BillsBill, 1)
+
+    def count(value):
+        return pg_session.execute(select(func.count()).where(models.UserBillVote.upvote.is_(value))).scalar()
+
+    assert bill.upvotes == count(True)
+    assert bill.downvotes == count(False)
+    assert bill.upvotes + bill.downvotes == users
+
+
+@pytest.mark.parametrize("backend", ["sqlite", pytest.param("postgres", marks=requires_postgres)])
+def test_concurrent_poll_vote_switches_keep_exact_tallies(request, backend):
+    session = request.getfixturevalue("db" if backend == "sqlite" else "pg_session")
+    users = 50
+    add_users(session, users)
+    session.add(models.Poll(id=1, question="q", yes_votes=0, no_votes=0))
+    session.commit()
+
+    url = session.get_bind().url.render_as_string(hide_password=False)
+    engine = create_async_engine(get_async_database_url(url), pool_size=20, max_overflow=0)
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def poll_vote(user_id, attempt):
+        # Every attempt comes from its own address and alternates the option, so the
+        # same-IP check never rejects it and the later attempts race to switch the vote
+        async with sessions() as s:
+            return await crud.vote_poll(s, user_id=user_id, poll_id=1, vote=attempt % 2 == 0,
+                                        ipaddress=f"10.{attempt}.0.{user_id}", location=None)
+
+    async def main():
+        calls = [poll_vote(user_id, attempt) for user_id in range(1, users + 1) for attempt in range(4)]
+        random.Random(4).shuffle(calls)
+        results = await asyncio.gather(*calls)
+        await engine.dispose()
+        return results
+
+    results = asyncio.run(main())
+    session.expire_all()
+    poll = session.get(models.Poll, 1)
+
+    def count(value):
+        return session.execute(select(func.count()).where(models.UserPollVote.vote.is_(value))).scalar()
+
+    assert sum(result is not None for result in results) > users  # some votes were switched
+    assert poll.yes_votes == count(True)
+    assert poll.no_votes == count(False)
+    assert poll.yes_votes + poll.no_votes == users
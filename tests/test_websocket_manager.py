@@ -0,0 +1,73 @@
+import asyncio
+from app import websocket_manager
+from app.websocket_manager import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self, mode="ok"):
+        self.mode = mode
+        self.received = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+    async def send_text(self, message):
+        if self.mode == "dead":
+            raise ConnectionResetError("broken pipe")
+        if self.mode == "stalled":
+            await asyncio.sleep(60)
+        self.received.append(message)
+
+
+class FakeUser:
+    def __init__(self, user_id, is_moderator=False):
+        self.id = user_id
+        self.is_moderator = is_moderator
+
+
+def test_messages_reach_only_their_targets():
+    async def main():
+        manager = ConnectionManager()
+        moderator, member, other_tab = FakeSocket(), FakeSocket(), FakeSocket()
+        await manager.connect(moderator, FakeUser(1, is_moderator=True), backlog=["missed"])
+        await manager.connect(member, FakeUser(2))
+        await manager.connect(other_tab, FakeUser(2))
+        await manager.broadcast_to_moderators("for moderators")
+        await manager.send_to_user(2, "for user 2")
+        await manager.broadcast("for everyone")
+        await asyncio.sleep(0.05)
+        return moderator.received, member.received, other_tab.received
+
+    moderator, member, other_tab = asyncio.run(main())
+    assert moderator == ["missed", "for moderators", "for everyone"]
+    assert member == other_tab == ["for user 2", "for everyone"]
+
+
+def test_failed_stalled_and_overflowing_sockets_are_evicted(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "WS_SEND_TIMEOUT", 0.1)
+    monkeypatch.setattr(websocket_manager, "WS_QUEUE_SIZE", 2)
+
+    async def main():
+        manager = ConnectionManager()
+        sockets = {mode: FakeSocket(mode) for mode in ("ok", "dead", "stalled")}
+        for user_id, socket in enumerate(sockets.values()):
+            await manager.connect(socket, FakeUser(user_id, is_moderator=True))
+        await manager.broadcast_to_moderators("first")
+        await asyncio.sleep(0.3)
+        remaining = set(manager.active_connections)
+
+        # A socket that stops draining is dropped once its queue is full, without blocking others
+        sockets["ok"].mode = "stalled"
+        for i in range(4):
+            await manager.broadcast_to_moderators(f"burst {i}")
+        await asyncio.sleep(0.05)
+        return sockets, remaining, manager
+
+    sockets, remaining, manager = asyncio.run(main())
+    assert remaining == {sockets["ok"]}
+    assert sockets["dead"].closed and sockets["stalled"].closed
+    assert manager.active_connections == {} and manager.by_user == {} and manager.moderators == set()